@@ -15,6 +15,35 @@ from loguru import logger
 
 def main():
     """Run analysis queries and print formatted report."""
+    import argparse
+    from datetime import date
+    
+    parser = argparse.ArgumentParser(description='Reveel Analysis Report')
+    parser.add_argument('--verify-plans', action='store_true',
+                        help='Check analysis query plans for sequential scans instead of reporting')
+    parser.add_argument('--approximate', nargs='*', metavar='RUN_ID', default=None,
+                        help='Print an instant approximate summary from ingestion sketches of the '
+                             'given runs (default: the latest run) instead of querying facts')
+    parser.add_argument('--profile', nargs='?', const='profiles', default=None, metavar='DIR',
+                        help='Profile each analysis into .prof and .collapsed flamegraph files in DIR '
+                             '(default: profiles)')
+    parser.add_argument('--query-metrics', action='store_true',
+                        help='Log per-query latency, rows and pool wait after the report')
+    parser.add_argument('--start-date', type=date.fromisoformat, default=None, metavar='YYYY-MM-DD',
+                        help='Report on invoices from this date (default: all dates; month-over-month '
+                             'growth uses the configured growth window)')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=None, metavar='YYYY-MM-DD',
+                        help='Report on invoices before this date')
+    parser.add_argument('--client', action='append', default=None, metavar='CLIENT_ID', dest='clients',
+                        help='Report on this client only (repeatable)')
+    parser.add_argument('--top', type=int, default=None, metavar='N',
+                        help='Number of clients in the top clients and discount rankings (default: 5)')
+    args = parser.parse_args()
+    if args.start_date and args.end_date and args.start_date >= args.end_date:
+        parser.error("--start-date must be before --end-date")
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
+    
     logger.remove()
     logger.add(lambda msg: print(msg, end=""), level="INFO")
     logger.add("pipeline.log", rotation="10 MB", level="INFO")
@@ -23,13 +52,41 @@ def main():
     db_manager = DatabaseManager()
     db_manager.connect()
     
-    analysis_engine = AnalysisEngine(db_manager)
+    profiler = None
+    if args.profile:
+        # cProfile/pstats are only loaded when profiling
+        from src.profiling import StageProfiler
+        profiler = StageProfiler(args.profile)
+    
+    analysis_engine = AnalysisEngine(db_manager, profiler=profiler)
+    
+    if args.verify_plans:
+        regressions = analysis_engine.verify_query_plans()
+        db_manager.disconnect()
+        sys.exit(1 if regressions else 0)
+    
+    if args.approximate is not None:
+        summary = analysis_engine.get_sketch_summary(args.approximate)
+        print(analysis_engine.generate_sketch_report(summary))
+        db_manager.disconnect()
+        return
     
     # Run all analyses
-    results = analysis_engine.run_all_analyses()
+    results = analysis_engine.run_all_analyses(start_date=args.start_date, end_date=args.end_date,
+                                               client_ids=args.clients, top_n=args.top)
     
     # Print formatted report
-    analysis_engine.print_analysis_report(results)
+    if profiler:
+        with profiler.profile('report'):
+            analysis_engine.print_analysis_report(results)
+    else:
+        analysis_engine.print_analysis_report(results)
+    
+    if profiler:
+        profiler.log_summary()
+    
+    if args.query_metrics:
+        db_manager.metrics.log_summary()
     
     # Clean up
     db_manager.disconnect()
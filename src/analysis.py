@@ -2,241 +2,392 @@
 Analysis queries module for the Reveel data pipeline.
 Contains all business intelligence queries and report generation.
 """
-import pandas as pd
-from typing import Dict, Any, List
+from contextlib import nullcontext
+from datetime import date
+from typing import Dict, Any, List, Iterable
 from loguru import logger
 
-from .database import DatabaseManager
+from .config import PLAN_CHECK_CONFIG, REPORT_CONFIG
+from .database import DatabaseManager, money_sql, RANGE_START, OPEN_RANGE_END
+
+
+TOP_CLIENTS_QUERY = '''
+SELECT 
+    client_id,
+    client_name,
+    client_status,
+    {cost_sum} as total_invoice_cost,
+    COUNT(invoice_id) as invoice_count,
+    {cost_avg} as avg_invoice_cost
+FROM invoice_facts 
+WHERE client_id IS NOT NULL
+    AND invoice_date >= :start_date
+    AND invoice_date < :end_date
+    AND (CAST(:client_ids AS varchar[]) IS NULL OR client_id = ANY(:client_ids))
+GROUP BY client_id, client_name, client_status
+ORDER BY total_invoice_cost DESC
+LIMIT :limit;
+'''
+
+MOM_GROWTH_QUERY = '''
+WITH monthly_totals AS (
+    SELECT 
+        client_id,
+        client_name,
+        DATE_TRUNC('month', invoice_date) as invoice_month,
+        {cost_sum} as monthly_amount,
+        COUNT(*) as monthly_invoices
+    FROM invoice_facts 
+    WHERE invoice_date >= :start_date
+        AND invoice_date < :end_date
+        AND client_id IS NOT NULL
+        AND (CAST(:client_ids AS varchar[]) IS NULL OR client_id = ANY(:client_ids))
+    GROUP BY client_id, client_name, DATE_TRUNC('month', invoice_date)
+),
+with_previous AS (
+    SELECT 
+        *,
+        LAG(monthly_amount) OVER (PARTITION BY client_id ORDER BY invoice_month) as prev_month_amount,
+        LAG(monthly_invoices) OVER (PARTITION BY client_id ORDER BY invoice_month) as prev_month_invoices
+    FROM monthly_totals
+)
+SELECT 
+    client_id,
+    client_name,
+    invoice_month,
+    monthly_amount,
+    prev_month_amount,
+    monthly_invoices,
+    prev_month_invoices,
+    CASE 
+        WHEN prev_month_amount IS NULL OR prev_month_amount = 0 THEN NULL
+        ELSE ((monthly_amount - prev_month_amount) / prev_month_amount * 100)
+    END as growth_percentage
+FROM with_previous
+WHERE prev_month_amount IS NOT NULL
+ORDER BY client_id, invoice_month
+LIMIT :limit;
+'''
+
+DISCOUNT_SCENARIO_QUERY = '''
+WITH discounted_costs AS (
+    SELECT 
+        client_id,
+        client_name,
+        shipment_type,
+        {cost_sum} as original_amount,
+        {discounted_cost_sum} as discounted_amount,
+        COUNT(*) as shipment_count
+    FROM invoice_facts
+    WHERE client_id IS NOT NULL
+        AND invoice_date >= :start_date
+        AND invoice_date < :end_date
+        AND (CAST(:client_ids AS varchar[]) IS NULL OR client_id = ANY(:client_ids))
+    GROUP BY client_id, client_name, shipment_type
+),
+client_totals AS (
+    SELECT 
+        client_id,
+        client_name,
+        SUM(original_amount) as total_original,
+        SUM(discounted_amount) as total_discounted,
+        SUM(original_amount) - SUM(discounted_amount) as total_savings,
+        SUM(shipment_count) as total_shipments
+    FROM discounted_costs
+    GROUP BY client_id, client_name
+)
+SELECT 
+    client_id,
+    client_name,
+    total_original,
+    total_discounted,
+    total_savings,
+    (total_savings / total_original * 100) as savings_percentage,
+    total_shipments
+FROM client_totals
+ORDER BY total_discounted DESC
+LIMIT :limit;
+'''
+
+RECLASSIFICATION_QUERY = '''
+WITH express_analysis AS (
+    SELECT 
+        client_id,
+        client_name,
+        COUNT(CASE WHEN shipment_type = 'EXPRESS' THEN 1 END) as express_shipments,
+        {express_cost_sum} as express_cost,
+        {ground_equivalent_sum} as ground_equivalent_cost,
+        {cost_sum} as total_cost
+    FROM invoice_facts
+    WHERE client_id IS NOT NULL
+        AND invoice_date >= :start_date
+        AND invoice_date < :end_date
+        AND (CAST(:client_ids AS varchar[]) IS NULL OR client_id = ANY(:client_ids))
+    GROUP BY client_id, client_name
+    HAVING COUNT(CASE WHEN shipment_type = 'EXPRESS' THEN 1 END) > 0
+)
+SELECT 
+    client_id,
+    client_name,
+    express_shipments,
+    express_cost,
+    ground_equivalent_cost,
+    express_cost - ground_equivalent_cost as total_savings,
+    ((express_cost - ground_equivalent_cost) / total_cost * 100) as savings_percentage,
+    CASE 
+        WHEN ((express_cost - ground_equivalent_cost) / total_cost * 100) > 50 THEN 'YES'
+        ELSE 'NO'
+    END as over_50_percent_savings,
+    CASE 
+        WHEN (express_cost - ground_equivalent_cost) > 500000 THEN 'YES'
+        ELSE 'NO'
+    END as over_500k_savings,
+    total_cost
+FROM express_analysis
+ORDER BY total_savings DESC;
+'''
+
+SUMMARY_STATS_QUERY = '''
+SELECT 
+    COUNT(DISTINCT client_id) as unique_clients,
+    COUNT(DISTINCT invoice_id) as unique_invoices,
+    {cost_sum} as total_costs,
+    {cost_avg} as avg_invoice_cost,
+    MIN(invoice_date) as earliest_invoice,
+    MAX(invoice_date) as latest_invoice,
+    COUNT(DISTINCT shipment_type) as unique_shipment_types
+FROM invoice_facts
+WHERE invoice_date >= :start_date
+    AND invoice_date < :end_date
+    AND (CAST(:client_ids AS varchar[]) IS NULL OR client_id = ANY(:client_ids));
+'''
+
+SHIPMENT_BREAKDOWN_QUERY = '''
+SELECT 
+    shipment_type,
+    COUNT(*) as shipment_count,
+    {cost_sum} as shipment_costs,
+    {cost_avg} as avg_shipment_cost
+FROM invoice_facts
+WHERE invoice_date >= :start_date
+    AND invoice_date < :end_date
+    AND (CAST(:client_ids AS varchar[]) IS NULL OR client_id = ANY(:client_ids))
+GROUP BY shipment_type
+ORDER BY shipment_costs DESC;
+'''
+
+# Report queries take their filters as bind parameters: an invoice date window
+# [:start_date, :end_date), :client_ids (all clients when NULL) and a row :limit,
+# so each runs as one prepared statement whatever the window
+
+# Business analysis queries by name, used for plan verification
+ANALYSIS_QUERIES = {
+    'top_clients': TOP_CLIENTS_QUERY,
+    'mom_growth': MOM_GROWTH_QUERY,
+    'discount_scenario': DISCOUNT_SCENARIO_QUERY,
+    'reclassification': RECLASSIFICATION_QUERY
+}
+
+
+def _find_seq_scans(plan: Dict[str, Any], table_prefix: str) -> List[Dict[str, Any]]:
+    """Collect sequential scan nodes over a table (or its partitions) from a JSON plan."""
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name', '').startswith(table_prefix):
+        scans.append({'relation': plan['Relation Name'], 'rows': plan.get('Plan Rows', 0)})
+    for child in plan.get('Plans', []):
+        scans.extend(_find_seq_scans(child, table_prefix))
+    return scans
 
 
 class AnalysisEngine:
     """Engine for running business analysis queries."""
     
-    def __init__(self, db_manager: DatabaseManager):
-        """Initialize with database manager."""
+    def __init__(self, db_manager: DatabaseManager, profiler=None):
+        """Initialize with database manager, and a StageProfiler to profile each analysis."""
         self.db_manager = db_manager
-        
-    def run_all_analyses(self) -> Dict[str, Any]:
-        """Run all analysis queries and return formatted results."""
+        self.profiler = profiler
+    
+    def _profiled(self, name: str):
+        """Context profiling a block as stage name when profiling is enabled."""
+        return self.profiler.profile(name) if self.profiler else nullcontext()
+    
+    def _sql(self, query: str) -> str:
+        """A report query with the cost aggregates of the database's money representation."""
+        return money_sql(query, self.db_manager.uses_cents())
+    
+    @staticmethod
+    def _params(name: str = None, start_date: date = None, end_date: date = None,
+                client_ids: Iterable[str] = None, limit: int = None) -> Dict[str, Any]:
+        """Bind parameters of report query name, defaulting those not given.
+        
+        Without a date window, month-over-month growth covers REPORT_CONFIG's
+        growth window and the other reports every invoice date; a window with
+        one bound is open on the other side.
+        """
+        if start_date is None and end_date is None and name == 'mom_growth':
+            start_date, end_date = REPORT_CONFIG['growth_window']
+        return {
+            'start_date': start_date or RANGE_START,
+            'end_date': end_date or OPEN_RANGE_END,
+            'client_ids': list(client_ids) if client_ids is not None else None,
+            'limit': limit or REPORT_CONFIG['limits'].get(name)
+        }
+    
+    def _query(self, name: str, query: str, **filters) -> Any:
+        """Run report query name as a prepared statement with the given filters."""
+        return self.db_manager.execute_read(self._sql(query), self._params(name, **filters),
+                                            name=name, prepared=True)
+        
+    def run_all_analyses(self, start_date: date = None, end_date: date = None,
+                         client_ids: Iterable[str] = None, top_n: int = None) -> Dict[str, Any]:
+        """Run all analysis queries and return formatted results.
+        
+        The date window [start_date, end_date) and client_ids restrict every
+        report; top_n is the number of clients ranked by the top clients and
+        discount scenario reports.
+        """
         results = {}
+        filters = {'start_date': start_date, 'end_date': end_date,
+                   'client_ids': list(client_ids) if client_ids is not None else None}
         
         logger.info("Running comprehensive business analysis...")
         
-        # Query 1: Top 5 clients by total costs
-        results['top_5_clients'] = self.get_top_clients_by_revenue()
+        # Query 1: Top clients by total costs
+        with self._profiled('top_5_clients'):
+            results['top_5_clients'] = self.get_top_clients_by_revenue(limit=top_n, **filters)
         
         # Query 2: Month-over-month growth analysis
-        results['mom_growth'] = self.get_month_over_month_growth()
+        with self._profiled('mom_growth'):
+            results['mom_growth'] = self.get_month_over_month_growth(**filters)
         
         # Query 3: Discount scenario analysis
-        results['discount_analysis'] = self.get_discount_scenario_analysis()
+        with self._profiled('discount_analysis'):
+            results['discount_analysis'] = self.get_discount_scenario_analysis(top_n=top_n, **filters)
         
         # Query 4: Express to Ground reclassification analysis
-        results['reclassification_analysis'] = self.get_express_reclassification_analysis()
+        with self._profiled('reclassification_analysis'):
+            results['reclassification_analysis'] = self.get_express_reclassification_analysis(**filters)
         
         # Additional insights
-        results['summary_stats'] = self.get_summary_statistics()
+        with self._profiled('summary_stats'):
+            results['summary_stats'] = self.get_summary_statistics(**filters)
         
         return results
     
-    def get_top_clients_by_revenue(self) -> Dict[str, Any]:
-        """Query 1: Top 5 clients by total calculated costs."""
-        logger.info("Running Query 1: Top 5 clients by calculated costs")
-        
-        query = '''
-        SELECT 
-            client_id,
-            client_name,
-            client_status,
-            SUM(calculated_cost) as total_invoice_cost,
-            COUNT(invoice_id) as invoice_count,
-            AVG(calculated_cost) as avg_invoice_cost
-        FROM invoice_facts 
-        WHERE client_id IS NOT NULL
-        GROUP BY client_id, client_name, client_status
-        ORDER BY total_invoice_cost DESC
-        LIMIT 5;
-        '''
-        
-        result = self.db_manager.execute_sql(query)
+    def verify_query_plans(self, max_seq_scan_rows: int = None) -> Dict[str, List[Dict[str, Any]]]:
+        """EXPLAIN each analysis query and report large sequential scans on invoice_facts.
+        
+        Queries are explained as the reports run them, as EXECUTE of their prepared
+        statement, in both the custom plan used for the first executions and the
+        generic plan Postgres may switch to. Returns a mapping of query name to
+        offending scan nodes, each tagged with its plan; an empty mapping means
+        every query plan uses the fact indexes at the current data volume.
+        """
+        threshold = PLAN_CHECK_CONFIG['max_seq_scan_rows'] if max_seq_scan_rows is None else max_seq_scan_rows
+        logger.info(f"Verifying analysis query plans (seq scan threshold: {threshold:,} rows)")
+        
+        regressions = {}
+        for name, query in ANALYSIS_QUERIES.items():
+            node_types = []
+            for plan_kind in ('custom', 'generic'):
+                plan = self.db_manager.explain_prepared(self._sql(query), self._params(name), name=name,
+                                                        generic=plan_kind == 'generic')
+                scans = [dict(scan, plan=plan_kind) for scan in _find_seq_scans(plan, 'invoice_facts')
+                         if scan['rows'] > threshold]
+                regressions.setdefault(name, []).extend(scans)
+                node_types.append(f"{plan_kind} {plan['Node Type']}")
+            if regressions[name]:
+                logger.warning(f"Query {name} regressed to a sequential scan: {regressions[name]}")
+            else:
+                del regressions[name]
+                logger.info(f"Query {name} plan OK ({', '.join(node_types)})")
+        
+        return regressions
+    
+    def get_top_clients_by_revenue(self, limit: int = None, start_date: date = None, end_date: date = None,
+                                   client_ids: Iterable[str] = None) -> Dict[str, Any]:
+        """Query 1: Top clients (5 by default) by total calculated costs."""
+        limit = limit or REPORT_CONFIG['limits']['top_clients']
+        logger.info(f"Running Query 1: Top {limit} clients by calculated costs")
+        
+        result = self._query('top_clients', TOP_CLIENTS_QUERY, limit=limit, start_date=start_date,
+                             end_date=end_date, client_ids=client_ids)
         data = result.fetchall()
         
         return {
-            'query': 'Top 5 clients by total calculated costs',
+            'query': f'Top {limit} clients by total calculated costs',
             'data': data,
             'columns': ['client_id', 'client_name', 'client_status', 'total_cost', 'invoice_count', 'avg_invoice_cost'],
             'insights': [
                 f"Top client: {data[0][1]} with ${data[0][3]:,.2f} in costs",
-                f"Total costs from top 5: ${sum(row[3] for row in data):,.2f}",
+                f"Total costs from top {limit}: ${sum(row[3] for row in data):,.2f}",
                 f"Average invoices per top client: {sum(row[4] for row in data) / len(data):.1f}"
-            ]
+            ] if data else []
         }
     
-    def get_month_over_month_growth(self) -> Dict[str, Any]:
-        """Query 2: Month-over-month cost growth per client for 2024-2025."""
+    def get_month_over_month_growth(self, start_date: date = None, end_date: date = None,
+                                    client_ids: Iterable[str] = None, limit: int = None) -> Dict[str, Any]:
+        """Query 2: Month-over-month cost growth per client, for 2024-2025 unless a window is given."""
         logger.info("Running Query 2: Month-over-month growth analysis")
         
-        query = '''
-        WITH monthly_totals AS (
-            SELECT 
-                client_id,
-                client_name,
-                DATE_TRUNC('month', invoice_date) as invoice_month,
-                SUM(calculated_cost) as monthly_amount,
-                COUNT(*) as monthly_invoices
-            FROM invoice_facts 
-            WHERE invoice_date >= '2024-01-01' 
-                AND invoice_date < '2026-01-01'
-                AND client_id IS NOT NULL
-            GROUP BY client_id, client_name, DATE_TRUNC('month', invoice_date)
-        ),
-        with_previous AS (
-            SELECT 
-                *,
-                LAG(monthly_amount) OVER (PARTITION BY client_id ORDER BY invoice_month) as prev_month_amount,
-                LAG(monthly_invoices) OVER (PARTITION BY client_id ORDER BY invoice_month) as prev_month_invoices
-            FROM monthly_totals
-        )
-        SELECT 
-            client_id,
-            client_name,
-            invoice_month,
-            monthly_amount,
-            prev_month_amount,
-            monthly_invoices,
-            prev_month_invoices,
-            CASE 
-                WHEN prev_month_amount IS NULL OR prev_month_amount = 0 THEN NULL
-                ELSE ((monthly_amount - prev_month_amount) / prev_month_amount * 100)
-            END as growth_percentage
-        FROM with_previous
-        WHERE prev_month_amount IS NOT NULL
-        ORDER BY client_id, invoice_month
-        LIMIT 20;
-        '''
-        
-        result = self.db_manager.execute_sql(query)
+        result = self._query('mom_growth', MOM_GROWTH_QUERY, limit=limit, start_date=start_date,
+                             end_date=end_date, client_ids=client_ids)
         data = result.fetchall()
         
         positive_growth = len([r for r in data if r[7] and r[7] > 0])
         negative_growth = len([r for r in data if r[7] and r[7] < 0])
+        growth_rates = [r[7] for r in data if r[7]]
+        if start_date is None and end_date is None:
+            start_date, end_date = REPORT_CONFIG['growth_window']
         
         return {
-            'query': 'Month-over-month cost growth per client (2024-2025)',
+            'query': f'Month-over-month cost growth per client ({start_date or "start"} to {end_date or "latest"})',
             'data': data,
             'columns': ['client_id', 'client_name', 'month', 'monthly_cost', 'prev_month_cost', 
                        'monthly_invoices', 'prev_month_invoices', 'growth_percentage'],
             'insights': [
                 f"Periods with positive growth: {positive_growth}",
-                f"Periods with negative growth: {negative_growth}",
-                f"Growth rate range: {min([r[7] for r in data if r[7]]):.1f}% to {max([r[7] for r in data if r[7]]):.1f}%"
-            ]
+                f"Periods with negative growth: {negative_growth}"
+            ] + ([f"Growth rate range: {min(growth_rates):.1f}% to {max(growth_rates):.1f}%"] if growth_rates else [])
         }
     
-    def get_discount_scenario_analysis(self) -> Dict[str, Any]:
-        """Query 3: Discount scenario analysis (20% off GROUND, 30% off FREIGHT, 50% off 2DAY)."""
+    def get_discount_scenario_analysis(self, top_n: int = None, start_date: date = None, end_date: date = None,
+                                       client_ids: Iterable[str] = None, limit: int = None) -> Dict[str, Any]:
+        """Query 3: Discount scenario analysis (20% off GROUND, 30% off FREIGHT, 50% off 2DAY).
+        
+        Totals cover the top limit spenders after discounts (10 by default), of
+        which the top top_n (5 by default) are reported.
+        """
         logger.info("Running Query 3: Discount scenario analysis")
+        top_n = top_n or REPORT_CONFIG['limits']['top_clients']
+        limit = max(limit or REPORT_CONFIG['limits']['discount_scenario'], top_n)
         
-        query = '''
-        WITH discounted_costs AS (
-            SELECT 
-                client_id,
-                client_name,
-                shipment_type,
-                SUM(calculated_cost) as original_amount,
-                SUM(CASE shipment_type
-                    WHEN 'GROUND'  THEN calculated_cost * 0.8
-                    WHEN 'FREIGHT' THEN calculated_cost * 0.7
-                    WHEN '2DAY'    THEN calculated_cost * 0.5
-                    ELSE calculated_cost
-                END) as discounted_amount,
-                COUNT(*) as shipment_count
-            FROM invoice_facts
-            WHERE client_id IS NOT NULL
-            GROUP BY client_id, client_name, shipment_type
-        ),
-        client_totals AS (
-            SELECT 
-                client_id,
-                client_name,
-                SUM(original_amount) as total_original,
-                SUM(discounted_amount) as total_discounted,
-                SUM(original_amount) - SUM(discounted_amount) as total_savings,
-                SUM(shipment_count) as total_shipments
-            FROM discounted_costs
-            GROUP BY client_id, client_name
-        )
-        SELECT 
-            client_id,
-            client_name,
-            total_original,
-            total_discounted,
-            total_savings,
-            (total_savings / total_original * 100) as savings_percentage,
-            total_shipments
-        FROM client_totals
-        ORDER BY total_discounted DESC
-        LIMIT 10;
-        '''
-        
-        result = self.db_manager.execute_sql(query)
+        result = self._query('discount_scenario', DISCOUNT_SCENARIO_QUERY, limit=limit, start_date=start_date,
+                             end_date=end_date, client_ids=client_ids)
         data = result.fetchall()
         
         total_savings = sum(row[4] for row in data)
         total_original = sum(row[2] for row in data)
         
         return {
-            'query': 'Discount scenario - new top 5 spenders after discounts',
-            'data': data[:5],
+            'query': f'Discount scenario - new top {top_n} spenders after discounts',
+            'data': data[:top_n],
             'columns': ['client_id', 'client_name', 'original_cost', 'discounted_cost', 
                        'total_savings', 'savings_percentage', 'total_shipments'],
             'insights': [
-                f"Total savings for top 10 clients: ${total_savings:,.2f}",
+                f"Total savings for top {len(data)} clients: ${total_savings:,.2f}",
                 f"Average savings percentage: {(total_savings / total_original * 100):.1f}%",
                 f"New #1 spender after discounts: {data[0][1]} (${data[0][3]:,.2f})"
-            ]
+            ] if data else []
         }
     
-    def get_express_reclassification_analysis(self) -> Dict[str, Any]:
+    def get_express_reclassification_analysis(self, start_date: date = None, end_date: date = None,
+                                              client_ids: Iterable[str] = None) -> Dict[str, Any]:
         """Query 4: EXPRESS to GROUND reclassification savings analysis."""
         logger.info("Running Query 4: EXPRESS to GROUND reclassification analysis")
         
-        query = '''
-        WITH express_analysis AS (
-            SELECT 
-                client_id,
-                client_name,
-                COUNT(CASE WHEN shipment_type = 'EXPRESS' THEN 1 END) as express_shipments,
-                SUM(CASE WHEN shipment_type = 'EXPRESS' THEN calculated_cost ELSE 0 END) as express_cost,
-                SUM(CASE WHEN shipment_type = 'EXPRESS' THEN calculated_cost * 0.1 ELSE 0 END) as ground_equivalent_cost,
-                SUM(calculated_cost) as total_cost
-            FROM invoice_facts
-            WHERE client_id IS NOT NULL
-            GROUP BY client_id, client_name
-            HAVING COUNT(CASE WHEN shipment_type = 'EXPRESS' THEN 1 END) > 0
-        )
-        SELECT 
-            client_id,
-            client_name,
-            express_shipments,
-            express_cost,
-            ground_equivalent_cost,
-            express_cost - ground_equivalent_cost as total_savings,
-            ((express_cost - ground_equivalent_cost) / total_cost * 100) as savings_percentage,
-            CASE 
-                WHEN ((express_cost - ground_equivalent_cost) / total_cost * 100) > 50 THEN 'YES'
-                ELSE 'NO'
-            END as over_50_percent_savings,
-            CASE 
-                WHEN (express_cost - ground_equivalent_cost) > 500000 THEN 'YES'
-                ELSE 'NO'
-            END as over_500k_savings,
-            total_cost
-        FROM express_analysis
-        ORDER BY total_savings DESC;
-        '''
-        
-        result = self.db_manager.execute_sql(query)
+        result = self._query('reclassification', RECLASSIFICATION_QUERY, start_date=start_date,
+                             end_date=end_date, client_ids=client_ids)
         data = result.fetchall()
         
         over_50_percent = [r for r in data if r[7] == 'YES']
@@ -252,9 +403,8 @@ class AnalysisEngine:
             'insights': [
                 f"Total potential savings across all clients: ${total_potential_savings:,.2f}",
                 f"Clients with >50% savings: {len(over_50_percent)} clients",
-                f"Clients with >$500k savings: {len(over_500k)} clients",
-                f"Biggest savings opportunity: {data[0][1]} (${data[0][5]:,.2f})"
-            ],
+                f"Clients with >$500k savings: {len(over_500k)} clients"
+            ] + ([f"Biggest savings opportunity: {data[0][1]} (${data[0][5]:,.2f})"] if data else []),
             'answers': {
                 'clients_over_50_percent_savings': [r[1] for r in over_50_percent],
                 'clients_over_500k_savings': [r[1] for r in over_500k],
@@ -262,38 +412,22 @@ class AnalysisEngine:
             }
         }
     
-    def get_summary_statistics(self) -> Dict[str, Any]:
+    def get_summary_statistics(self, start_date: date = None, end_date: date = None,
+                               client_ids: Iterable[str] = None) -> Dict[str, Any]:
         """Get overall pipeline and data summary statistics."""
         logger.info("Generating summary statistics")
+        filters = {'start_date': start_date, 'end_date': end_date, 'client_ids': client_ids}
+        
+        stats = self._query('summary_stats', SUMMARY_STATS_QUERY, **filters).fetchone()
+        shipment_data = self._query('shipment_breakdown', SHIPMENT_BREAKDOWN_QUERY, **filters).fetchall()
         
-        stats_query = '''
-        SELECT 
-            COUNT(DISTINCT client_id) as unique_clients,
-            COUNT(DISTINCT invoice_id) as unique_invoices,
-            SUM(calculated_cost) as total_costs,
-            AVG(calculated_cost) as avg_invoice_cost,
-            MIN(invoice_date) as earliest_invoice,
-            MAX(invoice_date) as latest_invoice,
-            COUNT(DISTINCT shipment_type) as unique_shipment_types
-        FROM invoice_facts;
-        '''
-        
-        result = self.db_manager.execute_sql(stats_query)
-        stats = result.fetchone()
-        
-        shipment_query = '''
-        SELECT 
-            shipment_type,
-            COUNT(*) as shipment_count,
-            SUM(calculated_cost) as shipment_costs,
-            AVG(calculated_cost) as avg_shipment_cost
-        FROM invoice_facts
-        GROUP BY shipment_type
-        ORDER BY shipment_costs DESC;
-        '''
-        
-        result = self.db_manager.execute_sql(shipment_query)
-        shipment_data = result.fetchall()
+        if not stats[1]:
+            return {
+                'overall_stats': {'unique_clients': 0, 'unique_invoices': 0, 'total_costs': 0,
+                                  'average_invoice_cost': None, 'date_range': None, 'unique_shipment_types': 0},
+                'shipment_breakdown': shipment_data,
+                'insights': ["No invoices match the report filters"]
+            }
         
         return {
             'overall_stats': {
@@ -313,6 +447,68 @@ class AnalysisEngine:
             ]
         }
     
+    def get_sketch_summary(self, run_ids: List[str] = None) -> Dict[str, Any]:
+        """Approximate summary statistics and top clients from stored ingestion sketches.
+        
+        Merges every part of the given runs, or of the most recently updated run,
+        without scanning invoice_facts.
+        """
+        # numpy/pandas are only loaded when sketches are read
+        from .sketches import InvoiceSketch
+        
+        if run_ids:
+            rows = self.db_manager.execute_read(
+                "SELECT run_id, sketch FROM ingestion_sketches WHERE run_id = ANY(:run_ids)",
+                {'run_ids': list(run_ids)}, name='sketch_summary'
+            ).fetchall()
+        else:
+            rows = self.db_manager.execute_read('''
+            SELECT run_id, sketch FROM ingestion_sketches
+            WHERE run_id = (SELECT run_id FROM ingestion_sketches ORDER BY updated_timestamp DESC LIMIT 1)
+            ''', name='sketch_summary').fetchall()
+        
+        merged = InvoiceSketch()
+        for _, sketch in rows:
+            merged.merge(InvoiceSketch.from_dict(sketch))
+        
+        summary = merged.summary()
+        summary['runs'] = sorted({run_id for run_id, _ in rows})
+        return summary
+    
+    def generate_sketch_report(self, summary: Dict[str, Any]) -> str:
+        """Format an approximate summary from ingestion sketches as a report string."""
+        report_lines = []
+        report_lines.append("\n" + "="*80)
+        report_lines.append(f"APPROXIMATE SUMMARY FROM INGESTION SKETCHES ({', '.join(summary['runs']) or 'no runs'})")
+        report_lines.append("="*80)
+        if not summary['rows']:
+            report_lines.append("No ingestion sketches found")
+            return "\n".join(report_lines)
+        
+        earliest, latest = summary['date_range']
+        quantiles = summary['amount_quantiles']
+        report_lines.append(f"• ~{summary['approx_unique_clients']:,} unique clients and "
+                            f"~{summary['approx_unique_invoices']:,} unique invoices ({summary['rows']:,} rows)")
+        report_lines.append(f"• Estimated costs at current rates: ${summary['total_cost']:,.2f} "
+                            f"(avg ${summary['average_cost']:,.2f})")
+        report_lines.append(f"• Invoice amounts: p50 ${quantiles['p50']:,.2f}, p90 ${quantiles['p90']:,.2f}, "
+                            f"p99 ${quantiles['p99']:,.2f}")
+        report_lines.append(f"• Invoices from {earliest} to {latest}")
+        
+        report_lines.append("\nTOP CLIENTS BY ESTIMATED COST")
+        report_lines.append("-" * 50)
+        for i, (client, cost, error) in enumerate(summary['top_clients'], 1):
+            bound = f" (may be overstated by up to ${error:,.2f})" if error else ""
+            report_lines.append(f"{i}. {client} - ${cost:,.2f}{bound}")
+        
+        report_lines.append("\nSHIPMENT TYPE BREAKDOWN")
+        report_lines.append("-" * 50)
+        for shipment_type, count, cost in summary['shipment_breakdown']:
+            report_lines.append(f"{shipment_type}: {count:,} shipments, ${cost:,.2f} estimated")
+        
+        report_lines.append("\n" + "="*80)
+        return "\n".join(report_lines)
+    
     def generate_analysis_report(self, results: Dict[str, Any]) -> str:
         """Generate a formatted analysis report as a string."""
         report_lines = []
@@ -327,7 +523,7 @@ class AnalysisEngine:
             report_lines.append(f"• {insight}")
         
         # Query 1 Results
-        report_lines.append("\nQUERY 1: TOP 5 CLIENTS BY COSTS")
+        report_lines.append(f"\nQUERY 1: TOP {len(results['top_5_clients']['data'])} CLIENTS BY COSTS")
         report_lines.append("-" * 50)
         for i, row in enumerate(results['top_5_clients']['data'], 1):
             report_lines.append(f"{i}. {row[1]} ({row[0]}) - ${row[3]:,.2f} ({row[4]} invoices)")
@@ -353,7 +549,7 @@ class AnalysisEngine:
             report_lines.append("No month-over-month growth data available")
         
         # Query 3 Results
-        report_lines.append("\nQUERY 3: DISCOUNT SCENARIO - NEW TOP 5 SPENDERS")
+        report_lines.append(f"\nQUERY 3: DISCOUNT SCENARIO - NEW TOP {len(results['discount_analysis']['data'])} SPENDERS")
         report_lines.append("-" * 50)
         for i, row in enumerate(results['discount_analysis']['data'], 1):
             savings_pct = row[5]
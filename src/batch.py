@@ -0,0 +1,154 @@
+"""
+Multi-dataset batch runs of the Reveel data pipeline.
+Runs the pipeline for many datasets (e.g. customer accounts) concurrently on one shared
+connection pool, each into its own Postgres schema, under a global budget of running stages.
+"""
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+from sqlalchemy import create_engine
+from loguru import logger
+
+from .config import DB_CONFIG, BATCH_CONFIG, UPSERT_CONFIG
+from .database import DatabaseManager, SCHEMA_NAME
+from .instrumentation import QueryMetrics
+from .pipeline import RevealPipeline
+
+
+def dataset_schema(name: str, prefix: str = None) -> str:
+    """Postgres schema of a dataset: its name lowercased, prefixed and reduced to [a-z0-9_]."""
+    prefix = BATCH_CONFIG['schema_prefix'] if prefix is None else prefix
+    schema = prefix + re.sub(r'[^a-z0-9_]+', '_', name.strip().lower())
+    if not SCHEMA_NAME.match(schema):
+        raise ValueError(f"Dataset name {name!r} does not give a valid schema name ({schema!r})")
+    return schema
+
+
+def parse_dataset(spec: str) -> Tuple[str, str]:
+    """Parse a NAME=DIR dataset specification."""
+    name, sep, data_dir = spec.partition('=')
+    if not sep or not name.strip() or not data_dir.strip():
+        raise ValueError(f"Dataset {spec!r} is not NAME=DIR")
+    return name.strip(), data_dir.strip()
+
+
+def read_datasets_file(path: str) -> List[Tuple[str, str]]:
+    """Read NAME=DIR datasets, one per line; blank lines and # comments are ignored."""
+    datasets = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                datasets.append(parse_dataset(line))
+    return datasets
+
+
+class BatchRunner:
+    """Runs the full pipeline for several datasets, each in its own schema.
+
+    All datasets share one engine, so one connection pool and one set of query
+    metrics. Up to max_datasets pipelines run at once, and their stages share
+    worker_budget slots, so the number of stages running in the process stays
+    bounded however many datasets are in flight. A failed dataset is reported
+    without stopping the others.
+    """
+
+    def __init__(self, datasets: List[Tuple[str, str]], db_config: Dict = None,
+                 worker_budget: int = None, max_datasets: int = None,
+                 checkpoint_dir: str = None, spill_dir: str = None, **pipeline_options):
+        """Initialize a batch of (name, data_dir) datasets.
+
+        pipeline_options are passed to every RevealPipeline; checkpoint_dir and
+        spill_dir get a subdirectory per dataset.
+        """
+        self.datasets = [(name, data_dir, dataset_schema(name)) for name, data_dir in datasets]
+        names = [name for name, _, _ in self.datasets]
+        schemas = [schema for _, _, schema in self.datasets]
+        if len(set(names)) != len(names) or len(set(schemas)) != len(schemas):
+            raise ValueError(f"Dataset names must be distinct and map to distinct schemas: {names}")
+
+        self.db_config = db_config or DB_CONFIG
+        self.worker_budget = worker_budget or BATCH_CONFIG['worker_budget']
+        self.max_datasets = min(max_datasets or BATCH_CONFIG['max_datasets'], len(self.datasets)) or 1
+        self.checkpoint_dir = checkpoint_dir
+        self.spill_dir = spill_dir
+        self.pipeline_options = pipeline_options
+        self.slots = threading.BoundedSemaphore(self.worker_budget)
+        self.metrics = QueryMetrics()
+        self.engine = None
+
+    def _create_engine(self):
+        """Create the engine whose pool every dataset shares.
+
+        A running stage holds a connection and may check out one more per upsert
+        loader thread, so the pool grows to that many beyond the stage budget.
+        """
+        connection_string = DatabaseManager(self.db_config).connection_string
+        engine = create_engine(connection_string, pool_size=self.worker_budget,
+                               max_overflow=self.worker_budget * UPSERT_CONFIG['loader_workers'])
+        self.metrics.attach(engine)
+        return engine
+
+    def _run_dataset(self, name: str, data_dir: str, schema: str) -> Dict[str, Any]:
+        """Run the full pipeline for one dataset into its schema."""
+        start = time.perf_counter()
+        logger.info(f"Dataset {name}: starting from {data_dir} into schema {schema}")
+        db_manager = DatabaseManager(self.db_config, partitioned=self.pipeline_options.get('partitioned', False),
+                                     schema=schema, engine=self.engine, metrics=self.metrics,
+                                     money_cents=self.pipeline_options.get('money_cents', False))
+        try:
+            pipeline = RevealPipeline(
+                data_dir=data_dir,
+                db_config=self.db_config,
+                checkpoint_dir=os.path.join(self.checkpoint_dir, name) if self.checkpoint_dir else None,
+                spill_dir=os.path.join(self.spill_dir, name) if self.spill_dir else None,
+                db_manager=db_manager,
+                stage_slots=self.slots,
+                **self.pipeline_options
+            )
+            results = pipeline.run_full_pipeline()
+        except Exception as e:
+            logger.error(f"Dataset {name} failed: {e}")
+            return {'dataset': name, 'schema': schema, 'data_dir': data_dir, 'status': 'FAILED',
+                    'client_count': None, 'invoice_count': None,
+                    'seconds': time.perf_counter() - start, 'error': str(e)}
+
+        seconds = time.perf_counter() - start
+        logger.info(f"Dataset {name}: {results['client_count']} clients, "
+                    f"{results['invoice_count']} invoices in {seconds:.2f}s")
+        return {'dataset': name, 'schema': schema, 'data_dir': data_dir, 'status': 'DONE',
+                'client_count': results['client_count'], 'invoice_count': results['invoice_count'],
+                'seconds': seconds, 'error': None}
+
+    def run(self) -> List[Dict[str, Any]]:
+        """Run every dataset and return per-dataset results in input order."""
+        logger.info(f"Batch of {len(self.datasets)} datasets: up to {self.max_datasets} at once, "
+                    f"{self.worker_budget} concurrent stages")
+        self.engine = self._create_engine()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_datasets,
+                                    thread_name_prefix='dataset') as executor:
+                futures = [executor.submit(self._run_dataset, name, data_dir, schema)
+                           for name, data_dir, schema in self.datasets]
+                results = [future.result() for future in futures]
+        finally:
+            self.metrics.log_summary()
+            self.engine.dispose()
+
+        self.log_summary(results)
+        return results
+
+    @staticmethod
+    def log_summary(results: List[Dict[str, Any]]) -> None:
+        """Log the outcome of each dataset."""
+        logger.info("=== BATCH SUMMARY ===")
+        for entry in results:
+            if entry['status'] == 'DONE':
+                outcome = f"{entry['client_count']} clients, {entry['invoice_count']} invoices"
+            else:
+                outcome = entry['error']
+            logger.info(f"{entry['dataset']:<24} {entry['schema']:<32} {entry['status']:<6} "
+                        f"{entry['seconds']:>8.2f}s  {outcome}")
@@ -0,0 +1,70 @@
+"""
+Durable stage checkpoints for resuming the Reveel data pipeline after a failure.
+Stores each completed stage's output together with a fingerprint of its inputs.
+"""
+import os
+import glob
+import pickle
+from datetime import datetime, timezone
+from typing import Any, Tuple
+from loguru import logger
+
+
+class CheckpointStore:
+    """Keeps one pickled checkpoint per stage in a local directory.
+
+    Checkpoints are only ever read back from this directory, which must not be
+    writable by untrusted users since unpickling can run arbitrary code.
+    """
+
+    def __init__(self, directory: str):
+        """Initialize store rooted at directory."""
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, stage_name: str) -> str:
+        """Get the checkpoint file of a stage."""
+        return os.path.join(self.directory, f"{stage_name}.pkl")
+
+    def load(self, stage_name: str, input_key: str) -> Tuple[bool, Any]:
+        """Get (found, output) of a stage checkpointed with the same input fingerprint."""
+        path = self._path(stage_name)
+        if not os.path.exists(path):
+            return False, None
+
+        try:
+            with open(path, 'rb') as f:
+                checkpoint = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+            return False, None
+
+        if checkpoint.get('input_key') != input_key:
+            return False, None
+        return True, checkpoint['output']
+
+    def save(self, stage_name: str, input_key: str, output: Any) -> None:
+        """Atomically record a completed stage's output."""
+        path = self._path(stage_name)
+        tmp_path = f"{path}.tmp"
+        checkpoint = {
+            'stage': stage_name,
+            'input_key': input_key,
+            'saved_at': datetime.now(timezone.utc).isoformat(),
+            'output': output
+        }
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            # A missing checkpoint only costs a rerun of the stage, so never fail the run
+            logger.warning(f"Could not checkpoint stage {stage_name}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self) -> None:
+        """Remove every checkpoint."""
+        for path in glob.glob(os.path.join(glob.escape(self.directory), '*.pkl')):
+            os.remove(path)
+        logger.info(f"Cleared checkpoints in {self.directory}")
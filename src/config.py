@@ -10,7 +10,19 @@ DB_CONFIG = {
     'port': int(os.getenv('POSTGRES_PORT', '5432')),
     'database': os.getenv('POSTGRES_DB', 'postgres'),
     'user': os.getenv('POSTGRES_USER', 'postgres'),
-    'password': os.getenv('POSTGRES_PASSWORD', '')
+    'password': os.getenv('POSTGRES_PASSWORD', ''),
+    # Optional read replica (SQLAlchemy URL) for read-only analysis queries
+    'replica_dsn': os.getenv('POSTGRES_REPLICA_DSN')
+}
+
+# Read replica routing: reads fall back to the primary while the replica is unreachable,
+# lags by more than max_lag_seconds or is not a standby at all (e.g. a stale restored copy);
+# its health is re-checked every check_interval seconds. allow_standalone accepts a server
+# that is not in recovery as a replica with no lag, for tests only.
+REPLICA_CONFIG = {
+    'max_lag_seconds': float(os.getenv('REPLICA_MAX_LAG_SECONDS', '30')),
+    'check_interval': 10.0,
+    'allow_standalone': os.getenv('REPLICA_ALLOW_STANDALONE', '').lower() in ('1', 'true')
 }
 
 # Rate sheet for cost calculations
@@ -36,6 +48,125 @@ DATA_PATTERNS = {
     'invoice_pdfs': 'invoices*.pdf'
 }
 
+# Pipeline stage scheduling
+PIPELINE_CONFIG = {
+    'max_workers': int(os.getenv('PIPELINE_MAX_WORKERS', '4')),
+    # Streaming invoice ingestion: rows per chunk and chunks buffered between workers
+    'stream_chunk_rows': 50_000,
+    'stream_queue_depth': 2
+}
+
+# Upsert loading: rows per bounded-transaction batch, batches merged in parallel
+# connections, and the advisory lock buckets that conflict keys are hashed into
+UPSERT_CONFIG = {
+    'batch_rows': int(os.getenv('UPSERT_BATCH_ROWS', '50000')),
+    'loader_workers': int(os.getenv('UPSERT_WORKERS', '4')),
+    'lock_buckets': 64
+}
+
+# Out-of-core invoice deduplication: number of hash partitions rows are spilled to,
+# and where spill files go (system temp directory when unset)
+DEDUPE_CONFIG = {
+    'spill_partitions': 64,
+    'spill_dir': os.getenv('PIPELINE_SPILL_DIR')
+}
+
+# Stage checkpoints written by the CLI so a failed run can be resumed with --resume
+CHECKPOINT_CONFIG = {
+    'dir': os.getenv('PIPELINE_CHECKPOINT_DIR', '.pipeline_checkpoints')
+}
+
+# Sharded ingestion: default number of shards input files are split into, seconds
+# between progress checks while the coordinator waits, and how long it waits for
+# all shards before giving up (forever when unset)
+SHARD_CONFIG = {
+    'shard_count': int(os.getenv('PIPELINE_SHARDS', '4')),
+    'poll_interval': 5.0,
+    'wait_timeout': float(os.getenv('PIPELINE_SHARD_TIMEOUT')) if os.getenv('PIPELINE_SHARD_TIMEOUT') else None
+}
+
+# Multi-dataset batch runs: pipeline stages running at once across all datasets,
+# datasets in flight at once, and the prefix of each dataset's Postgres schema
+BATCH_CONFIG = {
+    'worker_budget': int(os.getenv('BATCH_WORKERS', '8')),
+    'max_datasets': int(os.getenv('BATCH_DATASETS', '4')),
+    'schema_prefix': 'tenant_'
+}
+
+# Directory watching: seconds between scans, and how long a file must be unchanged
+# before it is considered fully written
+WATCH_CONFIG = {
+    'poll_interval': 5.0,
+    'settle_seconds': 2.0
+}
+
+# Query metrics: statements at or above slow_query_ms are appended to the slow query
+# log (JSON lines). With explain_slow_queries, read-only ones are re-run synchronously
+# under EXPLAIN (ANALYZE, BUFFERS) for their plan, doubling their cost; off by default
+QUERY_METRICS_CONFIG = {
+    'slow_query_ms': float(os.getenv('SLOW_QUERY_MS', '1000')),
+    'slow_query_log': os.getenv('SLOW_QUERY_LOG', 'slow_queries.log'),
+    'explain_slow_queries': os.getenv('EXPLAIN_SLOW_QUERIES', '').lower() in ('1', 'true')
+}
+
+# Report queries: the month-over-month growth window used when no date window is given
+# (other reports then cover every invoice date), and the rows each ranking returns
+REPORT_CONFIG = {
+    'growth_window': (os.getenv('REPORT_GROWTH_START', '2024-01-01'),
+                      os.getenv('REPORT_GROWTH_END', '2026-01-01')),
+    'limits': {
+        'top_clients': 5,
+        'mom_growth': 20,
+        'discount_scenario': 10
+    }
+}
+
+# Query plan verification: a sequential scan over more estimated rows than this
+# on a fact table is treated as a plan regression
+PLAN_CHECK_CONFIG = {
+    'max_seq_scan_rows': 100_000
+}
+
+# FX rates for converting non-USD invoice amounts in the fact build: a CSV of
+# currency, rate_date, usd_rate (USD per unit of currency)
+FX_CONFIG = {
+    'rates_file': os.getenv('FX_RATES_FILE')
+}
+
+# Client name matching for name-only invoices: minimum trigram similarity for a
+# fuzzy match, how close a runner-up may score before the name counts as ambiguous,
+# and the largest trigram block used to pick candidates
+NAME_MATCH_CONFIG = {
+    'min_similarity': 0.6,
+    'ambiguity_margin': 0.05,
+    'max_block_size': 500
+}
+
+# Data-quality accounting: offending values kept as samples per file, column and reason
+QUALITY_CONFIG = {
+    'sample_size': 5
+}
+
+# Ingestion sketches: HyperLogLog precision (2^p registers, ~1.6% error at 12), clients
+# kept by the top-k summary, and t-digest compression (about that many centroids; at 500,
+# p99.9 of skewed amounts stays within a few percent after many merges)
+SKETCH_CONFIG = {
+    'hll_precision': 12,
+    'top_k': 100,
+    'tdigest_compression': 500
+}
+
+# Profiling (--profile): seconds between stack samples for the flamegraph output
+PROFILE_CONFIG = {
+    'sample_interval': 0.005
+}
+
+# Parquet staging configuration
+STAGING_CONFIG = {
+    'compression': 'snappy',
+    'row_group_size': 100_000
+}
+
 # Logging configuration
 LOG_CONFIG = {
     'level': 'INFO',
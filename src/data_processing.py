@@ -1,17 +1,86 @@
 """
 Data processing utilities for normalizing and cleaning client and invoice data.
 """
+import io
 import os
 import re
+import csv
 import hashlib
 import glob
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Tuple, Iterator
 import pandas as pd
-from PyPDF2 import PdfReader
-import dateutil.parser as dparser
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
 from loguru import logger
 
 from .config import RATE_SHEET
+from .quality import DataQualityTracker
+from .sketches import InvoiceSketch
+
+
+# Compressed inputs by file suffix, decompressed on the fly while they are read
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.zst': 'zstd'}
+
+# Amounts whose last comma follows their last period use a decimal comma (1.234,56)
+DECIMAL_COMMA = re.compile(r'\..*,[^.]*$')
+
+# Largest whole-dollar part of an amount that still fits BIGINT cents after rounding
+MAX_CENTS_DOLLARS = (2 ** 63 - 1 - 100) // 100
+
+# CSV schema variants as (version, detection columns, {source column: standard column}).
+# The first variant whose detection columns all appear in the header wins; the last
+# entry is the default. When several source columns map to the same standard column,
+# the first one present in the header is used.
+CLIENT_CSV_SCHEMAS = [
+    ("v2", {"id", "tier"}, {
+        "id": "client_id",
+        "name": "client_name",
+        "tier": "tier",
+        "acct_open_date": "created_at"
+    }),
+    ("v3", {"customer_key", "display_name"}, {
+        "customer_key": "client_id",
+        "display_name": "client_name",
+        "active_flag": "status",
+        "signup_ts": "created_at",
+        "currency": "currency"
+    }),
+    ("v1", set(), {
+        "client_id": "client_id",
+        "client_name": "client_name",
+        "status": "status",
+        "created_at": "created_at"
+    }),
+]
+
+INVOICE_CSV_SCHEMAS = [
+    ("v2", {"inv_no", "customer_key"}, {
+        "inv_no": "invoice_id",
+        "customer_key": "client_id",
+        "inv_dt": "invoice_date",
+        "total": "amount",
+        "subtotal": "amount",
+        "curr": "currency",
+        "ship_type": "shipment_type"
+    }),
+    # Schema v3 uses client names instead of IDs
+    ("v3", {"invoice_uid", "client_ref"}, {
+        "invoice_uid": "invoice_id",
+        "client_ref": "client_name",
+        "issued_on": "invoice_date",
+        "amount_usd": "amount",
+        "shipment_category": "shipment_type"
+    }),
+    ("v1", set(), {
+        "invoice_id": "invoice_id",
+        "client_id": "client_id",
+        "invoice_date": "invoice_date",
+        "amount": "amount",
+        "currency": "currency",
+        "shipment_type": "shipment_type"
+    }),
+]
 
 
 def _row_hash(row: Dict[str, Any]) -> str:
@@ -20,6 +89,15 @@ def _row_hash(row: Dict[str, Any]) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
+def _row_hashes(df: pd.DataFrame, columns: List[str]) -> List[str]:
+    """Generate _row_hash values for every row without materializing per-row Series."""
+    keys = sorted(columns)
+    return [
+        hashlib.sha256("|".join(f"{k}={v}" for k, v in zip(keys, values)).encode("utf-8")).hexdigest()
+        for values in zip(*(df[k] for k in keys))
+    ]
+
+
 def _clean_name(x: Union[str, float, None]) -> Optional[str]:
     """Clean and standardize names."""
     if pd.isna(x):
@@ -66,7 +144,7 @@ def _norm_shipment_type(x: Union[str, float, None]) -> str:
 
 
 def _parse_date(x: Union[str, float, None]) -> pd.Timestamp:
-    """Parse various date formats to standardized datetime."""
+    """Parse various date formats to standardized datetime; NaT if missing or unparseable."""
     if pd.isna(x) or str(x).strip() == "":
         return pd.NaT
     try:
@@ -74,15 +152,15 @@ def _parse_date(x: Union[str, float, None]) -> pd.Timestamp:
         return pd.to_datetime(x, errors="coerce", utc=True)
     except Exception:
         try:
-            # Fallback to dateutil for complex formats
+            # Fallback to dateutil for complex formats (imported only when needed)
+            import dateutil.parser as dparser
             return pd.to_datetime(dparser.parse(str(x), fuzzy=True), utc=True)
         except Exception:
-            logger.warning(f"Could not parse date: {x}")
             return pd.NaT
 
 
 def _parse_amount(x: Union[str, float, int, None]) -> float:
-    """Parse monetary amounts, handling various formats."""
+    """Parse monetary amounts, handling various formats; NaN if unparseable."""
     if pd.isna(x):
         return 0.0
     
@@ -91,14 +169,151 @@ def _parse_amount(x: Union[str, float, int, None]) -> float:
     
     # Clean string amounts
     s = str(x).strip()
+    if DECIMAL_COMMA.search(s):
+        s = s.replace('.', '').replace(',', '.')
     # Remove currency symbols and commas
     s = re.sub(r'[^\d.-]', '', s)
     
     try:
         return float(s)
     except (ValueError, TypeError):
-        logger.warning(f"Could not parse amount: {x}")
-        return 0.0
+        return float('nan')
+
+
+def _parse_amounts_cents(raw: pd.Series) -> pd.Series:
+    """Parse monetary amounts like _parse_amount, vectorized into exact Int64 cents.
+    
+    The decimal digits are parsed directly rather than through floats, and digits
+    past the cents round half away from zero, as a cast to DECIMAL(..., 2) would.
+    Missing amounts are 0; unparseable ones, and ones beyond BIGINT cents, are NA.
+    """
+    text = pc.cast(pa.array(raw.astype('string[pyarrow]')), pa.string())
+    text = pc.if_else(pc.match_substring_regex(text, DECIMAL_COMMA.pattern),
+                      pc.replace_substring(pc.replace_substring(text, '.', ''), ',', '.'), text)
+    cleaned = pc.replace_substring_regex(text, r'[^\d.-]', '')
+    parts = pc.extract_regex(cleaned, r'^(?P<sign>-?)0*(?P<whole>\d*)(?:\.(?P<fraction>\d*))?$')
+    sign, whole, fraction = (parts.field(name) for name in ('sign', 'whole', 'fraction'))
+    
+    # Dollars, the two cent digits and the rounding digit as separate integers, so
+    # every amount that fits BIGINT cents is exact
+    fits = pc.and_(pc.and_(pc.is_valid(parts), pc.match_substring_regex(cleaned, r'\d')),
+                   pc.less_equal(pc.utf8_length(whole), 17))
+    dollars = pc.cast(pc.if_else(fits, pc.utf8_lpad(whole, 1, '0'), None), pa.int64())
+    dollars = pc.if_else(pc.less_equal(dollars, MAX_CENTS_DOLLARS), dollars, None)
+    fraction = pc.utf8_rpad(pc.coalesce(fraction, ''), 3, '0')
+    cents = pc.add(pc.multiply(dollars, 100),
+                   pc.cast(pc.utf8_slice_codeunits(fraction, 0, 2), pa.int64()))
+    cents = pc.add(cents, pc.cast(pc.greater_equal(pc.utf8_slice_codeunits(fraction, 2, 3), '5'), pa.int64()))
+    cents = pc.if_else(pc.equal(sign, '-'), pc.negate(cents), cents)
+    
+    # Mapping to Int64 directly keeps nulls without a lossy detour through float64
+    result = cents.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    result.index = raw.index
+    return result.mask(raw.isna(), 0)
+
+
+def _unparsed(raw: pd.Series, parsed: pd.Series) -> pd.Series:
+    """Raw values that were present but did not survive parsing."""
+    present = raw.notna() & (raw.astype(str).str.strip() != "")
+    return raw[present & parsed.isna()]
+
+
+def find_input_files(data_dir: str, pattern: str) -> List[str]:
+    """Find files matching pattern in data_dir or any subdirectory, plain or compressed.
+    
+    Files are ordered by directory depth, so those directly in data_dir come first,
+    then by path, whatever their compression; hidden directories are skipped.
+    Returned paths are not glob patterns: escape them before globbing.
+    """
+    files = []
+    for suffix in ('', *COMPRESSION_SUFFIXES):
+        full_pattern = os.path.join(glob.escape(data_dir), '**', pattern + suffix)
+        files.extend(glob.glob(full_pattern, recursive=True))
+    return sorted(files, key=lambda path: (os.path.relpath(path, data_dir).count(os.sep), path))
+
+
+def _input_format(path: str) -> Tuple[str, Optional[str]]:
+    """File extension of an input path ignoring any compression suffix, and its codec."""
+    root, ext = os.path.splitext(path.lower())
+    codec = COMPRESSION_SUFFIXES.get(ext)
+    if codec:
+        ext = os.path.splitext(root)[1]
+    return ext, codec
+
+
+def _open_input(path: str) -> pa.NativeFile:
+    """Open an input file for pyarrow: memory-mapped, or decompressed as it is read."""
+    codec = _input_format(path)[1]
+    if codec:
+        return pa.input_stream(path, compression=codec)
+    return pa.memory_map(path, 'r')
+
+
+def _sniff_csv_header(path: str) -> List[str]:
+    """Read only the header row of a CSV file (only its first block is decompressed)."""
+    if not _input_format(path)[1]:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            return next(csv.reader(f), [])
+    with _open_input(path) as source:
+        return next(csv.reader(io.TextIOWrapper(source, newline='', encoding='utf-8-sig')), [])
+
+
+def _resolve_csv_schema(header: List[str], schemas: List[Tuple[str, set, Dict[str, str]]],
+                        normalize_col=str.lower) -> Tuple[str, Dict[str, str]]:
+    """Pick the schema variant matching a header and map its present columns."""
+    cols_lower = {normalize_col(c): c for c in header}
+
+    for version, detect_cols, mapping in schemas:
+        if detect_cols.issubset(cols_lower):
+            break
+
+    column_mapping = {}
+    for source, standard in mapping.items():
+        if source in cols_lower and standard not in column_mapping.values():
+            column_mapping[cols_lower[source]] = standard
+
+    return version, column_mapping
+
+
+def _read_csv_columns(path: str, column_mapping: Dict[str, str]) -> pd.DataFrame:
+    """Read only the mapped columns of a CSV as strings and rename them in one pass."""
+    columns = list(column_mapping)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=columns,
+        column_types={col: pa.string() for col in columns},
+        strings_can_be_null=True
+    )
+
+    with _open_input(path) as source:
+        table = pa_csv.read_csv(source, convert_options=convert_options)
+
+    table = table.rename_columns([column_mapping[col] for col in table.column_names])
+    return table.to_pandas()
+
+
+def _iter_csv_columns(path: str, column_mapping: Dict[str, str],
+                      chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Stream the mapped columns of a CSV as renamed DataFrames of about chunk_rows rows."""
+    columns = list(column_mapping)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=columns,
+        column_types={col: pa.string() for col in columns},
+        strings_can_be_null=True
+    )
+
+    with _open_input(path) as source:
+        reader = pa_csv.open_csv(source, convert_options=convert_options)
+        names = [column_mapping[col] for col in reader.schema.names]
+
+        pending = None
+        for batch in reader:
+            table = pa.Table.from_batches([batch])
+            pending = table if pending is None else pa.concat_tables([pending, table])
+            while pending.num_rows >= chunk_rows:
+                yield pending.slice(0, chunk_rows).rename_columns(names).to_pandas()
+                pending = pending.slice(chunk_rows)
+        if pending is not None and pending.num_rows:
+            yield pending.rename_columns(names).to_pandas()
 
 
 class ClientProcessor:
@@ -106,13 +321,21 @@ class ClientProcessor:
     
     def __init__(self):
         self.required_columns = ["client_id", "client_name", "status", "tier", "created_at", "currency"]
+        self.quality = DataQualityTracker()
     
     def read_pdf(self, path: str) -> pd.DataFrame:
         """Extract client data from PDF files."""
         logger.info(f"Processing PDF file: {path}")
         
         try:
-            reader = PdfReader(path)
+            from PyPDF2 import PdfReader
+            
+            if _input_format(path)[1]:
+                # PdfReader needs random access, so compressed PDFs are inflated in memory
+                with _open_input(path) as source:
+                    reader = PdfReader(io.BytesIO(source.read()))
+            else:
+                reader = PdfReader(path)
             text = "\\n".join((p.extract_text() or "") for p in reader.pages)
             lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
             
@@ -154,46 +377,12 @@ class ClientProcessor:
         logger.info(f"Processing CSV file: {path}")
         
         try:
-            df = pd.read_csv(path)
-            logger.info(f"Read {len(df)} rows from {path}")
-            
-            # Normalize column names for easier matching
-            cols_lower = {c.lower(): c for c in df.columns}
-            
-            # Detect schema version and map columns
-            if "id" in cols_lower and "tier" in cols_lower:
-                # Schema v2
-                logger.debug("Detected schema v2")
-                column_mapping = {
-                    cols_lower.get("id", "id"): "client_id",
-                    cols_lower.get("name", "name"): "client_name", 
-                    cols_lower.get("tier", "tier"): "tier",
-                    cols_lower.get("acct_open_date", "acct_open_date"): "created_at"
-                }
-            elif "customer_key" in cols_lower and "display_name" in cols_lower:
-                # Schema v3
-                logger.debug("Detected schema v3")
-                column_mapping = {
-                    cols_lower.get("customer_key", "customer_key"): "client_id",
-                    cols_lower.get("display_name", "display_name"): "client_name",
-                    cols_lower.get("active_flag", "active_flag"): "status",
-                    cols_lower.get("signup_ts", "signup_ts"): "created_at",
-                    cols_lower.get("currency", "currency"): "currency"
-                }
-            else:
-                # Schema v1 (default)
-                logger.debug("Detected schema v1")
-                column_mapping = {
-                    cols_lower.get("client_id", "client_id"): "client_id",
-                    cols_lower.get("client_name", "client_name"): "client_name",
-                    cols_lower.get("status", "status"): "status", 
-                    cols_lower.get("created_at", "created_at"): "created_at"
-                }
+            header = _sniff_csv_header(path)
+            version, column_mapping = _resolve_csv_schema(header, CLIENT_CSV_SCHEMAS)
+            logger.debug(f"Detected schema {version}")
             
-            # Apply column mapping
-            for old_col, new_col in column_mapping.items():
-                if old_col in df.columns:
-                    df = df.rename(columns={old_col: new_col})
+            df = _read_csv_columns(path, column_mapping)
+            logger.info(f"Read {len(df)} rows from {path}")
             
             return df
             
@@ -219,32 +408,31 @@ class ClientProcessor:
         df['tier'] = df['tier'].fillna("UNKNOWN").astype(str).str.upper()
         df['currency'] = df['currency'].fillna("USD").astype(str).str.upper()
         df['created_at_dt'] = df['created_at'].apply(_parse_date)
+        self.quality.record('created_at', 'unparseable_date', _unparsed(df['created_at'], df['created_at_dt']))
         
-        # Uppercase string columns
-        string_cols = ['client_id', 'client_name', 'status', 'tier', 'currency']
-        for col in string_cols:
+        # Uppercase string columns (status, tier and currency are already uppercase)
+        for col in ['client_id', 'client_name']:
             df[col] = df[col].astype(str).str.upper()
         
         # Handle deduplication within file
         status_rank = {"ACTIVE": 2, "INACTIVE": 1, "UNKNOWN": 0}
         df['status_rank'] = df['status'].map(status_rank).fillna(0)
         
-        # Sort by client_id, then by status preference, then by date (newest first)
-        df = df.sort_values(['client_id', 'status_rank', 'created_at_dt'], 
-                           ascending=[True, False, False])
+        # Sort only the ranking keys by client_id, then by status preference, then by
+        # date (newest first), and take the "best" record per client in a single pass
+        ranking = df[['client_id', 'status_rank', 'created_at_dt']].sort_values(
+            ['client_id', 'status_rank', 'created_at_dt'], ascending=[True, False, False]
+        )
+        best = ranking.index[~ranking['client_id'].duplicated()]
         
-        # Remove duplicates, keeping the "best" record for each client
-        df = df.drop_duplicates('client_id', keep='first')
+        # Select final columns
+        final_df = df.loc[best, self.required_columns]
         
         # Finalize created_at as string
-        df['created_at'] = df['created_at_dt'].dt.strftime('%Y-%m-%d')
-        df['created_at'] = df['created_at'].replace('NaT', None)
+        final_df['created_at'] = df.loc[best, 'created_at_dt'].dt.strftime('%Y-%m-%d').replace('NaT', None)
         
         # Add row hash for change detection
-        df['row_hash'] = df.apply(lambda row: _row_hash(row[self.required_columns].to_dict()), axis=1)
-        
-        # Select final columns
-        final_df = df[self.required_columns + ['row_hash']].copy()
+        final_df['row_hash'] = _row_hashes(final_df, self.required_columns)
         
         logger.info(f"Normalized to {len(final_df)} unique client records")
         return final_df
@@ -258,16 +446,19 @@ class ClientProcessor:
             logger.info(f"Found {len(files)} files matching pattern: {pattern}")
             
             for file_path in files:
-                if file_path.lower().endswith('.pdf'):
+                file_format = _input_format(file_path)[0]
+                if file_format == '.pdf':
                     df = self.read_pdf(file_path)
-                elif file_path.lower().endswith('.csv'):
+                elif file_format == '.csv':
                     df = self.read_csv(file_path)
                 else:
                     logger.warning(f"Unsupported file format: {file_path}")
                     continue
                 
                 if not df.empty:
+                    self.quality.start_file(file_path)
                     df = self.normalize_dataframe(df)
+                    self.quality.finish_file()
                     all_dfs.append(df)
         
         if not all_dfs:
@@ -325,9 +516,8 @@ class ClientProcessor:
             
             merged_rows.append(base)
         
-        final_df = pd.DataFrame(merged_rows)
         final_columns = self.required_columns + ['row_hash']
-        result = final_df[final_columns].copy()
+        result = pd.DataFrame(merged_rows, columns=final_columns)
         
         logger.info(f"Merged to {len(result)} unique client records")
         return result
@@ -336,60 +526,34 @@ class ClientProcessor:
 class InvoiceProcessor:
     """Processes invoice data from various file formats and schemas."""
     
-    def __init__(self):
+    def __init__(self, money_cents: bool = False):
+        """Initialize processor; with money_cents, amounts are normalized to int64 cents."""
         self.required_columns = ["invoice_id", "client_id", "client_name", "invoice_date", 
                                "amount", "currency", "shipment_type"]
+        self.money_cents = money_cents
+        self.quality = DataQualityTracker()
+        # Sketch of the invoices stored since the pipeline last collected it; processing
+        # does not add to it, callers add the rows they actually store
+        self.sketch = InvoiceSketch()
+    
+    def update_sketch(self, df: pd.DataFrame) -> None:
+        """Add newly stored invoices to the sketch, which always keeps amounts in dollars."""
+        self.sketch.update(df.assign(amount=df['amount'] / 100) if self.money_cents else df)
     
     def read_csv(self, path: str) -> pd.DataFrame:
         """Read invoice data from CSV files, handling different schemas."""
         logger.info(f"Processing invoice CSV file: {path}")
         
         try:
-            df = pd.read_csv(path)
-            logger.info(f"Read {len(df)} invoice rows from {path}")
-            
-            # Normalize column names
-            cols_lower = {c.lower().replace(' ', '_'): c for c in df.columns}
-            
-            # Detect schema version and map columns
-            if "inv_no" in cols_lower and "customer_key" in cols_lower:
-                # Schema v2
-                logger.debug("Detected invoice schema v2")
-                column_mapping = {
-                    cols_lower.get("inv_no"): "invoice_id",
-                    cols_lower.get("customer_key"): "client_id", 
-                    cols_lower.get("inv_dt"): "invoice_date",
-                    cols_lower.get("total", cols_lower.get("subtotal")): "amount",
-                    cols_lower.get("curr"): "currency",
-                    cols_lower.get("ship_type"): "shipment_type"
-                }
-            elif "invoice_uid" in cols_lower and "client_ref" in cols_lower:
-                # Schema v3
-                logger.debug("Detected invoice schema v3")
-                column_mapping = {
-                    cols_lower.get("invoice_uid"): "invoice_id",
-                    cols_lower.get("client_ref"): "client_name",
-                    cols_lower.get("issued_on"): "invoice_date", 
-                    cols_lower.get("amount_usd"): "amount",
-                    cols_lower.get("shipment_category"): "shipment_type"
-                }
-                # Schema v3 uses client names instead of IDs
-            else:
-                # Schema v1 (default)
-                logger.debug("Detected invoice schema v1")  
-                column_mapping = {
-                    cols_lower.get("invoice_id"): "invoice_id",
-                    cols_lower.get("client_id"): "client_id",
-                    cols_lower.get("invoice_date"): "invoice_date",
-                    cols_lower.get("amount"): "amount",
-                    cols_lower.get("currency"): "currency", 
-                    cols_lower.get("shipment_type"): "shipment_type"
-                }
+            header = _sniff_csv_header(path)
+            version, column_mapping = _resolve_csv_schema(
+                header, INVOICE_CSV_SCHEMAS,
+                normalize_col=lambda c: c.lower().replace(' ', '_')
+            )
+            logger.debug(f"Detected invoice schema {version}")
             
-            # Apply column mapping
-            for old_col, new_col in column_mapping.items():
-                if old_col and old_col in df.columns and new_col:
-                    df = df.rename(columns={old_col: new_col})
+            df = _read_csv_columns(path, column_mapping)
+            logger.info(f"Read {len(df)} invoice rows from {path}")
             
             return df
             
@@ -397,6 +561,23 @@ class InvoiceProcessor:
             logger.error(f"Error processing invoice CSV {path}: {e}")
             return pd.DataFrame(columns=self.required_columns)
     
+    def read_csv_chunks(self, path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Stream invoice data from a CSV file in chunks, handling different schemas."""
+        logger.info(f"Streaming invoice CSV file: {path}")
+        
+        try:
+            header = _sniff_csv_header(path)
+            version, column_mapping = _resolve_csv_schema(
+                header, INVOICE_CSV_SCHEMAS,
+                normalize_col=lambda c: c.lower().replace(' ', '_')
+            )
+            logger.debug(f"Detected invoice schema {version}")
+            
+            yield from _iter_csv_columns(path, column_mapping, chunk_rows)
+            
+        except Exception as e:
+            logger.error(f"Error streaming invoice CSV {path}: {e}")
+    
     def normalize_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """Normalize invoice dataframe to standard schema."""
         if df.empty:
@@ -409,61 +590,145 @@ class InvoiceProcessor:
             if col not in df.columns:
                 df[col] = None
         
-        # Apply normalization functions
+        # Apply normalization functions, counting values that do not parse
+        raw = df[['invoice_date', 'amount', 'shipment_type']]
         df['invoice_date'] = df['invoice_date'].apply(_parse_date)
-        df['amount'] = df['amount'].apply(_parse_amount)
+        if self.money_cents:
+            df['amount'] = _parse_amounts_cents(df['amount'])
+        else:
+            df['amount'] = df['amount'].apply(_parse_amount)
         df['shipment_type'] = df['shipment_type'].apply(_norm_shipment_type)
+        self.quality.record('invoice_date', 'unparseable_date', _unparsed(raw['invoice_date'], df['invoice_date']))
+        self.quality.record('amount', 'unparseable_amount', _unparsed(raw['amount'], df['amount']))
+        self.quality.record('shipment_type', 'unknown_shipment_type',
+                            raw['shipment_type'][raw['shipment_type'].notna() & (df['shipment_type'] == 'UNKNOWN')])
+        # Missing and unparseable amounts both count as zero
+        df['amount'] = df['amount'].fillna(0).astype('int64') if self.money_cents else df['amount'].fillna(0.0)
         df['currency'] = df['currency'].fillna("USD").astype(str).str.upper()
         
         # Clean client names
         df['client_name'] = df['client_name'].apply(_clean_name)
         
-        # Uppercase string columns
-        string_cols = ['invoice_id', 'client_id', 'client_name', 'currency', 'shipment_type']
+        # Uppercase string columns (shipment_type is already normalized to uppercase)
+        string_cols = ['invoice_id', 'client_id', 'client_name', 'currency']
         for col in string_cols:
             df[col] = df[col].astype(str).str.upper().replace('NAN', None)
         
         # Convert dates back to string format
-        df['invoice_date'] = df['invoice_date'].dt.strftime('%Y-%m-%d')
-        df['invoice_date'] = df['invoice_date'].replace('NaT', None)
+        df['invoice_date'] = df['invoice_date'].dt.strftime('%Y-%m-%d').replace('NaT', None)
         
-        # Add row hash for change detection
-        df['row_hash'] = df.apply(lambda row: _row_hash(row[self.required_columns].to_dict()), axis=1)
+        # Remove duplicates based on invoice_id before hashing, then select final columns
+        final_df = df.loc[df.index[~df['invoice_id'].duplicated()], self.required_columns]
         
-        # Remove duplicates based on invoice_id
-        df = df.drop_duplicates('invoice_id', keep='first')
-        
-        # Select final columns
-        final_df = df[self.required_columns + ['row_hash']].copy()
+        # Add row hash for change detection
+        final_df['row_hash'] = _row_hashes(final_df, self.required_columns)
         
         logger.info(f"Normalized to {len(final_df)} unique invoice records")
         return final_df
     
     def process_files(self, file_patterns: List[str]) -> pd.DataFrame:
-        """Process multiple invoice files and return merged DataFrame."""
+        """Process multiple invoice files and return merged DataFrame.
+        
+        Each invoice keeps the absolute path of the file it was read from in
+        source_file, which is stored with it as the file owning that invoice.
+        """
         all_dfs = []
+        seen_ids = set()
         
         for pattern in file_patterns:
             files = glob.glob(pattern)
             logger.info(f"Found {len(files)} invoice files matching pattern: {pattern}")
             
             for file_path in files:
-                if file_path.lower().endswith('.csv'):
+                if _input_format(file_path)[0] == '.csv':
                     df = self.read_csv(file_path)
                     if not df.empty:
+                        self.quality.start_file(file_path)
                         df = self.normalize_dataframe(df)
+                        df['source_file'] = os.path.abspath(file_path)
+                        self.quality.finish_file()
+                        # Drop invoices seen in earlier files before concatenating
+                        df = df[~df['invoice_id'].isin(seen_ids)]
+                        seen_ids.update(df['invoice_id'])
                         all_dfs.append(df)
                 else:
                     logger.warning(f"Unsupported invoice file format: {file_path}")
         
         if not all_dfs:
             logger.warning("No invoice data found")
-            return pd.DataFrame(columns=self.required_columns + ['row_hash'])
+            return pd.DataFrame(columns=self.required_columns + ['row_hash', 'source_file'])
         
         # Concatenate all invoice dataframes
         logger.info("Merging invoice data from all files")
         result = pd.concat(all_dfs, ignore_index=True)
-        result = result.drop_duplicates('invoice_id', keep='first')
         
         logger.info(f"Final merged invoice data: {len(result)} records")
-        return result
\ No newline at end of file
+        return result
+    
+    def _iter_file_chunks(self, file_patterns: List[str],
+                          chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Yield normalized invoice chunks in file order, deduplicated within each chunk only."""
+        for pattern in file_patterns:
+            files = glob.glob(pattern)
+            logger.info(f"Found {len(files)} invoice files matching pattern: {pattern}")
+            
+            for file_path in files:
+                if _input_format(file_path)[0] != '.csv':
+                    logger.warning(f"Unsupported invoice file format: {file_path}")
+                    continue
+                
+                self.quality.start_file(file_path)
+                for raw in self.read_csv_chunks(file_path, chunk_rows):
+                    df = self.normalize_dataframe(raw)
+                    df['source_file'] = os.path.abspath(file_path)
+                    yield df
+                self.quality.finish_file()
+    
+    def iter_normalized_chunks(self, file_patterns: List[str], chunk_rows: int,
+                               spill_dir: str = None) -> Iterator[pd.DataFrame]:
+        """Yield normalized invoice chunks across files without holding them all in memory.
+        
+        Invoices already yielded are dropped from later chunks, matching the
+        first-seen-wins deduplication of process_files. That keeps every invoice id
+        in memory; with spill_dir, chunks are instead spilled to hash-partitioned
+        files there and deduplicated out of core, yielding one partition at a time
+        once all input has been read.
+        """
+        if spill_dir:
+            chunks = self._iter_spill_deduplicated(file_patterns, chunk_rows, spill_dir)
+        else:
+            chunks = self._iter_first_seen(file_patterns, chunk_rows)
+        
+        try:
+            yield from chunks
+        finally:
+            # Release spill files promptly when the consumer stops early
+            chunks.close()
+    
+    def _iter_first_seen(self, file_patterns: List[str], chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Drop invoices already yielded from later chunks, tracking seen ids in memory."""
+        seen_ids = set()
+        for df in self._iter_file_chunks(file_patterns, chunk_rows):
+            df = df[~df['invoice_id'].isin(seen_ids)]
+            seen_ids.update(df['invoice_id'])
+            if not df.empty:
+                yield df
+    
+    def _iter_spill_deduplicated(self, file_patterns: List[str], chunk_rows: int,
+                                 spill_dir: str) -> Iterator[pd.DataFrame]:
+        """Deduplicate invoice chunks through spill files and yield the unique rows."""
+        # pyarrow.dataset/parquet are only loaded when spilling is used
+        from .dedupe import SpillDeduplicator
+        
+        deduper = SpillDeduplicator('invoice_id', spill_dir)
+        try:
+            for df in self._iter_file_chunks(file_patterns, chunk_rows):
+                deduper.add(df)
+            logger.info(f"Spilled {deduper.rows_in} invoice rows in {deduper.chunks} chunks "
+                        f"to {deduper.run_dir}")
+            
+            for df in deduper.iter_unique():
+                if not df.empty:
+                    yield df
+        finally:
+            deduper.cleanup()
@@ -1,25 +1,171 @@
 """
 Database utilities for PostgreSQL connection and table management.
 """
-import pandas as pd
 from sqlalchemy import create_engine, text, MetaData, Table, inspect
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError
 from loguru import logger
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterable, TYPE_CHECKING
 from contextlib import contextmanager
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import io
+import re
+import hashlib
+import time
+import threading
 
-from .config import DB_CONFIG
+from .config import DB_CONFIG, RATE_SHEET, UPSERT_CONFIG, REPLICA_CONFIG
+from .instrumentation import QueryMetrics, READ_ONLY_STATEMENT
+
+# pandas and the SQLAlchemy ORM are imported on first use so that report-only
+# callers, which never touch DataFrames or sessions, start quickly
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Tables range-partitioned by invoice_date month when partitioning is enabled
+PARTITIONED_TABLES = ['invoices', 'invoice_facts']
+
+# Bounds of date-effective ranges: the initial rate sheet applies from RANGE_START,
+# and the current version of a rate is open-ended at OPEN_RANGE_END
+RANGE_START = date(1900, 1, 1)
+OPEN_RANGE_END = date(9999, 12, 31)
+
+# Data type of the fact cost column, telling which money representation existing tables use
+MONEY_TYPE_SQL = '''
+SELECT data_type FROM information_schema.columns
+WHERE table_schema = current_schema() AND table_name = 'invoice_facts' AND column_name = 'calculated_cost'
+'''
+
+# Whether invoice_facts exists without the ground_equivalent_cost column of later versions
+GROUND_EQUIVALENT_MISSING_SQL = '''
+SELECT to_regclass('invoice_facts') IS NOT NULL AND NOT EXISTS (
+    SELECT 1 FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'invoice_facts'
+        AND column_name = 'ground_equivalent_cost'
+)
+'''
+
+# Cost aggregates of the report queries per money representation. With integer cents,
+# rows are summed as BIGINT (scenario factors applied as integer percentages) and each
+# aggregate is converted to dollars once, so results keep the DECIMAL mode's units.
+COST_SQL = {
+    False: {
+        'cost_sum': 'SUM(calculated_cost)',
+        'cost_avg': 'AVG(calculated_cost)',
+        'discounted_cost_sum': '''SUM(CASE shipment_type
+            WHEN 'GROUND'  THEN calculated_cost * 0.8
+            WHEN 'FREIGHT' THEN calculated_cost * 0.7
+            WHEN '2DAY'    THEN calculated_cost * 0.5
+            ELSE calculated_cost
+        END)''',
+        'express_cost_sum': "SUM(CASE WHEN shipment_type = 'EXPRESS' THEN calculated_cost ELSE 0 END)",
+        'ground_equivalent_sum': "SUM(CASE WHEN shipment_type = 'EXPRESS' THEN ground_equivalent_cost ELSE 0 END)"
+    },
+    True: {
+        'cost_sum': 'SUM(calculated_cost) / 100.0',
+        'cost_avg': 'AVG(calculated_cost) / 100.0',
+        'discounted_cost_sum': '''SUM(CASE shipment_type
+            WHEN 'GROUND'  THEN calculated_cost * 80
+            WHEN 'FREIGHT' THEN calculated_cost * 70
+            WHEN '2DAY'    THEN calculated_cost * 50
+            ELSE calculated_cost * 100
+        END) / 10000.0''',
+        'express_cost_sum': "SUM(CASE WHEN shipment_type = 'EXPRESS' THEN calculated_cost ELSE 0 END) / 100.0",
+        'ground_equivalent_sum': "SUM(CASE WHEN shipment_type = 'EXPRESS' THEN ground_equivalent_cost ELSE 0 END) / 100.0"
+    }
+}
+
+# Covering fact indexes shaped after the AnalysisEngine workloads: name -> (key columns,
+# INCLUDE columns). The INCLUDE columns cover each query so it can be answered with an
+# index-only scan; every report filters on a bound invoice_date window, so it is included.
+FACT_INDEXES = {
+    # Top clients: GROUP BY client_id, client_name, client_status
+    'idx_invoice_facts_client_status_cost': ('client_id, client_name, client_status',
+                                             'invoice_date, calculated_cost, invoice_id'),
+    # Discount and reclassification scenarios: GROUP BY client_id, client_name, shipment_type
+    'idx_invoice_facts_client_shipment_cost': ('client_id, client_name, shipment_type',
+                                               'invoice_date, calculated_cost, ground_equivalent_cost'),
+    # Month-over-month growth: client_id + invoice month within a date window
+    'idx_invoice_facts_client_date_cost': ('client_id, invoice_date', 'client_name, calculated_cost'),
+    # Shipment type breakdown
+    'idx_invoice_facts_shipment_cost': ('shipment_type', 'invoice_date, calculated_cost')
+}
+
+# Schema names are interpolated into SQL, so only plain lowercase identifiers are accepted
+SCHEMA_NAME = re.compile(r'^[a-z_][a-z0-9_]{0,62}$')
+
+# Bind parameters (:name) of a statement; '::' casts are not parameters
+BIND_PARAM = re.compile(r'(?<![:\w]):(\w+)')
+
+# Replication lag of a read replica in seconds. A replica that has replayed all WAL it
+# received is caught up even if the primary has been idle since the last replayed
+# transaction; a server that is not in recovery is not replicating and has no lag (NULL).
+REPLICA_LAG_SQL = '''
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN NULL
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+'''
+
+
+def month_bounds(month: str) -> tuple:
+    """Get the [start, end) dates of a YYYY-MM month."""
+    year, mon = (int(part) for part in month.split('-'))
+    start = date(year, mon, 1)
+    end = date(year + 1, 1, 1) if mon == 12 else date(year, mon + 1, 1)
+    return start, end
+
+
+def money_sql(sql: str, money_cents: bool) -> str:
+    """Fill the {cost_sum}-style cost aggregates of a report query for a money representation."""
+    return sql.format(**COST_SQL[bool(money_cents)])
+
+
+def check_schema_name(schema: str) -> str:
+    """Return schema if it is a valid schema name, else raise ValueError."""
+    if not SCHEMA_NAME.match(schema):
+        raise ValueError(f"Invalid schema name {schema!r}: use lowercase letters, digits and underscores")
+    return schema
+
+
+def monthly_partition_name(table_name: str, month: str) -> str:
+    """Get the partition name holding a YYYY-MM month of a table."""
+    return f"{table_name}_p{month.replace('-', '_')}"
 
 
 class DatabaseManager:
     """Manages PostgreSQL database connections and operations."""
     
-    def __init__(self, config: Dict[str, Any] = None):
-        """Initialize database manager with configuration."""
+    def __init__(self, config: Dict[str, Any] = None, partitioned: bool = False,
+                 schema: str = None, engine=None, metrics: QueryMetrics = None,
+                 money_cents: bool = None):
+        """Initialize database manager with configuration.
+        
+        With partitioned, invoices and invoice_facts are created as tables
+        range-partitioned by invoice_date month. With a replica_dsn in the config,
+        execute_read sends read-only queries to that replica while it is healthy.
+        With schema, every connection resolves unqualified table names in that
+        schema first, so several datasets can live in one database. An engine
+        passed in is shared with other managers and is not disposed on disconnect.
+        With money_cents, amounts and costs are stored as BIGINT cents instead of
+        DECIMAL(10,2); when None, the representation of existing tables is used.
+        """
+        if schema is not None:
+            check_schema_name(schema)
         self.config = config or DB_CONFIG
+        self.partitioned = partitioned
+        self.money_cents = money_cents
+        self.schema = schema
         self.connection_string = self._build_connection_string()
-        self.engine = None
+        self.engine = engine
+        self.owns_engine = engine is None
+        self.replica_engine = None
+        self.replica_healthy = False
+        self.replica_checked_at = None
+        self.replica_lock = threading.Lock()
         self.session_factory = None
+        self.metrics = metrics or QueryMetrics()
         
     def _build_connection_string(self) -> str:
         """Build PostgreSQL connection string from config."""
@@ -30,8 +176,13 @@ class DatabaseManager:
     def connect(self) -> None:
         """Establish database connection."""
         try:
-            self.engine = create_engine(self.connection_string)
-            self.session_factory = sessionmaker(bind=self.engine)
+            if self.engine is None:
+                self.engine = create_engine(self.connection_string)
+                self.metrics.attach(self.engine)
+            if self.config.get('replica_dsn'):
+                # Connections to a replica that went away are detected at checkout
+                self.replica_engine = create_engine(self.config['replica_dsn'], pool_pre_ping=True)
+                self.metrics.attach(self.replica_engine)
             logger.info("Database connection established")
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
@@ -40,16 +191,39 @@ class DatabaseManager:
     def disconnect(self) -> None:
         """Close database connection."""
         if self.engine:
-            self.engine.dispose()
+            if self.owns_engine:
+                self.engine.dispose()
+            if self.replica_engine:
+                self.replica_engine.dispose()
             logger.info("Database connection closed")
     
+    def _checkout(self, engine):
+        """Check out a connection whose search_path starts with this manager's schema.
+        
+        Pooled connections may be shared between managers of different schemas,
+        so the search_path is set on every checkout. It is committed at once:
+        SET is transactional and would otherwise be undone by a later rollback.
+        """
+        conn = engine.connect()
+        if self.schema:
+            try:
+                conn.exec_driver_sql(f'SET search_path TO "{self.schema}", public')
+                conn.commit()
+            except Exception:
+                conn.close()
+                raise
+        return conn
+    
     @contextmanager
     def get_connection(self):
         """Context manager for database connections."""
         if not self.engine:
             self.connect()
         
-        conn = self.engine.connect()
+        # Checkout time is the wait for a free pooled connection (or a new one)
+        start = time.perf_counter()
+        conn = self._checkout(self.engine)
+        self.metrics.record_pool_wait(time.perf_counter() - start)
         try:
             yield conn
         finally:
@@ -58,8 +232,11 @@ class DatabaseManager:
     @contextmanager
     def get_session(self):
         """Context manager for database sessions."""
-        if not self.session_factory:
+        if not self.engine:
             self.connect()
+        if not self.session_factory:
+            from sqlalchemy.orm import sessionmaker
+            self.session_factory = sessionmaker(bind=self.engine)
             
         session = self.session_factory()
         try:
@@ -71,19 +248,169 @@ class DatabaseManager:
         finally:
             session.close()
     
-    def execute_sql(self, sql: str, params: Dict = None) -> Any:
-        """Execute SQL statement."""
+    def _statement(self, sql: str, name: str = None):
+        """Build a text statement, tagged with a logical name for query metrics."""
+        statement = text(sql)
+        return statement.execution_options(query_name=name) if name else statement
+    
+    def execute_sql(self, sql: str, params: Dict = None, name: str = None) -> Any:
+        """Execute SQL statement, recorded in query metrics under name if given."""
         with self.get_connection() as conn:
-            result = conn.execute(text(sql), params or {})
+            result = conn.execute(self._statement(sql, name), params or {})
+            start = time.perf_counter()
             conn.commit()
+            self.metrics.record_commit(time.perf_counter() - start)
             return result
     
-    def create_tables(self) -> None:
-        """Create all required tables."""
-        logger.info("Creating database tables...")
+    def _replica_usable(self) -> bool:
+        """Whether reads may go to the replica: a reachable standby within the lag threshold.
+        
+        A server that is not in recovery may hold any stale copy of the data, so it
+        is only accepted with REPLICA_CONFIG['allow_standalone']. The answer is cached for REPLICA_CONFIG['check_interval'] seconds, and
+        changes between replica and primary routing are logged once.
+        """
+        with self.replica_lock:
+            now = time.monotonic()
+            first_check = self.replica_checked_at is None
+            if not first_check and now - self.replica_checked_at < REPLICA_CONFIG['check_interval']:
+                return self.replica_healthy
+            self.replica_checked_at = now
+            
+            max_lag = REPLICA_CONFIG['max_lag_seconds']
+            try:
+                with self.replica_engine.connect() as conn:
+                    lag = conn.execute(self._statement(REPLICA_LAG_SQL, 'replica_lag')).scalar()
+                if lag is None and not REPLICA_CONFIG['allow_standalone']:
+                    healthy = False
+                    reason = "is not a standby (not in recovery)"
+                else:
+                    lag = float(lag or 0)
+                    healthy = lag <= max_lag
+                    reason = f"lag {lag:.1f}s" if healthy else f"lag {lag:.1f}s exceeds {max_lag:g}s"
+            except Exception as e:
+                healthy = False
+                reason = f"unavailable: {e}"
+            
+            if healthy and not self.replica_healthy:
+                logger.info(f"Routing read-only queries to the replica ({reason})")
+            elif not healthy and (self.replica_healthy or first_check):
+                logger.warning(f"Reading from the primary, replica {reason}")
+            self.replica_healthy = healthy
+            return healthy
+    
+    def _execute(self, conn, sql: str, params: Dict = None, name: str = None) -> Any:
+        """Execute a statement on a checked-out connection."""
+        return conn.execute(self._statement(sql, name), params or {})
+    
+    def _prepare(self, conn, sql: str, name: str = None) -> str:
+        """Prepare a statement on a checked-out connection, returning its EXECUTE statement.
+        
+        The first time a pooled connection runs the statement it is PREPAREd, with
+        its :name parameters as $n parameters; after that it is only EXECUTEd with
+        the bound values, skipping parsing and, once Postgres settles on a generic
+        plan, planning. The statement name is derived from the SQL text, so a
+        changed statement (e.g. for the other money representation) is prepared
+        anew. Postgres re-parses a prepared statement when the search_path has
+        changed, so connections shared between schemas read the right tables.
+        Prepared statements last as long as the connection; a replaced
+        connection starts with an empty conn.info and prepares them again.
+        """
+        binds = list(dict.fromkeys(BIND_PARAM.findall(sql)))
+        statement = f"{name or 'statement'}_{hashlib.md5(sql.encode()).hexdigest()[:12]}"
+        prepared = conn.info.setdefault('prepared_statements', set())
+        if statement not in prepared:
+            positional = BIND_PARAM.sub(lambda m: f"${binds.index(m.group(1)) + 1}", sql.strip().rstrip(';'))
+            conn.exec_driver_sql(f"PREPARE {statement} AS {positional}")
+            prepared.add(statement)
+            if READ_ONLY_STATEMENT.match(sql):
+                # Lets query metrics explain a slow EXECUTE of it like the query itself
+                conn.info.setdefault('read_only_statements', set()).add(statement)
+        arguments = f"({', '.join(':' + bind for bind in binds)})" if binds else ''
+        return f"EXECUTE {statement}{arguments}"
+    
+    def _execute_prepared(self, conn, sql: str, params: Dict = None, name: str = None) -> Any:
+        """Execute a statement as a server-side prepared statement of the connection (see _prepare)."""
+        return conn.execute(self._statement(self._prepare(conn, sql, name), name), params or {})
+    
+    def _read(self, execute, sql: str, params: Dict = None, name: str = None) -> Any:
+        """Run execute(conn, sql, params, name) on the replica when usable, otherwise on the primary."""
+        if not self.engine:
+            self.connect()
+        
+        if self.replica_engine is not None and self._replica_usable():
+            try:
+                with self._checkout(self.replica_engine) as conn:
+                    return execute(conn, sql, params, name)
+            except OperationalError as e:
+                # Lost the replica mid-query: retry on the primary and re-check it later
+                logger.warning(f"Replica read failed, retrying on the primary: {e}")
+                with self.replica_lock:
+                    self.replica_healthy = False
+                    self.replica_checked_at = time.monotonic()
+        
+        with self.get_connection() as conn:
+            return execute(conn, sql, params, name)
+    
+    def execute_read(self, sql: str, params: Dict = None, name: str = None, prepared: bool = False) -> Any:
+        """Execute a read-only statement on the replica when usable, otherwise on the primary.
+        
+        With prepared, the statement runs as a prepared statement of the connection
+        it is executed on (see _prepare).
+        """
+        return self._read(self._execute_prepared if prepared else self._execute, sql, params, name)
+    
+    def read_dataframe(self, sql: str, params: Dict = None, name: str = None) -> 'pd.DataFrame':
+        """Run a query and return the result as a DataFrame."""
+        import pandas as pd
+        
+        with self.get_connection() as conn:
+            return pd.read_sql(self._statement(sql, name), conn, params=params or {})
+    
+    def create_tables(self, schema: str = None) -> None:
+        """Create all required tables, in schema if given (default: the manager's schema).
+        
+        A schema that does not exist yet is created first.
+        """
+        if schema is not None:
+            self.schema = check_schema_name(schema)
+        logger.info(f"Creating database tables{f' in schema {self.schema}' if self.schema else ''}...")
+        
+        if self.schema:
+            self.execute_sql(f'CREATE SCHEMA IF NOT EXISTS "{self.schema}"')
+        self._check_partitioning()
+        self._check_money_type()
+        money_type = 'BIGINT' if self.money_cents else 'DECIMAL(10,2)'
+        backfill_ground_equivalent = self.execute_sql(GROUND_EQUIVALENT_MISSING_SQL).scalar()
+        
+        if self.partitioned:
+            # Unique keys of a partitioned table must include the partition key
+            invoice_key = ''
+            invoice_hash_key = ''
+            invoice_constraints = ''',
+            UNIQUE NULLS NOT DISTINCT (invoice_id, invoice_date),
+            UNIQUE NULLS NOT DISTINCT (row_hash, invoice_date)'''
+            fact_constraints = '''PRIMARY KEY (fact_id, invoice_date),
+            UNIQUE(client_id, invoice_id, invoice_date)'''
+            partition_by = ' PARTITION BY RANGE (invoice_date)'
+        else:
+            invoice_key = ' PRIMARY KEY'
+            invoice_hash_key = ' UNIQUE'
+            invoice_constraints = ''
+            fact_constraints = '''PRIMARY KEY (fact_id),
+            UNIQUE(client_id, invoice_id)'''
+            partition_by = ''
+        
+        fact_index_sql = '\n        '.join(
+            [f'DROP INDEX IF EXISTS {name};' for name in self._stale_fact_indexes()] +
+            [f'CREATE INDEX IF NOT EXISTS {name} ON invoice_facts({keys}) INCLUDE ({include});'
+             for name, (keys, include) in FACT_INDEXES.items()]
+        )
         
         # Create schema SQL
-        create_tables_sql = '''
+        create_tables_sql = f'''
+        -- Serialize concurrent schema setup, e.g. by several shard workers
+        SELECT pg_advisory_xact_lock(hashtext('{self._lock_resource('create_tables')}'));
+
         -- Clients table
         CREATE TABLE IF NOT EXISTS clients (
             client_id VARCHAR(10) PRIMARY KEY,
@@ -99,33 +426,114 @@ class DatabaseManager:
 
         -- Invoices table  
         CREATE TABLE IF NOT EXISTS invoices (
-            invoice_id VARCHAR(50) PRIMARY KEY,
+            invoice_id VARCHAR(50){invoice_key},
             client_id VARCHAR(10),
             client_name VARCHAR(255),
             invoice_date DATE,
-            amount DECIMAL(10,2),
+            amount {money_type},
             currency VARCHAR(3) DEFAULT 'USD',
             shipment_type VARCHAR(20),
-            row_hash VARCHAR(64) UNIQUE,
+            row_hash VARCHAR(64){invoice_hash_key},
+            source_file TEXT,
             created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+            updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP{invoice_constraints}
+        ){partition_by};
+
+        -- File each invoice was first loaded from, for tables created without it
+        ALTER TABLE invoices ADD COLUMN IF NOT EXISTS source_file TEXT;
 
         -- Fact table combining clients and invoices
         CREATE TABLE IF NOT EXISTS invoice_facts (
-            fact_id SERIAL PRIMARY KEY,
+            fact_id SERIAL,
             client_id VARCHAR(10),
             client_name VARCHAR(255) NOT NULL,
             client_status VARCHAR(20),
             client_tier VARCHAR(20),
             invoice_id VARCHAR(50) NOT NULL,
             invoice_date DATE NOT NULL,
-            invoice_amount DECIMAL(10,2) NOT NULL,
+            invoice_amount {money_type} NOT NULL,
             shipment_type VARCHAR(20) NOT NULL,
             rate_per_unit DECIMAL(10,2),
-            calculated_cost DECIMAL(10,2),
+            calculated_cost {money_type},
+            ground_equivalent_cost {money_type},
+            created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            {fact_constraints}
+        ){partition_by};
+
+        -- Cost of each invoice at the GROUND rate in effect on its date, for tables created without it
+        ALTER TABLE invoice_facts ADD COLUMN IF NOT EXISTS ground_equivalent_cost {money_type};
+
+        -- Resolved client for each invoice client name that has no usable client_id.
+        -- A name registered to several clients maps to each of them.
+        CREATE TABLE IF NOT EXISTS client_name_matches (
+            client_name VARCHAR(255) NOT NULL,
+            client_id VARCHAR(10) NOT NULL,
+            match_score DECIMAL(5,4),
+            match_type VARCHAR(10),
+            updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (client_name, client_id)
+        );
+
+        -- Shipment rates per unit, effective over [valid_from, valid_to)
+        CREATE TABLE IF NOT EXISTS rate_sheet (
+            shipment_type VARCHAR(20) NOT NULL,
+            valid_from DATE NOT NULL,
+            valid_to DATE NOT NULL,
+            rate_per_unit DECIMAL(10,2) NOT NULL,
             created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(client_id, invoice_id)
+            PRIMARY KEY (shipment_type, valid_from),
+            CHECK (valid_from < valid_to)
+        );
+        -- Range lookup by shipment type and invoice date, answered from the index alone
+        CREATE INDEX IF NOT EXISTS idx_rate_sheet_range
+            ON rate_sheet(shipment_type, valid_from, valid_to)
+            INCLUDE (rate_per_unit);
+
+        -- USD rate per unit of currency, effective over [valid_from, valid_to)
+        CREATE TABLE IF NOT EXISTS fx_rates (
+            currency VARCHAR(3) NOT NULL,
+            valid_from DATE NOT NULL,
+            valid_to DATE NOT NULL,
+            usd_rate DECIMAL(18,8) NOT NULL,
+            PRIMARY KEY (currency, valid_from)
+        );
+
+        -- Normalization failures per source file, column and reason
+        CREATE TABLE IF NOT EXISTS data_quality (
+            source_file VARCHAR(500) NOT NULL,
+            column_name VARCHAR(50) NOT NULL,
+            reason VARCHAR(50) NOT NULL,
+            failures INTEGER NOT NULL,
+            sample_values TEXT,
+            created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source_file, column_name, reason)
+        );
+
+        -- Mergeable sketches of the invoices ingested by each run (part = shard)
+        CREATE TABLE IF NOT EXISTS ingestion_sketches (
+            run_id VARCHAR(100) NOT NULL,
+            part INTEGER NOT NULL DEFAULT 0,
+            row_count BIGINT NOT NULL,
+            sketch JSONB NOT NULL,
+            created_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_id, part)
+        );
+
+        -- Shards of a sharded ingestion run and their progress
+        CREATE TABLE IF NOT EXISTS ingest_shards (
+            run_id VARCHAR(100) NOT NULL,
+            shard_id INTEGER NOT NULL,
+            shard_count INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'PENDING',
+            worker VARCHAR(255),
+            files INTEGER,
+            client_rows INTEGER,
+            invoice_rows INTEGER,
+            error TEXT,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            PRIMARY KEY (run_id, shard_id)
         );
 
         -- Indexes for better query performance
@@ -134,9 +542,16 @@ class DatabaseManager:
         CREATE INDEX IF NOT EXISTS idx_invoices_client_id ON invoices(client_id);
         CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(invoice_date);
         CREATE INDEX IF NOT EXISTS idx_invoices_shipment_type ON invoices(shipment_type);
-        CREATE INDEX IF NOT EXISTS idx_invoice_facts_client_id ON invoice_facts(client_id);
-        CREATE INDEX IF NOT EXISTS idx_invoice_facts_date ON invoice_facts(invoice_date);
-        CREATE INDEX IF NOT EXISTS idx_invoice_facts_shipment_type ON invoice_facts(shipment_type);
+        
+        -- Fact indexes shaped after the AnalysisEngine workloads (FACT_INDEXES); ones
+        -- created with another definition by an earlier version are rebuilt
+        DROP INDEX IF EXISTS idx_invoice_facts_client_id;
+        DROP INDEX IF EXISTS idx_invoice_facts_date;
+        DROP INDEX IF EXISTS idx_invoice_facts_shipment_type;
+        {fact_index_sql}
+        -- Facts are appended in invoice order, so a BRIN index serves date ranges cheaply
+        CREATE INDEX IF NOT EXISTS idx_invoice_facts_date_brin
+            ON invoice_facts USING BRIN (invoice_date);
         
         -- Update timestamp triggers
         CREATE OR REPLACE FUNCTION update_updated_timestamp()
@@ -159,12 +574,188 @@ class DatabaseManager:
         '''
         
         self.execute_sql(create_tables_sql)
+        if backfill_ground_equivalent:
+            self._backfill_ground_equivalent()
+        
+        if self.partitioned:
+            # Default partitions catch NULL dates and months not created yet
+            for table_name in PARTITIONED_TABLES:
+                self.execute_sql(
+                    f"CREATE TABLE IF NOT EXISTS {table_name}_pdefault PARTITION OF {table_name} DEFAULT"
+                )
+        
         logger.info("Database tables created successfully")
     
+    def _backfill_ground_equivalent(self) -> None:
+        """Fill ground_equivalent_cost of facts built before the column existed from the rate sheet."""
+        ground_cost = ('ROUND(f.invoice_amount * r.rate_per_unit)::bigint' if self.money_cents
+                       else 'f.invoice_amount * r.rate_per_unit')
+        result = self.execute_sql(f'''
+        UPDATE invoice_facts f SET ground_equivalent_cost = {ground_cost}
+        FROM rate_sheet r
+        WHERE r.shipment_type = 'GROUND'
+            AND f.invoice_date >= r.valid_from AND f.invoice_date < r.valid_to
+            AND f.ground_equivalent_cost IS NULL
+        ''', name='backfill_ground_equivalent')
+        logger.info(f"Backfilled the GROUND equivalent cost of {result.rowcount} facts")
+    
+    def seed_rate_sheet(self, rates: Dict[str, float] = None) -> None:
+        """Give shipment types without any rate history their configured rate since RANGE_START."""
+        with self.get_connection() as conn:
+            self.advisory_xact_lock(conn, 'rate_sheet')
+            for shipment_type, rate in (rates or RATE_SHEET).items():
+                conn.execute(text('''
+                INSERT INTO rate_sheet (shipment_type, valid_from, valid_to, rate_per_unit)
+                SELECT :shipment_type, :valid_from, :valid_to, :rate
+                WHERE NOT EXISTS (SELECT 1 FROM rate_sheet WHERE shipment_type = :shipment_type)
+                '''), {'shipment_type': shipment_type, 'valid_from': RANGE_START,
+                       'valid_to': OPEN_RANGE_END, 'rate': rate})
+            conn.commit()
+    
+    def set_rates(self, rates: Dict[str, float], effective_from: date) -> None:
+        """Make rates effective from a date onward, keeping earlier rate versions.
+        
+        The version in effect on effective_from is closed at that date and any
+        versions starting later are superseded, all in one transaction.
+        """
+        with self.get_connection() as conn:
+            self.advisory_xact_lock(conn, 'rate_sheet')
+            for shipment_type, rate in rates.items():
+                params = {'shipment_type': shipment_type, 'effective_from': effective_from,
+                          'valid_to': OPEN_RANGE_END, 'rate': rate}
+                conn.execute(text('''
+                DELETE FROM rate_sheet
+                WHERE shipment_type = :shipment_type AND valid_from >= :effective_from
+                '''), params)
+                conn.execute(text('''
+                UPDATE rate_sheet SET valid_to = :effective_from
+                WHERE shipment_type = :shipment_type AND valid_to > :effective_from
+                '''), params)
+                conn.execute(text('''
+                INSERT INTO rate_sheet (shipment_type, valid_from, valid_to, rate_per_unit)
+                VALUES (:shipment_type, :effective_from, :valid_to, :rate)
+                '''), params)
+            conn.commit()
+        
+        logger.info(f"Rates for {', '.join(rates)} effective from {effective_from}")
+    
+    def _lock_resource(self, resource: str) -> str:
+        """Advisory lock name of resource, scoped to the schema so datasets never contend."""
+        return f"{self.schema}:{resource}" if self.schema else resource
+    
+    def advisory_xact_lock(self, conn, resource: str) -> None:
+        """Hold an advisory lock on resource until conn's transaction ends.
+        
+        Serializes writers that share the database, such as shard workers, on the
+        same resource; a single process only ever takes the lock uncontended.
+        """
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:resource))"),
+                     {'resource': self._lock_resource(resource)})
+    
+    def _check_partitioning(self) -> None:
+        """Fail fast if existing tables do not match the requested partitioning mode."""
+        result = self.execute_sql(
+            "SELECT relname, relkind FROM pg_class "
+            "WHERE relname = ANY(:tables) AND relnamespace = to_regnamespace(current_schema())",
+            {'tables': PARTITIONED_TABLES}
+        )
+        for table_name, relkind in result.fetchall():
+            if (relkind == 'p') != self.partitioned:
+                expected = 'partitioned' if self.partitioned else 'a plain table'
+                raise ValueError(
+                    f"Table {table_name} already exists but is not {expected}; "
+                    f"drop or migrate it before switching partitioning mode"
+                )
+    
+    def _stale_fact_indexes(self) -> List[str]:
+        """Get the FACT_INDEXES that exist with another definition than the current one."""
+        result = self.execute_sql(
+            "SELECT relname, pg_get_indexdef(oid) FROM pg_class "
+            "WHERE relname = ANY(:indexes) AND relnamespace = to_regnamespace(current_schema())",
+            {'indexes': list(FACT_INDEXES)}
+        )
+        stale = [name for name, definition in result.fetchall()
+                 if not definition.endswith('USING btree ({}) INCLUDE ({})'.format(*FACT_INDEXES[name]))]
+        for name in stale:
+            logger.info(f"Rebuilding index {name} with its current definition")
+        return stale
+    
+    def _check_money_type(self) -> None:
+        """Fail fast if existing tables use another money representation than requested.
+        
+        Without a requested representation, the existing one is adopted (DECIMAL for new tables).
+        """
+        data_type = self.execute_sql(MONEY_TYPE_SQL, name='money_type').scalar()
+        if self.money_cents is None:
+            self.money_cents = data_type == 'bigint'
+        elif data_type is not None and (data_type == 'bigint') != self.money_cents:
+            expected = 'BIGINT cents' if self.money_cents else 'DECIMAL amounts'
+            raise ValueError(
+                f"Table invoice_facts already exists but does not store {expected}; "
+                f"drop or migrate it before switching money representation"
+            )
+    
+    def uses_cents(self) -> bool:
+        """Whether money is stored as BIGINT cents: as requested, else as the existing facts store it."""
+        if self.money_cents is None:
+            data_type = self.execute_read(MONEY_TYPE_SQL, name='money_type').scalar()
+            self.money_cents = data_type == 'bigint'
+        return self.money_cents
+    
+    def ensure_monthly_partitions(self, table_name: str, months: Iterable[str]) -> None:
+        """Create any missing monthly partitions of a table for YYYY-MM months."""
+        if not self.partitioned:
+            return
+        
+        ensured = 0
+        with self.get_connection() as conn:
+            self.advisory_xact_lock(conn, f"partitions:{table_name}")
+            for month in sorted(set(months)):
+                start, end = month_bounds(month)
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {monthly_partition_name(table_name, month)} "
+                    f"PARTITION OF {table_name} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+                ensured += 1
+            conn.commit()
+        
+        logger.info(f"Ensured {ensured} monthly partitions for {table_name}")
+    
+    def vacuum_analyze(self, table_name: str) -> None:
+        """Refresh planner statistics and the visibility map used by index-only scans."""
+        with self.get_connection() as conn:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            conn.execute(text(f"VACUUM (ANALYZE) {table_name}"))
+        logger.info(f"Table {table_name} vacuumed and analyzed")
+    
+    def explain(self, sql: str, params: Dict = None) -> Dict[str, Any]:
+        """Get the JSON query plan of a statement without executing it."""
+        # Planned where execute_read would run the statement
+        result = self.execute_read(f"EXPLAIN (FORMAT JSON) {sql}", params, name='explain')
+        return result.scalar()[0]['Plan']
+    
+    def explain_prepared(self, sql: str, params: Dict = None, name: str = None,
+                         generic: bool = False) -> Dict[str, Any]:
+        """Get the JSON plan of EXECUTE of a statement prepared as execute_read(prepared=True) runs it.
+        
+        Postgres plans the first executions of a prepared statement for their
+        parameter values (custom plans) and may then switch to one generic plan
+        used for any values; generic selects which of the two is explained.
+        """
+        plan_cache_mode = 'force_generic_plan' if generic else 'force_custom_plan'
+        
+        def explain(conn, sql, params, name):
+            execute = self._prepare(conn, sql, name)
+            conn.exec_driver_sql(f"SET LOCAL plan_cache_mode = {plan_cache_mode}")
+            return conn.execute(self._statement(f"EXPLAIN (FORMAT JSON) {execute}", 'explain'), params or {})
+        
+        return self._read(explain, sql, params, name).scalar()[0]['Plan']
+    
     def table_exists(self, table_name: str) -> bool:
         """Check if table exists."""
         inspector = inspect(self.engine)
-        return table_name in inspector.get_table_names()
+        return table_name in inspector.get_table_names(schema=self.schema)
     
     def get_table_row_count(self, table_name: str) -> int:
         """Get row count for a table."""
@@ -176,68 +767,143 @@ class DatabaseManager:
         self.execute_sql(f"TRUNCATE TABLE {table_name} CASCADE")
         logger.info(f"Table {table_name} truncated")
     
-    def upsert_dataframe(self, df: pd.DataFrame, table_name: str, 
-                        conflict_columns: List[str] = None) -> None:
-        """Upsert DataFrame to PostgreSQL table."""
+    def upsert_dataframe(self, df: 'pd.DataFrame', table_name: str, 
+                        conflict_columns: List[str] = None, batch_rows: int = None,
+                        replace_on: List[str] = None) -> Dict[str, Any]:
+        """Upsert DataFrame to PostgreSQL table in bounded, parallel batches.
+        
+        Rows are grouped by a hash bucket of their conflict key and split into
+        batches of batch_rows. Each batch is COPYed into a session-private TEMP
+        table, which is not WAL-logged and cannot clash with concurrent runs, and
+        merged in its own transaction on a pooled connection, up to loader_workers
+        batches at a time. A batch holds advisory locks on the key buckets it
+        covers, taken in ascending order, so writers with overlapping keys (e.g.
+        shard workers) take turns per bucket without deadlocking. A failed batch
+        leaves earlier batches committed; rerunning the idempotent upsert completes
+        the load. With replace_on, a part of the conflict key, existing rows that
+        match an incoming row on replace_on but not on the rest of the key are
+        deleted by the same statement, so e.g. an invoice whose date was corrected
+        moves to its new date instead of being stored twice. Returns load statistics.
+        """
+        import numpy as np
+        import pandas as pd
+        
+        stats = {'rows': 0, 'batches': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
         if df.empty:
             logger.warning(f"Empty DataFrame provided for table {table_name}")
-            return
+            return stats
             
+        batch_rows = batch_rows or UPSERT_CONFIG['batch_rows']
         logger.info(f"Upserting {len(df)} rows to {table_name}")
         
-        # Prepare DataFrame for database insertion
-        df_copy = df.copy()
+        columns = df.columns.tolist()
+        conflict_cols = conflict_columns or [columns[0]]  # Default to first column as key
         
-        # Handle date columns - convert string dates to proper date format
-        date_columns = ['created_at', 'invoice_date']
-        for col in date_columns:
-            if col in df_copy.columns:
-                # Convert to datetime then to date
-                df_copy[col] = pd.to_datetime(df_copy[col], errors='coerce').dt.date
+        # Create update statement (using EXCLUDED for PostgreSQL)
+        update_parts = []
+        for col in columns:
+            if col not in conflict_cols:
+                update_parts.append(f"{col} = EXCLUDED.{col}")
         
-        # Use pandas to_sql with SQLAlchemy for better performance
+        columns_str = ', '.join(columns)
+        conflict_str = ', '.join(conflict_cols)
+        update_str = ', '.join(update_parts)
+        
+        replace_sql = ''
+        if replace_on:
+            matched = ' AND '.join(f"t.{col} = s.{col}" for col in replace_on)
+            moved = ' OR '.join(f"t.{col} IS DISTINCT FROM s.{col}"
+                                for col in conflict_cols if col not in replace_on)
+            replace_sql = f'''
+        WITH moved AS (
+            DELETE FROM {table_name} t USING upsert_stage s
+            WHERE {matched} AND ({moved})
+        )'''
+        
+        # The stage table copies the target column types, so COPY parses ISO date
+        # strings and numbers directly and the merge needs no casts
+        upsert_sql = f'''{replace_sql}
+        INSERT INTO {table_name} ({columns_str})
+        SELECT {columns_str} FROM upsert_stage
+        ON CONFLICT ({conflict_str}) 
+        DO UPDATE SET {update_str}
+        '''
+        
+        buckets = pd.util.hash_pandas_object(df[conflict_cols], index=False).to_numpy() \
+            % UPSERT_CONFIG['lock_buckets']
+        if len(df) <= batch_rows:
+            batches = [(df, sorted(set(buckets.tolist())))]
+        else:
+            order = np.argsort(buckets, kind='stable')
+            batches = []
+            for offset in range(0, len(df), batch_rows):
+                positions = order[offset:offset + batch_rows]
+                batches.append((df.iloc[positions], sorted(set(buckets[positions].tolist()))))
+        
+        start = time.perf_counter()
+        load_batch = lambda args: self._upsert_batch(table_name, upsert_sql, *args)
+        workers = min(UPSERT_CONFIG['loader_workers'], len(batches))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'upsert-{table_name}') as pool:
+                batch_stats = list(pool.map(load_batch, batches))
+        else:
+            batch_stats = [load_batch(batch) for batch in batches]
+        
+        stats['rows'] = len(df)
+        stats['batches'] = len(batches)
+        stats['seconds'] = time.perf_counter() - start
+        stats['rows_per_second'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        stats['batch_stats'] = batch_stats
+        
+        if len(batches) > 1:
+            for i, batch in enumerate(batch_stats, 1):
+                logger.info(f"Batch {i}/{len(batches)} of {table_name}: {batch['rows']} rows in "
+                            f"{batch['seconds']:.2f}s ({batch['rows_per_second']:,.0f} rows/s; lock wait "
+                            f"{batch['lock_wait_seconds']:.2f}s, copy {batch['copy_seconds']:.2f}s, "
+                            f"merge {batch['merge_seconds']:.2f}s)")
+        logger.info(f"Successfully upserted {stats['rows']} rows to {table_name} in {stats['batches']} "
+                    f"batches ({stats['seconds']:.2f}s, {stats['rows_per_second']:,.0f} rows/s)")
+        return stats
+    
+    def _upsert_batch(self, table_name: str, upsert_sql: str, batch: 'pd.DataFrame',
+                      buckets: List[int]) -> Dict[str, Any]:
+        """Stage one batch in a TEMP table and merge it in its own transaction."""
+        columns_str = ', '.join(batch.columns)
+        buffer = io.StringIO()
+        batch.to_csv(buffer, index=False, header=False, na_rep='\\N')
+        buffer.seek(0)
+        
+        start = time.perf_counter()
         with self.get_connection() as conn:
-            # Insert data using pandas to_sql 
-            df_copy.to_sql(
-                name=f"{table_name}_temp", 
-                con=conn, 
-                if_exists='replace',
-                index=False,
-                method='multi'
-            )
-            
-            # Build upsert query with proper type casting
-            columns = df_copy.columns.tolist()
-            conflict_cols = conflict_columns or [columns[0]]  # Default to first column as key
-            
-            # Create select statement with proper casting for date columns
-            select_cols = []
-            for col in columns:
-                if col in date_columns:
-                    select_cols.append(f"temp.{col}::date")
-                else:
-                    select_cols.append(f"temp.{col}")
-            
-            # Create update statement with proper casting (using EXCLUDED for PostgreSQL)
-            update_parts = []
-            for col in columns:
-                if col not in conflict_cols:
-                    update_parts.append(f"{col} = EXCLUDED.{col}")
-            
-            columns_str = ', '.join(columns)
-            select_str = ', '.join(select_cols)
-            conflict_str = ', '.join(conflict_cols)
-            update_str = ', '.join(update_parts)
+            # unnest keeps the ascending bucket order, so locks are always taken in the same order
+            conn.execute(text(
+                "SELECT pg_advisory_xact_lock(hashtext(:resource), bucket) "
+                "FROM unnest(CAST(:buckets AS integer[])) AS bucket"
+            ), {'resource': self._lock_resource(f"upsert:{table_name}"), 'buckets': buckets})
+            locked = time.perf_counter()
             
-            upsert_sql = f'''
-            INSERT INTO {table_name} ({columns_str})
-            SELECT {select_str} FROM {table_name}_temp temp
-            ON CONFLICT ({conflict_str}) 
-            DO UPDATE SET {update_str}
-            '''
+            conn.execute(text(
+                f"CREATE TEMP TABLE upsert_stage ON COMMIT DROP AS "
+                f"SELECT {columns_str} FROM {table_name} WITH NO DATA"
+            ))
+            with conn.connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY upsert_stage ({columns_str}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+                )
+            copied = time.perf_counter()
             
-            conn.execute(text(upsert_sql))
-            conn.execute(text(f"DROP TABLE {table_name}_temp"))
+            conn.execute(self._statement(upsert_sql, f"upsert_{table_name}"))
+            commit_start = time.perf_counter()
             conn.commit()
+            done = time.perf_counter()
+            self.metrics.record_commit(done - commit_start)
         
-        logger.info(f"Successfully upserted data to {table_name}")
+        seconds = done - start
+        return {
+            'rows': len(batch),
+            'seconds': seconds,
+            'rows_per_second': len(batch) / seconds if seconds else 0.0,
+            'lock_wait_seconds': locked - start,
+            'copy_seconds': copied - locked,
+            'merge_seconds': done - copied
+        }
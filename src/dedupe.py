@@ -0,0 +1,95 @@
+"""
+Out-of-core invoice deduplication for inputs larger than memory.
+Spills normalized rows to hash-partitioned Parquet files and dedupes one partition at a time.
+"""
+import os
+import shutil
+import tempfile
+from typing import Iterator
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from loguru import logger
+
+from .config import DEDUPE_CONFIG
+
+
+# Arrival order of each row across all spilled chunks
+SEQ_COLUMN = '_seq'
+
+
+def _spill_type(column: pd.Series) -> pa.DataType:
+    """Arrow type a column is spilled as: float and integer (e.g. cents) columns keep their type."""
+    if pd.api.types.is_float_dtype(column):
+        return pa.float64()
+    if pd.api.types.is_integer_dtype(column):
+        return pa.int64()
+    return pa.string()
+
+
+class SpillDeduplicator:
+    """Keeps the first-seen row per key across chunks without holding all keys in memory.
+
+    Every row is tagged with its arrival sequence and written to one of a fixed
+    number of spill partitions by a hash of its key. All copies of a key land in
+    the same partition, so deduplicating each partition on its own, oldest row
+    first, gives the same result as a global first-seen-wins pass while only one
+    partition is ever loaded at a time.
+    """
+
+    def __init__(self, key: str, spill_dir: str = None, partitions: int = None):
+        """Initialize a deduplicator spilling to a private directory under spill_dir."""
+        self.key = key
+        self.partitions = partitions or DEDUPE_CONFIG['spill_partitions']
+        base_dir = spill_dir or DEDUPE_CONFIG['spill_dir']
+        if base_dir:
+            os.makedirs(base_dir, exist_ok=True)
+        self.run_dir = tempfile.mkdtemp(prefix='dedupe-', dir=base_dir)
+        self.schema = None
+        self.rows_in = 0
+        self.chunks = 0
+
+    def add(self, df: pd.DataFrame) -> None:
+        """Spill a chunk of rows, in arrival order, to the hash partitions."""
+        if df.empty:
+            return
+
+        if self.schema is None:
+            # Fix the schema from the first chunk so partitions of all-null chunks still agree
+            fields = [pa.field(col, _spill_type(df[col])) for col in df.columns]
+            self.schema = pa.schema(fields + [pa.field(SEQ_COLUMN, pa.int64())])
+
+        seq = pd.RangeIndex(self.rows_in, self.rows_in + len(df))
+        spilled = df.assign(**{SEQ_COLUMN: seq.to_numpy()})
+        buckets = pd.util.hash_pandas_object(df[self.key], index=False).to_numpy() % self.partitions
+
+        for bucket in pd.unique(buckets):
+            part = spilled[buckets == bucket]
+            part_dir = os.path.join(self.run_dir, f'part-{bucket:04d}')
+            os.makedirs(part_dir, exist_ok=True)
+            pq.write_table(
+                pa.Table.from_pandas(part, schema=self.schema, preserve_index=False),
+                os.path.join(part_dir, f'chunk-{self.chunks:06d}.parquet')
+            )
+
+        self.rows_in += len(df)
+        self.chunks += 1
+
+    def iter_unique(self) -> Iterator[pd.DataFrame]:
+        """Yield the deduplicated rows one spill partition at a time."""
+        rows_out = 0
+        for name in sorted(os.listdir(self.run_dir)):
+            table = ds.dataset(os.path.join(self.run_dir, name), format='parquet',
+                               schema=self.schema).to_table()
+            df = table.to_pandas().sort_values(SEQ_COLUMN, kind='stable')
+            df = df.drop_duplicates(self.key, keep='first').drop(columns=[SEQ_COLUMN])
+            rows_out += len(df)
+            yield df.reset_index(drop=True)
+
+        logger.info(f"Deduplicated {self.rows_in} spilled rows to {rows_out} "
+                    f"across {self.partitions} partitions")
+
+    def cleanup(self) -> None:
+        """Remove this run's spill files."""
+        shutil.rmtree(self.run_dir, ignore_errors=True)
@@ -0,0 +1,48 @@
+"""
+Foreign exchange rates for converting invoice amounts to USD.
+Turns a file of dated rate observations into effective date ranges for as-of joins.
+"""
+import pandas as pd
+from loguru import logger
+
+from .database import OPEN_RANGE_END
+
+
+FX_RATE_COLUMNS = ['currency', 'rate_date', 'usd_rate']
+
+
+def read_fx_rates(path: str) -> pd.DataFrame:
+    """Read an FX rate CSV (currency, rate_date, usd_rate) into effective ranges.
+
+    usd_rate is the USD value of one unit of the currency. Each rate applies from
+    its rate_date until the next rate_date of the same currency, which gives the
+    as-of semantics of merge_asof as plain [valid_from, valid_to) ranges that the
+    fact build can range-join in SQL. Rows are processed column-wise, so large
+    rate histories need no per-row work.
+    """
+    logger.info(f"Loading FX rates from {path}")
+
+    df = pd.read_csv(path, usecols=FX_RATE_COLUMNS, dtype={'currency': str, 'rate_date': str})
+    df['currency'] = df['currency'].str.strip().str.upper()
+    df['rate_date'] = pd.to_datetime(df['rate_date'], errors='coerce', format='mixed')
+    df['usd_rate'] = pd.to_numeric(df['usd_rate'], errors='coerce')
+
+    invalid = df[FX_RATE_COLUMNS].isna().any(axis=1) | (df['usd_rate'] <= 0)
+    if invalid.any():
+        logger.warning(f"Skipping {int(invalid.sum())} invalid FX rate rows in {path}")
+        df = df[~invalid]
+
+    # Last observation wins when a currency has several rates on one date
+    df = df.sort_values(['currency', 'rate_date'], kind='stable')
+    df = df.drop_duplicates(['currency', 'rate_date'], keep='last')
+
+    valid_to = df.groupby('currency')['rate_date'].shift(-1)
+    ranges = pd.DataFrame({
+        'currency': df['currency'],
+        'valid_from': df['rate_date'].dt.strftime('%Y-%m-%d'),
+        'valid_to': valid_to.dt.strftime('%Y-%m-%d').fillna(OPEN_RANGE_END.isoformat()),
+        'usd_rate': df['usd_rate']
+    })
+
+    logger.info(f"Loaded {len(ranges)} FX rate ranges for {ranges['currency'].nunique()} currencies")
+    return ranges.reset_index(drop=True)
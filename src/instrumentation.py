@@ -0,0 +1,210 @@
+"""
+Query instrumentation for the Reveel data pipeline.
+Records per-statement latency histograms, rows, pool wait and commit time, and logs slow queries.
+"""
+import re
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+from sqlalchemy import event
+from loguru import logger
+
+from .config import QUERY_METRICS_CONFIG
+
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf')]
+
+# Only statements that cannot modify data are re-run under EXPLAIN ANALYZE: queries, and
+# EXECUTE of prepared statements the connection lists in conn.info['read_only_statements']
+READ_ONLY_STATEMENT = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+EXECUTE_STATEMENT = re.compile(r'^\s*EXECUTE\s+(\w+)', re.IGNORECASE)
+
+
+def statement_label(sql: str) -> str:
+    """Fallback name for an unnamed statement: its verb and first table, e.g. 'INSERT invoice_facts'."""
+    words = sql.split()
+    if not words:
+        return 'EMPTY'
+    verb = words[0].upper()
+    table = re.search(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+([A-Za-z_][\w.]*)', sql, re.IGNORECASE)
+    return f"{verb} {table.group(1)}" if table else verb
+
+
+def is_read_only(conn, statement: str) -> bool:
+    """Whether a statement executed on conn only reads, so it may be re-run to explain it."""
+    if READ_ONLY_STATEMENT.match(statement):
+        return True
+    execute = EXECUTE_STATEMENT.match(statement)
+    return bool(execute) and execute.group(1) in conn.info.get('read_only_statements', ())
+
+
+class LatencyHistogram:
+    """Counts, totals and bucketed latencies of one kind of operation."""
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def add(self, elapsed_ms: float, rows: int = 0) -> None:
+        """Record one observation."""
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += max(rows, 0)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[i] += 1
+                break
+
+    def percentile(self, pct: float) -> float:
+        """Upper bucket bound (ms) below which pct percent of observations fall."""
+        if not self.count:
+            return 0.0
+        target = self.count * pct / 100
+        seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return round(min(bound, self.max_ms), 2)
+        return round(self.max_ms, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary of the histogram."""
+        return {
+            'count': self.count,
+            'total_ms': round(self.total_ms, 2),
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'max_ms': round(self.max_ms, 2),
+            'rows': self.rows,
+            'buckets': {
+                (f"<={bound:g}ms" if bound != float('inf') else 'slower'): n
+                for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets) if n
+            }
+        }
+
+
+class QueryMetrics:
+    """Collects statement metrics from SQLAlchemy engine events.
+
+    Statements are grouped by the query_name execution option, falling back to
+    statement_label. Statements slower than the threshold are appended to a JSON
+    lines slow-query log, with an EXPLAIN (ANALYZE, BUFFERS) plan for read-only ones.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        """Initialize empty metrics."""
+        self.config = config or QUERY_METRICS_CONFIG
+        self.statements: Dict[str, LatencyHistogram] = {}
+        self.pool_wait = LatencyHistogram()
+        self.commits = LatencyHistogram()
+        self.lock = threading.Lock()
+
+    def attach(self, engine) -> None:
+        """Register the statement timing listeners on an engine."""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """Stamp the statement start on the connection."""
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """Record the statement's latency and rows, logging it if slow."""
+        elapsed_ms = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+        name = (context.execution_options.get('query_name') if context is not None else None) \
+            or statement_label(statement)
+        rows = max(cursor.rowcount or 0, 0)
+
+        with self.lock:
+            self.statements.setdefault(name, LatencyHistogram()).add(elapsed_ms, rows)
+
+        if elapsed_ms >= self.config['slow_query_ms']:
+            plan = None
+            if self.config['explain_slow_queries'] and not executemany \
+                    and is_read_only(conn, statement):
+                plan = self._explain(cursor, statement, parameters)
+            self._log_slow_query(name, statement, elapsed_ms, rows, plan)
+
+    def _explain(self, cursor, statement: str, parameters) -> Optional[str]:
+        """Capture the analyzed plan of a slow read-only statement.
+
+        Runs on the raw DBAPI connection, so it bypasses these listeners, inside a
+        savepoint that is always rolled back: a failed EXPLAIN cannot abort the
+        caller's transaction, and a WITH query containing data-modifying CTEs does
+        not apply its changes twice.
+        """
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute("SAVEPOINT capture_plan")
+            try:
+                explain_cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                plan = '\n'.join(row[0] for row in explain_cursor.fetchall())
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT capture_plan")
+                return plan
+            except Exception as e:
+                explain_cursor.execute("ROLLBACK TO SAVEPOINT capture_plan")
+                logger.warning(f"Could not capture plan of slow query: {e}")
+                return None
+        except Exception as e:
+            logger.warning(f"Could not capture plan of slow query: {e}")
+            return None
+        finally:
+            explain_cursor.close()
+
+    def _log_slow_query(self, name: str, statement: str, elapsed_ms: float,
+                        rows: int, plan: Optional[str]) -> None:
+        """Append a slow statement to the slow-query log."""
+        logger.warning(f"Slow query {name}: {elapsed_ms:.0f}ms, {rows} rows")
+        entry = {
+            'logged_at': datetime.now(timezone.utc).isoformat(),
+            'name': name,
+            'elapsed_ms': round(elapsed_ms, 2),
+            'rows': rows,
+            'statement': ' '.join(statement.split()),
+            'plan': plan
+        }
+        with self.lock:
+            with open(self.config['slow_query_log'], 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def record_pool_wait(self, elapsed_seconds: float) -> None:
+        """Record how long a connection checkout waited on the pool."""
+        with self.lock:
+            self.pool_wait.add(elapsed_seconds * 1000)
+
+    def record_commit(self, elapsed_seconds: float) -> None:
+        """Record how long a commit took."""
+        with self.lock:
+            self.commits.add(elapsed_seconds * 1000)
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-statement-name histograms plus pool wait and commit timings."""
+        with self.lock:
+            return {
+                'statements': {name: hist.to_dict() for name, hist in self.statements.items()},
+                'pool_wait': self.pool_wait.to_dict(),
+                'commits': self.commits.to_dict()
+            }
+
+    def log_summary(self) -> None:
+        """Log statement latency by name, slowest total first."""
+        summary = self.summary()
+        logger.info("=== QUERY METRICS ===")
+        statements = sorted(summary['statements'].items(), key=lambda item: -item[1]['total_ms'])
+        for name, stats in statements:
+            logger.info(f"{name:<36} n={stats['count']:<5} total {stats['total_ms']:>10.1f}ms  "
+                        f"p50 {stats['p50_ms']:g}ms  p95 {stats['p95_ms']:g}ms  "
+                        f"max {stats['max_ms']:g}ms  rows {stats['rows']}")
+        for label in ('pool_wait', 'commits'):
+            stats = summary[label]
+            logger.info(f"{label:<36} n={stats['count']:<5} total {stats['total_ms']:>10.1f}ms  "
+                        f"p95 {stats['p95_ms']:g}ms  max {stats['max_ms']:g}ms")
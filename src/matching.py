@@ -0,0 +1,165 @@
+"""
+Client name matching for invoices that carry a client name instead of a client ID.
+Resolves names against normalized client records with a blocked trigram index.
+"""
+import re
+from collections import defaultdict
+from typing import Dict, Any, List, Set, Tuple
+import pandas as pd
+from loguru import logger
+
+from .config import NAME_MATCH_CONFIG
+
+
+def _name_key(name: str) -> str:
+    """Case- and punctuation-insensitive form of a client name."""
+    return " ".join(re.sub(r'[^0-9A-Z]+', ' ', str(name).upper()).split())
+
+
+def _trigrams(key: str) -> Set[str]:
+    """Character trigrams of a name key, padded so word boundaries count."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ClientNameIndex:
+    """Resolves free-text client names to client IDs.
+
+    Exact (normalized) names are looked up directly. Other names are compared only
+    against clients sharing a selective trigram with them, scored by trigram Jaccard
+    similarity, so resolving n names costs roughly O(n * block size) rather than
+    O(n * clients).
+    """
+
+    def __init__(self, client_data: pd.DataFrame, config: Dict[str, Any] = None):
+        """Build the index from normalized client records (client_id, client_name)."""
+        self.config = config or NAME_MATCH_CONFIG
+        self.exact: Dict[str, List[str]] = defaultdict(list)
+        self.client_keys: List[str] = []
+        self.client_grams: List[Set[str]] = []
+        self.client_ids: List[str] = []
+        self.blocks: Dict[str, List[int]] = defaultdict(list)
+        # name -> list of (client_id, score, match type); empty when unresolved
+        self.cache: Dict[str, List[Tuple[str, float, str]]] = {}
+        self.ambiguous: Dict[str, List[Tuple[str, float]]] = {}
+        self.unmatched: Set[str] = set()
+
+        for client_id, client_name in zip(client_data['client_id'], client_data['client_name']):
+            if pd.isna(client_id) or pd.isna(client_name):
+                continue
+            key = _name_key(client_name)
+            if not key or client_id in self.exact[key]:
+                continue
+            self.exact[key].append(client_id)
+
+            grams = _trigrams(key)
+            position = len(self.client_ids)
+            self.client_ids.append(client_id)
+            self.client_keys.append(key)
+            self.client_grams.append(grams)
+            for gram in grams:
+                self.blocks[gram].append(position)
+
+        logger.info(f"Built client name index over {len(self.client_ids)} clients "
+                    f"and {len(self.blocks)} trigram blocks")
+
+    def _candidates(self, grams: Set[str]) -> Set[int]:
+        """Clients sharing a selective trigram with the query."""
+        blocks = sorted((self.blocks[g] for g in grams if g in self.blocks), key=len)
+        if not blocks:
+            return set()
+
+        # Trigrams shared by most clients ("CO ", " IN") do not narrow the search;
+        # fall back to the rarest few when every trigram is that common
+        selective = [b for b in blocks if len(b) <= self.config['max_block_size']] or blocks[:3]
+        candidates = set()
+        for block in selective:
+            candidates.update(block)
+        return candidates
+
+    def match(self, name: str) -> List[Tuple[str, float, str]]:
+        """Resolve a name to [(client_id, score, match type)]; empty if unresolved.
+
+        Several clients are returned only when they are all registered under one name.
+        """
+        if name in self.cache:
+            return self.cache[name]
+
+        key = _name_key(name) if not pd.isna(name) else ''
+        if not key:
+            result = []
+        elif key in self.exact:
+            ids = self.exact[key]
+            result = [(client_id, 1.0, 'exact') for client_id in ids]
+            if len(ids) > 1:
+                self.ambiguous[name] = [(client_id, 1.0) for client_id in ids]
+        else:
+            result = self._fuzzy_match(name, key)
+
+        self.cache[name] = result
+        return result
+
+    def _fuzzy_match(self, name: str, key: str) -> List[Tuple[str, float, str]]:
+        """Score blocked candidates and accept a clear best-matching client name."""
+        grams = _trigrams(key)
+        scored = []
+        for position in self._candidates(grams):
+            client_grams = self.client_grams[position]
+            shared = len(grams & client_grams)
+            score = shared / (len(grams) + len(client_grams) - shared)
+            if score >= self.config['min_similarity']:
+                scored.append((score, position))
+
+        if not scored:
+            self.unmatched.add(name)
+            return []
+
+        scored.sort(reverse=True)
+        best_score = scored[0][0]
+        rivals = [(score, position) for score, position in scored
+                  if best_score - score <= self.config['ambiguity_margin']]
+        if len(rivals) > 1:
+            self.ambiguous[name] = [(self.client_ids[p], round(score, 4)) for score, p in rivals]
+            # Rival clients with one shared name are treated like an exact duplicate
+            # name; rivals with different names leave the invoice unresolved
+            if len({self.client_keys[p] for _, p in rivals}) > 1:
+                return []
+
+        best_key = self.client_keys[scored[0][1]]
+        return [(self.client_ids[p], round(score, 4), 'fuzzy') for score, p in rivals
+                if self.client_keys[p] == best_key]
+
+    def resolve(self, names: List[str]) -> pd.DataFrame:
+        """Resolve distinct names to a client_name -> client_id match table."""
+        rows = []
+        for name in dict.fromkeys(names):
+            for client_id, score, match_type in self.match(name):
+                rows.append({
+                    'client_name': name,
+                    'client_id': client_id,
+                    'match_score': score,
+                    'match_type': match_type
+                })
+        return pd.DataFrame(rows, columns=['client_name', 'client_id', 'match_score', 'match_type'])
+
+    def report(self) -> Dict[str, Any]:
+        """Summary of resolved, ambiguous and unmatched names seen so far."""
+        resolved = [matches for matches in self.cache.values() if matches]
+        return {
+            'names': len(self.cache),
+            'exact': sum(1 for matches in resolved if matches[0][2] == 'exact'),
+            'fuzzy': sum(1 for matches in resolved if matches[0][2] == 'fuzzy'),
+            'ambiguous': dict(self.ambiguous),
+            'unmatched': sorted(self.unmatched)
+        }
+
+    def log_report(self) -> None:
+        """Log the match summary, listing names that could not be resolved cleanly."""
+        report = self.report()
+        logger.info(f"Client name matching: {report['names']} names, {report['exact']} exact, "
+                    f"{report['fuzzy']} fuzzy, {len(report['ambiguous'])} ambiguous, "
+                    f"{len(report['unmatched'])} unmatched")
+        for name, candidates in report['ambiguous'].items():
+            logger.warning(f"Ambiguous client name '{name}': candidates {candidates}")
+        for name in report['unmatched']:
+            logger.warning(f"Unmatched client name '{name}'")
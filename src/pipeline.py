@@ -4,27 +4,223 @@ Orchestrates client and invoice data processing, creates fact tables, and runs a
 """
 import os
 import glob
-from typing import List, Dict, Any
+import json
+import time
+import queue
+import threading
+from contextlib import nullcontext
+from datetime import date, datetime, timezone
+from typing import List, Dict, Any, Tuple
 import pandas as pd
 from loguru import logger
 
-from .config import DB_CONFIG, RATE_SHEET, DATA_PATTERNS
-from .database import DatabaseManager
-from .data_processing import ClientProcessor, InvoiceProcessor
+from .config import (DB_CONFIG, RATE_SHEET, DATA_PATTERNS, PIPELINE_CONFIG, FX_CONFIG,
+                     CHECKPOINT_CONFIG, SHARD_CONFIG, REPORT_CONFIG)
+from .database import DatabaseManager, monthly_partition_name, month_bounds, money_sql
+from .data_processing import ClientProcessor, InvoiceProcessor, find_input_files
+from .matching import ClientNameIndex
+from .fx import read_fx_rates
+from .scheduler import StageScheduler
+from .checkpoints import CheckpointStore
+from .sharding import ShardCoordinator, key_shards
+from .sketches import InvoiceSketch
+from .profiling import StageProfiler
+from .watcher import IngestionWatcher
+
+
+# Analysis queries run at the end of the pipeline, as result key -> (log label, SQL);
+# the {cost_sum}-style fields are filled by money_sql for the money representation,
+# and the growth window and row :limit are bound from REPORT_CONFIG
+PIPELINE_QUERIES = {
+    'top_5_clients': ("Query 1: Top 5 clients by total costs", '''
+        SELECT 
+            client_id,
+            client_name,
+            client_status,
+            {cost_sum} as total_invoice_cost,
+            COUNT(invoice_id) as invoice_count
+        FROM invoice_facts 
+        WHERE client_id IS NOT NULL
+        GROUP BY client_id, client_name, client_status
+        ORDER BY total_invoice_cost DESC
+        LIMIT :limit;
+        '''),
+    'month_over_month_growth': ("Query 2: Month-over-month cost growth per client", '''
+        WITH monthly_totals AS (
+            SELECT 
+                client_id,
+                client_name,
+                DATE_TRUNC('month', invoice_date) as invoice_month,
+                {cost_sum} as monthly_amount
+            FROM invoice_facts 
+            WHERE invoice_date >= :start_date
+                AND invoice_date < :end_date
+                AND client_id IS NOT NULL
+            GROUP BY client_id, client_name, DATE_TRUNC('month', invoice_date)
+        ),
+        with_previous AS (
+            SELECT 
+                *,
+                LAG(monthly_amount) OVER (PARTITION BY client_id ORDER BY invoice_month) as prev_month_amount
+            FROM monthly_totals
+        )
+        SELECT 
+            client_id,
+            client_name,
+            invoice_month,
+            monthly_amount,
+            prev_month_amount,
+            CASE 
+                WHEN prev_month_amount IS NULL OR prev_month_amount = 0 THEN NULL
+                ELSE ((monthly_amount - prev_month_amount) / prev_month_amount * 100)
+            END as growth_percentage
+        FROM with_previous
+        WHERE prev_month_amount IS NOT NULL
+        ORDER BY client_id, invoice_month;
+        '''),
+    'discount_scenario_top_5': ("Query 3: Discount scenario analysis", '''
+        WITH discounted_costs AS (
+            SELECT 
+                client_id,
+                client_name,
+                shipment_type,
+                {cost_sum} as original_amount,
+                {discounted_cost_sum} as discounted_amount
+            FROM invoice_facts
+            WHERE client_id IS NOT NULL
+            GROUP BY client_id, client_name, shipment_type
+        )
+        SELECT 
+            client_id,
+            client_name,
+            SUM(original_amount) as total_original,
+            SUM(discounted_amount) as total_discounted,
+            SUM(original_amount) - SUM(discounted_amount) as total_savings
+        FROM discounted_costs
+        GROUP BY client_id, client_name
+        ORDER BY total_discounted DESC
+        LIMIT :limit;
+        '''),
+    'express_to_ground_analysis': ("Query 4: EXPRESS to GROUND reclassification savings", '''
+        WITH express_analysis AS (
+            SELECT 
+                client_id,
+                client_name,
+                COUNT(CASE WHEN shipment_type = 'EXPRESS' THEN 1 END) as express_shipments,
+                {express_cost_sum} as express_cost,
+                {ground_equivalent_sum} as ground_equivalent_cost,
+                {cost_sum} as total_cost
+            FROM invoice_facts
+            WHERE client_id IS NOT NULL
+            GROUP BY client_id, client_name
+            HAVING COUNT(CASE WHEN shipment_type = 'EXPRESS' THEN 1 END) > 0
+        )
+        SELECT 
+            client_id,
+            client_name,
+            express_shipments,
+            express_cost,
+            ground_equivalent_cost,
+            express_cost - ground_equivalent_cost as total_savings,
+            ((express_cost - ground_equivalent_cost) / total_cost * 100) as savings_percentage,
+            CASE 
+                WHEN ((express_cost - ground_equivalent_cost) / total_cost * 100) > 50 THEN 'YES'
+                ELSE 'NO'
+            END as over_50_percent_savings,
+            CASE 
+                WHEN (express_cost - ground_equivalent_cost) > 500000 THEN 'YES'
+                ELSE 'NO'
+            END as over_500k_savings
+        FROM express_analysis
+        ORDER BY total_savings DESC;
+        '''),
+}
+
+# pipeline.log is added as a log sink by the first pipeline of the process only
+_log_sink_added = False
+_log_sink_lock = threading.Lock()
+
+
+def _row_count(stage_result: Any) -> int:
+    """Rows produced by an ingestion stage: a DataFrame, or load stats when streaming."""
+    if isinstance(stage_result, dict):
+        return stage_result['rows']
+    return len(stage_result)
+
+
+def _file_patterns(paths: List[str]) -> List[str]:
+    """Glob patterns matching exactly the given files, whose paths may contain [, * or ?."""
+    return [glob.escape(path) for path in paths]
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    """Parse a TYPE=RATE[,TYPE=RATE...] rate change specification."""
+    rates = {}
+    for item in spec.split(','):
+        shipment_type, _, rate = item.partition('=')
+        rates[shipment_type.strip().upper()] = float(rate)
+    return rates
 
 
 class RevealPipeline:
     """Main pipeline for processing client and invoice data."""
     
-    def __init__(self, data_dir: str = None, db_config: Dict = None):
-        """Initialize pipeline with data directory and database config."""
+    def __init__(self, data_dir: str = None, db_config: Dict = None,
+                 staging_dir: str = None, from_staging: bool = False,
+                 partitioned: bool = False, streaming: bool = False,
+                 fx_rates_file: str = None, spill_dir: str = None,
+                 record_quality: bool = False, checkpoint_dir: str = None,
+                 resume: bool = False, run_id: str = None, profile_dir: str = None,
+                 db_manager: DatabaseManager = None, stage_slots: threading.BoundedSemaphore = None,
+                 money_cents: bool = False):
+        """Initialize pipeline with data directory and database config.
+        
+        When staging_dir is set, normalized clients, invoices and facts are written
+        there as Parquet; with from_staging, normalized data is rehydrated from it
+        instead of the raw CSV/PDF files. With partitioned, invoices and facts are
+        stored in tables range-partitioned by invoice month. With streaming, invoices
+        are normalized and loaded as overlapping chunks instead of one batch.
+        fx_rates_file is a CSV of dated USD rates used to convert non-USD invoice
+        amounts in the fact build. With spill_dir, streamed invoices are deduplicated
+        out of core through spill files there instead of an in-memory id set. With
+        record_quality, per-file data-quality summaries are stored in data_quality.
+        With checkpoint_dir, each completed stage of run_full_pipeline is checkpointed
+        there, and with resume, stages whose inputs are unchanged are not rerun.
+        run_id names the run's invoice sketch in ingestion_sketches (default: start time).
+        With profile_dir, each stage is profiled into per-stage files there.
+        A db_manager passed in (e.g. one per schema on a shared engine) is used
+        instead of a new one, and stage_slots bounds concurrent stages together
+        with other pipelines sharing the semaphore. With money_cents, amounts are
+        normalized to integer cents and stored, costed and aggregated as BIGINT.
+        """
         self.data_dir = data_dir or os.getcwd()
-        self.db_manager = DatabaseManager(db_config or DB_CONFIG)
+        self.db_manager = db_manager or DatabaseManager(db_config or DB_CONFIG, partitioned=partitioned,
+                                                        money_cents=money_cents)
         self.client_processor = ClientProcessor()
-        self.invoice_processor = InvoiceProcessor()
+        self.invoice_processor = InvoiceProcessor(money_cents=money_cents)
+        self.name_index = None
+        self.staging = None
+        if staging_dir:
+            # pyarrow.dataset/parquet are only loaded when staging is used
+            from .staging import ParquetStaging
+            self.staging = ParquetStaging(staging_dir)
+        self.from_staging = from_staging and self.staging is not None
+        self.streaming = streaming and not self.from_staging
+        self.fx_rates_file = fx_rates_file or FX_CONFIG['rates_file']
+        self.spill_dir = spill_dir
+        self.record_quality = record_quality
+        self.checkpoint_dir = checkpoint_dir
+        self.resume = resume and checkpoint_dir is not None
+        self.run_id = run_id or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        self.profiler = StageProfiler(profile_dir) if profile_dir else None
+        self.stage_slots = stage_slots
         
-        # Setup logging
-        logger.add("pipeline.log", rotation="10 MB", level="INFO")
+        # Setup logging, once per process when several pipelines run side by side
+        global _log_sink_added
+        with _log_sink_lock:
+            if not _log_sink_added:
+                logger.add("pipeline.log", rotation="10 MB", level="INFO")
+                _log_sink_added = True
         logger.info(f"Pipeline initialized with data directory: {self.data_dir}")
     
     def setup_database(self) -> None:
@@ -32,16 +228,29 @@ class RevealPipeline:
         logger.info("Setting up database...")
         self.db_manager.connect()
         self.db_manager.create_tables()
+        self.db_manager.seed_rate_sheet()
+        if self.fx_rates_file:
+            self.load_fx_rates(self.fx_rates_file)
         logger.info("Database setup complete")
     
+    def load_fx_rates(self, path: str) -> None:
+        """Replace the fx_rates table with the effective rate ranges from a rate file."""
+        fx_rates = read_fx_rates(path)
+        self.db_manager.execute_sql("DELETE FROM fx_rates")
+        if not fx_rates.empty:
+            self.db_manager.upsert_dataframe(
+                fx_rates,
+                'fx_rates',
+                conflict_columns=['currency', 'valid_from']
+            )
+    
     def find_data_files(self) -> Dict[str, List[str]]:
-        """Find all data files matching expected patterns."""
+        """Find all data files matching expected patterns, recursively and plain or compressed."""
         logger.info(f"Searching for data files in: {self.data_dir}")
         
         files = {}
         for data_type, pattern in DATA_PATTERNS.items():
-            full_pattern = os.path.join(self.data_dir, pattern)
-            found_files = glob.glob(full_pattern)
+            found_files = find_input_files(self.data_dir, pattern)
             files[data_type] = found_files
             logger.info(f"Found {len(found_files)} {data_type} files: {found_files}")
         
@@ -51,58 +260,310 @@ class RevealPipeline:
         """Process all client files and return normalized data."""
         logger.info("Processing client data...")
         
-        if not client_files:
+        if self.from_staging:
+            client_data = self.staging.read_clients()
+        elif not client_files:
             logger.warning("No client files found")
             return pd.DataFrame()
-        
-        # Process files with the client processor
-        client_data = self.client_processor.process_files(client_files)
+        else:
+            # Process files with the client processor
+            client_data = self.client_processor.process_files(_file_patterns(client_files))
+            if self.staging and not client_data.empty:
+                self.staging.write_clients(client_data)
         
         if not client_data.empty:
             logger.info(f"Processed {len(client_data)} client records")
-            # Store in database
-            self.db_manager.upsert_dataframe(
-                client_data, 
-                'clients', 
-                conflict_columns=['client_id']
-            )
+            self.store_clients(client_data)
             logger.info("Client data stored in database")
         
         return client_data
     
+    def store_clients(self, client_data: pd.DataFrame) -> None:
+        """Upsert normalized clients."""
+        # Store in database
+        self.db_manager.upsert_dataframe(
+            client_data, 
+            'clients', 
+            conflict_columns=['client_id']
+        )
+    
     def process_invoices(self, invoice_files: List[str]) -> pd.DataFrame:
         """Process all invoice files and return normalized data."""
         logger.info("Processing invoice data...")
         
-        if not invoice_files:
+        if self.from_staging:
+            invoice_data = self.staging.read_invoices()
+            if not invoice_data.empty and \
+                    pd.api.types.is_integer_dtype(invoice_data['amount']) != self.invoice_processor.money_cents:
+                raise ValueError("Staged invoices use the other money representation (--cents); restage them")
+        elif not invoice_files:
             logger.warning("No invoice files found")
             return pd.DataFrame()
-        
-        # Process files with the invoice processor
-        invoice_data = self.invoice_processor.process_files(invoice_files)
+        else:
+            # Process files with the invoice processor
+            invoice_data = self.invoice_processor.process_files(_file_patterns(invoice_files))
+            if self.staging and not invoice_data.empty:
+                self.staging.write_invoices(invoice_data)
         
         if not invoice_data.empty:
             logger.info(f"Processed {len(invoice_data)} invoice records")
-            # Store in database
-            self.db_manager.upsert_dataframe(
-                invoice_data, 
-                'invoices', 
-                conflict_columns=['invoice_id']
-            )
+            self.store_invoices(invoice_data)
+            self.invoice_processor.update_sketch(invoice_data)
             logger.info("Invoice data stored in database")
         
         return invoice_data
     
-    def create_fact_table(self) -> None:
-        """Create fact table by joining clients and invoices with additional calculations."""
-        logger.info("Creating invoice facts table...")
+    def store_invoices(self, invoice_data: pd.DataFrame) -> None:
+        """Upsert normalized invoices, creating monthly partitions first if enabled.
+        
+        Partitioned invoices are keyed by (invoice_id, invoice_date), so the row of
+        an invoice whose date changed is removed from its old partition.
+        """
+        conflict_columns = ['invoice_id']
+        replace_on = None
+        if self.db_manager.partitioned:
+            months = pd.to_datetime(invoice_data['invoice_date'], errors='coerce').dt.strftime('%Y-%m')
+            self.db_manager.ensure_monthly_partitions('invoices', months.dropna())
+            conflict_columns.append('invoice_date')
+            replace_on = ['invoice_id']
+        
+        # Store in database
+        self.db_manager.upsert_dataframe(
+            invoice_data, 
+            'invoices', 
+            conflict_columns=conflict_columns,
+            replace_on=replace_on
+        )
+    
+    def stream_invoices(self, invoice_files: List[str], shard: Tuple[int, int] = None) -> Dict[str, Any]:
+        """Normalize and load invoices as overlapping chunks, returning load statistics.
+        
+        A producer thread normalizes chunk N+1 while this thread loads chunk N into
+        Postgres. The bounded queue between them applies backpressure, so at most
+        queue depth + 2 chunks are in memory at once. With shard as (shard_id,
+        shard_count), only invoices whose invoice_id hashes to that shard are loaded.
+        """
+        logger.info("Streaming invoice data...")
+        
+        stats = {'rows': 0, 'chunks': 0, 'normalize_seconds': 0.0,
+                 'load_seconds': 0.0, 'wall_seconds': 0.0, 'overlap_efficiency': 0.0}
+        if not invoice_files:
+            logger.warning("No invoice files found")
+            return stats
+        
+        chunk_queue = queue.Queue(maxsize=PIPELINE_CONFIG['stream_queue_depth'])
+        stop = threading.Event()
+        producer_errors = []
+        end_of_stream = object()
+        
+        def put(item) -> bool:
+            # Block while the buffers are full, but give up if the consumer stopped
+            while not stop.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce() -> None:
+            chunks = self.invoice_processor.iter_normalized_chunks(
+                _file_patterns(invoice_files), PIPELINE_CONFIG['stream_chunk_rows'], spill_dir=self.spill_dir
+            )
+            try:
+                while True:
+                    start = time.perf_counter()
+                    chunk = next(chunks, None)
+                    stats['normalize_seconds'] += time.perf_counter() - start
+                    if chunk is None or not put(chunk):
+                        break
+            except Exception as e:
+                producer_errors.append(e)
+            finally:
+                put(end_of_stream)
+        
+        if self.staging:
+            self.staging.clear('invoices')
+        
+        wall_start = time.perf_counter()
+        producer = threading.Thread(target=produce, name='invoice-normalizer', daemon=True)
+        producer.start()
+        try:
+            while True:
+                chunk = chunk_queue.get()
+                if chunk is end_of_stream:
+                    break
+                if shard is not None:
+                    chunk = chunk[key_shards(chunk['invoice_id'], shard[1]) == shard[0]]
+                    if chunk.empty:
+                        continue
+                
+                start = time.perf_counter()
+                self.store_invoices(chunk)
+                self.invoice_processor.update_sketch(chunk)
+                if self.staging:
+                    self.staging.append_invoices(chunk, part=stats['chunks'])
+                stats['load_seconds'] += time.perf_counter() - start
+                
+                stats['rows'] += len(chunk)
+                stats['chunks'] += 1
+        finally:
+            stop.set()
+            producer.join()
+        
+        if producer_errors:
+            raise producer_errors[0]
+        
+        stats['wall_seconds'] = time.perf_counter() - wall_start
+        # Share of the shorter phase hidden behind the longer one (1.0 = fully overlapped)
+        overlapped = stats['normalize_seconds'] + stats['load_seconds'] - stats['wall_seconds']
+        shorter = min(stats['normalize_seconds'], stats['load_seconds'])
+        if shorter > 0:
+            stats['overlap_efficiency'] = max(0.0, min(1.0, overlapped / shorter))
+        
+        logger.info(f"Streamed {stats['rows']} invoice records in {stats['chunks']} chunks "
+                    f"(normalize {stats['normalize_seconds']:.2f}s, load {stats['load_seconds']:.2f}s, "
+                    f"wall {stats['wall_seconds']:.2f}s, overlap {stats['overlap_efficiency']:.0%})")
+        return stats
+    
+    def resolve_client_names(self, client_data: pd.DataFrame = None) -> Dict[str, Any]:
+        """Match invoice client names lacking a known client_id to clients.
+        
+        Rebuilds the name index from client_data when given; otherwise the current
+        index and its cache of resolved names are reused, or built from the clients
+        table. Replaces client_name_matches and returns the match report.
+        """
+        if client_data is not None and not client_data.empty:
+            self.name_index = ClientNameIndex(client_data)
+        elif self.name_index is None:
+            self.name_index = ClientNameIndex(
+                self.db_manager.read_dataframe("SELECT client_id, client_name FROM clients")
+            )
+        
+        names = self.db_manager.execute_sql('''
+        SELECT DISTINCT i.client_name
+        FROM invoices i
+        LEFT JOIN clients c ON c.client_id = i.client_id
+        WHERE c.client_id IS NULL AND i.client_name IS NOT NULL
+        ''', name='unresolved_client_names').scalars().all()
+        matches = self.name_index.resolve(names)
+        
+        self.db_manager.execute_sql("DELETE FROM client_name_matches")
+        if not matches.empty:
+            self.db_manager.upsert_dataframe(
+                matches,
+                'client_name_matches',
+                conflict_columns=['client_name', 'client_id']
+            )
+        
+        self.name_index.log_report()
+        return self.name_index.report()
+    
+    def store_data_quality(self) -> int:
+        """Collect the data-quality summaries of files processed since the last call.
+        
+        With record_quality, each file's rows in data_quality are replaced, so a file
+        that has since been fixed no longer shows its old failures. Returns the
+        number of summary rows collected.
+        """
+        files, rows = [], []
+        for processor in (self.client_processor, self.invoice_processor):
+            processor_files, processor_rows = processor.quality.collect()
+            files.extend(processor_files)
+            rows.extend(processor_rows)
+        
+        if self.record_quality and files:
+            self.db_manager.execute_sql(
+                "DELETE FROM data_quality WHERE source_file = ANY(:files)", {'files': files}
+            )
+            if rows:
+                self.db_manager.upsert_dataframe(
+                    pd.DataFrame(rows),
+                    'data_quality',
+                    conflict_columns=['source_file', 'column_name', 'reason']
+                )
+            logger.info(f"Recorded {len(rows)} data quality rows for {len(files)} files")
+        
+        return len(rows)
+    
+    def store_ingestion_sketch(self, part: int = 0) -> int:
+        """Merge the invoice sketch built since the last call into the run's stored sketch.
+        
+        A run keeps one sketch per part (shard of a sharded run), so watch cycles
+        accumulate into it. Returns the number of invoices added.
+        """
+        sketch = self.invoice_processor.sketch
+        if not sketch.rows:
+            return 0
+        self.invoice_processor.sketch = InvoiceSketch()
+        added = sketch.rows
+        
+        params = {'run_id': self.run_id, 'part': part}
+        stored = self.db_manager.execute_sql(
+            "SELECT sketch FROM ingestion_sketches WHERE run_id = :run_id AND part = :part", params
+        ).scalar()
+        if stored:
+            sketch.merge(InvoiceSketch.from_dict(stored))
+        
+        self.db_manager.execute_sql('''
+        INSERT INTO ingestion_sketches (run_id, part, row_count, sketch)
+        VALUES (:run_id, :part, :row_count, CAST(:sketch AS JSONB))
+        ON CONFLICT (run_id, part) DO UPDATE SET
+            row_count = EXCLUDED.row_count,
+            sketch = EXCLUDED.sketch,
+            updated_timestamp = CURRENT_TIMESTAMP
+        ''', {**params, 'row_count': sketch.rows, 'sketch': json.dumps(sketch.to_dict())})
+        logger.info(f"Stored ingestion sketch of run {self.run_id} (part {part}): {added} invoices added")
+        return added
+    
+    def _ensure_fact_partitions(self, invoice_filter: str, params: Dict[str, Any],
+                                extra_months: List[str] = None) -> None:
+        """Create the fact partitions needed for invoices matching a filter."""
+        if not self.db_manager.partitioned:
+            return
+        
+        months = self.db_manager.execute_sql(f'''
+        SELECT DISTINCT to_char(i.invoice_date, 'YYYY-MM')
+        FROM invoices i
+        WHERE i.invoice_date IS NOT NULL {invoice_filter}
+        ''', params, name='fact_months').scalars().all()
+        self.db_manager.ensure_monthly_partitions('invoice_facts', months + (extra_months or []))
+    
+    def _check_fx_coverage(self, invoice_filter: str, params: Dict[str, Any]) -> None:
+        """Warn about non-USD invoices that no FX rate covers; they are costed unconverted."""
+        missing = self.db_manager.execute_sql(f'''
+        SELECT i.currency, COUNT(*)
+        FROM invoices i
+        LEFT JOIN fx_rates fx
+            ON fx.currency = i.currency
+            AND i.invoice_date >= fx.valid_from AND i.invoice_date < fx.valid_to
+        WHERE i.currency <> 'USD' AND fx.currency IS NULL {invoice_filter}
+        GROUP BY i.currency
+        ''', params, name='fx_coverage').fetchall()
+        for currency, count in missing:
+            logger.warning(f"No FX rate covers {count} {currency} invoices; amounts left unconverted")
+    
+    def _fact_insert_sql(self, invoice_filter: str = '') -> str:
+        """Build the fact upsert SQL, optionally restricted by an extra invoice filter."""
+        conflict_str = 'client_id, invoice_id, invoice_date' if self.db_manager.partitioned else 'client_id, invoice_id'
+        if self.db_manager.uses_cents():
+            # Converted cents and the cost are rounded once from exact products; USD
+            # invoices skip the numeric conversion altogether
+            invoice_amount = ('CASE WHEN fx.usd_rate IS NULL THEN i.amount '
+                              'ELSE ROUND(i.amount * fx.usd_rate)::bigint END')
+            calculated_cost = f'ROUND(({invoice_amount}) * rates.rate_per_unit)::bigint'
+            ground_equivalent_cost = f'ROUND(({invoice_amount}) * ground.rate_per_unit)::bigint'
+        else:
+            invoice_amount = 'ROUND(i.amount * COALESCE(fx.usd_rate, 1.0), 2)'
+            calculated_cost = f'{invoice_amount} * rates.rate_per_unit'
+            ground_equivalent_cost = f'{invoice_amount} * ground.rate_per_unit'
         
         # SQL to create fact table with proper joins and calculations
-        fact_sql = '''
+        return f'''
         INSERT INTO invoice_facts (
             client_id, client_name, client_status, client_tier,
             invoice_id, invoice_date, invoice_amount, shipment_type,
-            rate_per_unit, calculated_cost
+            rate_per_unit, calculated_cost, ground_equivalent_cost
         )
         SELECT DISTINCT
             COALESCE(c.client_id, i.client_id) as client_id,
@@ -111,24 +572,31 @@ class RevealPipeline:
             c.tier as client_tier,
             i.invoice_id,
             i.invoice_date::date,
-            i.amount as invoice_amount,
+            {invoice_amount} as invoice_amount,
             i.shipment_type,
             rates.rate_per_unit,
-            i.amount * rates.rate_per_unit as calculated_cost
+            {calculated_cost} as calculated_cost,
+            {ground_equivalent_cost} as ground_equivalent_cost
         FROM invoices i
-        LEFT JOIN clients c 
-            ON c.client_id = i.client_id 
-            OR UPPER(c.client_name) = UPPER(i.client_name)
-        LEFT JOIN (
-            VALUES
-                ('GROUND', 1.0),
-                ('2DAY', 5.0),
-                ('EXPRESS', 10.0),
-                ('FREIGHT', 20.0)
-        ) AS rates(shipment_type, rate_per_unit)
-            ON i.shipment_type = rates.shipment_type
-        WHERE i.invoice_id IS NOT NULL
-        ON CONFLICT (client_id, invoice_id) DO UPDATE SET
+        LEFT JOIN clients ci ON ci.client_id = i.client_id
+        -- Invoices without a known client_id fall back to the resolved client name
+        LEFT JOIN client_name_matches m
+            ON ci.client_id IS NULL AND m.client_name = i.client_name
+        LEFT JOIN clients c ON c.client_id = COALESCE(ci.client_id, m.client_id)
+        -- As-of FX conversion: the rate range containing the invoice date
+        LEFT JOIN fx_rates fx
+            ON fx.currency = i.currency
+            AND i.invoice_date >= fx.valid_from AND i.invoice_date < fx.valid_to
+        -- Rate version in effect on the invoice date
+        LEFT JOIN rate_sheet rates
+            ON rates.shipment_type = i.shipment_type
+            AND i.invoice_date >= rates.valid_from AND i.invoice_date < rates.valid_to
+        -- GROUND rate in effect on the invoice date, costing the invoice as if shipped GROUND
+        LEFT JOIN rate_sheet ground
+            ON ground.shipment_type = 'GROUND'
+            AND i.invoice_date >= ground.valid_from AND i.invoice_date < ground.valid_to
+        WHERE i.invoice_id IS NOT NULL {invoice_filter}
+        ON CONFLICT ({conflict_str}) DO UPDATE SET
             client_name     = EXCLUDED.client_name,
             client_status   = EXCLUDED.client_status,
             client_tier     = EXCLUDED.client_tier,
@@ -136,198 +604,347 @@ class RevealPipeline:
             invoice_amount  = EXCLUDED.invoice_amount,
             shipment_type   = EXCLUDED.shipment_type,
             rate_per_unit   = EXCLUDED.rate_per_unit,
-            calculated_cost = EXCLUDED.calculated_cost;
+            calculated_cost = EXCLUDED.calculated_cost,
+            ground_equivalent_cost = EXCLUDED.ground_equivalent_cost;
         '''
+    
+    def create_fact_table(self, month: str = None) -> None:
+        """Create fact table by joining clients and invoices with additional calculations.
+        
+        With month (YYYY-MM), only that month's facts are rebuilt; on partitioned
+        tables this truncates the single monthly partition instead of deleting rows.
+        """
+        logger.info(f"Creating invoice facts table{f' for {month}' if month else ''}...")
+        
+        partitioned = self.db_manager.partitioned
+        params = {}
+        month_filter = ''
+        if month:
+            params['month_start'], params['month_end'] = month_bounds(month)
+            month_filter = 'AND i.invoice_date >= :month_start AND i.invoice_date < :month_end'
+        
+        self._ensure_fact_partitions(month_filter, params, [month] if month else [])
+        self._check_fx_coverage(month_filter, params)
+        fact_sql = self._fact_insert_sql(month_filter)
         
         # Clear existing fact table data first for idempotency
-        self.db_manager.execute_sql("DELETE FROM invoice_facts")
+        if partitioned and month:
+            self.db_manager.truncate_table(monthly_partition_name('invoice_facts', month))
+        elif partitioned:
+            self.db_manager.truncate_table('invoice_facts')
+        elif month:
+            self.db_manager.execute_sql(
+                "DELETE FROM invoice_facts WHERE invoice_date >= :month_start AND invoice_date < :month_end",
+                params
+            )
+        else:
+            self.db_manager.execute_sql("DELETE FROM invoice_facts")
         
         # Execute fact table creation
-        result = self.db_manager.execute_sql(fact_sql)
+        result = self.db_manager.execute_sql(fact_sql, params, name='fact_build')
         
         # Get count of fact records
         count_result = self.db_manager.execute_sql("SELECT COUNT(*) FROM invoice_facts")
         fact_count = count_result.fetchone()[0]
         
         logger.info(f"Created {fact_count} fact table records")
+        
+        # Keep planner stats and the visibility map fresh for index-only scans
+        self.db_manager.vacuum_analyze('invoice_facts')
+    
+    def refresh_facts_for_invoices(self, invoice_ids: List[str]) -> None:
+        """Rebuild only the fact rows of the given invoices."""
+        if not invoice_ids:
+            return
+        
+        logger.info(f"Refreshing facts for {len(invoice_ids)} invoices...")
+        params = {'invoice_ids': list(invoice_ids)}
+        invoice_filter = 'AND i.invoice_id = ANY(:invoice_ids)'
+        
+        self._ensure_fact_partitions(invoice_filter, params)
+        self._check_fx_coverage(invoice_filter, params)
+        self.db_manager.execute_sql("DELETE FROM invoice_facts WHERE invoice_id = ANY(:invoice_ids)", params)
+        self.db_manager.execute_sql(self._fact_insert_sql(invoice_filter), params, name='fact_refresh')
+        logger.info(f"Refreshed facts for {len(invoice_ids)} invoices")
+    
+    def refresh_facts_since(self, start_date: date) -> None:
+        """Rebuild only the fact rows of invoices dated on or after start_date."""
+        logger.info(f"Refreshing facts for invoices since {start_date}...")
+        params = {'start_date': start_date}
+        invoice_filter = 'AND i.invoice_date >= :start_date'
+        
+        self._ensure_fact_partitions(invoice_filter, params)
+        self._check_fx_coverage(invoice_filter, params)
+        self.db_manager.execute_sql("DELETE FROM invoice_facts WHERE invoice_date >= :start_date", params)
+        self.db_manager.execute_sql(self._fact_insert_sql(invoice_filter), params, name='fact_refresh')
+        self.db_manager.vacuum_analyze('invoice_facts')
+        logger.info(f"Refreshed facts for invoices since {start_date}")
+    
+    def apply_rate_change(self, rates: Dict[str, float], effective_from: date) -> None:
+        """Version in new shipment rates and recompute only the facts they apply to."""
+        unknown = set(rates) - set(RATE_SHEET)
+        if unknown:
+            raise ValueError(f"Unknown shipment types: {sorted(unknown)}")
+        
+        self.db_manager.set_rates(rates, effective_from)
+        self.refresh_facts_since(effective_from)
+    
+    def stage_facts(self) -> None:
+        """Write the current fact set to the Parquet staging layer."""
+        logger.info("Staging invoice facts...")
+        
+        facts = self.db_manager.read_dataframe('''
+        SELECT
+            client_id, client_name, client_status, client_tier,
+            invoice_id, invoice_date, invoice_amount, shipment_type,
+            rate_per_unit, calculated_cost, ground_equivalent_cost
+        FROM invoice_facts
+        ''', name='stage_facts')
+        self.staging.write_facts(facts)
+    
+    def run_analysis_query(self, name: str) -> List[Any]:
+        """Run a single pipeline analysis query by result key."""
+        label, sql = PIPELINE_QUERIES[name]
+        logger.info(label)
+        start_date, end_date = REPORT_CONFIG['growth_window']
+        params = {'start_date': start_date, 'end_date': end_date,
+                  'limit': REPORT_CONFIG['limits']['top_clients']}
+        return self.db_manager.execute_sql(money_sql(sql, self.db_manager.uses_cents()), params,
+                                           name=name).fetchall()
     
     def run_analysis_queries(self) -> Dict[str, Any]:
         """Run all required analysis queries and return results."""
         logger.info("Running analysis queries...")
         
-        results = {}
+        results = {name: self.run_analysis_query(name) for name in PIPELINE_QUERIES}
         
-        # Query 1: Top 5 clients by total calculated costs
-        logger.info("Query 1: Top 5 clients by total costs")
-        q1_sql = '''
-        SELECT 
-            client_id,
-            client_name,
-            client_status,
-            SUM(calculated_cost) as total_invoice_cost,
-            COUNT(invoice_id) as invoice_count
-        FROM invoice_facts 
-        WHERE client_id IS NOT NULL
-        GROUP BY client_id, client_name, client_status
-        ORDER BY total_invoice_cost DESC
-        LIMIT 5;
-        '''
-        q1_result = self.db_manager.execute_sql(q1_sql)
-        results['top_5_clients'] = q1_result.fetchall()
+        logger.info("All analysis queries completed")
+        return results
+
+    
+    def _profiled(self, name: str):
+        """Context profiling a block as stage name when profiling is enabled."""
+        return self.profiler.profile(name) if self.profiler else nullcontext()
+    
+    def _run_options(self) -> Dict[str, Any]:
+        """Options and target database that decide what the ingestion stages produce."""
+        db_config = self.db_manager.config
+        return {
+            'data_dir': os.path.abspath(self.data_dir),
+            'database': (db_config['host'], db_config['port'], db_config['database']),
+            'partitioned': self.db_manager.partitioned,
+            'money_cents': self.invoice_processor.money_cents,
+            'from_staging': self.from_staging,
+            'streaming': self.streaming
+        }
+    
+    def _file_stats(self, files: List[str]) -> List[tuple]:
+        """Path, modification time and size of each file, for input fingerprints."""
+        stats = []
+        for path in sorted(files):
+            stat = os.stat(path)
+            stats.append((path, stat.st_mtime_ns, stat.st_size))
+        return stats
+    
+    def _ingestion_fingerprint(self, files: List[str]) -> List[Any]:
+        """Fingerprint an ingestion stage's inputs: its raw files, or the staged data."""
+        if self.from_staging:
+            files = [os.path.join(root, name)
+                     for root, _, names in os.walk(self.staging.staging_dir) for name in names]
+        return [self._run_options(), self._file_stats(files)]
+    
+    def _fact_inputs_fingerprint(self) -> List[Any]:
+        """Fingerprint the database state the fact build reads besides its input files.
         
-        # Query 2: Month-over-month cost growth per client (2024-2025)
-        logger.info("Query 2: Month-over-month cost growth per client")
-        q2_sql = '''
-        WITH monthly_totals AS (
-            SELECT 
-                client_id,
-                client_name,
-                DATE_TRUNC('month', invoice_date) as invoice_month,
-                SUM(calculated_cost) as monthly_amount
-            FROM invoice_facts 
-            WHERE invoice_date >= '2024-01-01' 
-                AND invoice_date < '2026-01-01'
-                AND client_id IS NOT NULL
-            GROUP BY client_id, client_name, DATE_TRUNC('month', invoice_date)
-        ),
-        with_previous AS (
-            SELECT 
-                *,
-                LAG(monthly_amount) OVER (PARTITION BY client_id ORDER BY invoice_month) as prev_month_amount
-            FROM monthly_totals
-        )
-        SELECT 
-            client_id,
-            client_name,
-            invoice_month,
-            monthly_amount,
-            prev_month_amount,
-            CASE 
-                WHEN prev_month_amount IS NULL OR prev_month_amount = 0 THEN NULL
-                ELSE ((monthly_amount - prev_month_amount) / prev_month_amount * 100)
-            END as growth_percentage
-        FROM with_previous
-        WHERE prev_month_amount IS NOT NULL
-        ORDER BY client_id, invoice_month;
-        '''
-        q2_result = self.db_manager.execute_sql(q2_sql)
-        results['month_over_month_growth'] = q2_result.fetchall()
+        Rates change with --set-rates, and clients and invoices with other runs
+        (e.g. the watcher), without any input file of this run changing. Client
+        name matches are left out: the fact build re-resolves them from clients
+        and invoices.
+        """
+        row = self.db_manager.execute_sql('''
+        SELECT
+            (SELECT md5(string_agg(r::text, ',' ORDER BY r::text)) FROM rate_sheet r),
+            (SELECT concat_ws('|', COUNT(*), MAX(updated_timestamp)) FROM clients),
+            (SELECT concat_ws('|', COUNT(*), MAX(updated_timestamp)) FROM invoices)
+        ''', name='fact_inputs_fingerprint').fetchone()
+        return list(row)
+    
+    def build_stage_graph(self) -> StageScheduler:
+        """Express the pipeline as a dependency graph of stages.
         
-        # Query 3: Discount scenario analysis (using calculated_cost)
-        logger.info("Query 3: Discount scenario analysis")
-        q3_sql = '''
-        WITH discounted_costs AS (
-            SELECT 
-                client_id,
-                client_name,
-                shipment_type,
-                SUM(calculated_cost) as original_amount,
-                SUM(CASE shipment_type
-                    WHEN 'GROUND'  THEN calculated_cost * 0.8
-                    WHEN 'FREIGHT' THEN calculated_cost * 0.7
-                    WHEN '2DAY'    THEN calculated_cost * 0.5
-                    ELSE calculated_cost
-                END) as discounted_amount
-            FROM invoice_facts
-            WHERE client_id IS NOT NULL
-            GROUP BY client_id, client_name, shipment_type
-        )
-        SELECT 
-            client_id,
-            client_name,
-            SUM(original_amount) as total_original,
-            SUM(discounted_amount) as total_discounted,
-            SUM(original_amount) - SUM(discounted_amount) as total_savings
-        FROM discounted_costs
-        GROUP BY client_id, client_name
-        ORDER BY total_discounted DESC
-        LIMIT 5;
-        '''
-        q3_result = self.db_manager.execute_sql(q3_sql)
-        results['discount_scenario_top_5'] = q3_result.fetchall()
+        Client and invoice ingestion only meet at the fact build, so they run
+        concurrently; the analysis queries fan out in parallel once facts exist.
+        Setup, file discovery and the queries, which read whatever the database
+        holds, always run; every other stage is checkpointed against a fingerprint
+        of its inputs when a checkpoint directory is set.
+        """
+        checkpoints = CheckpointStore(self.checkpoint_dir) if self.checkpoint_dir else None
+        scheduler = StageScheduler(max_workers=PIPELINE_CONFIG['max_workers'],
+                                   checkpoints=checkpoints, resume=self.resume,
+                                   profiler=self.profiler, slots=self.stage_slots)
         
-        # Query 4: Reclassification scenario (EXPRESS -> GROUND using calculated_cost)
-        logger.info("Query 4: EXPRESS to GROUND reclassification savings")
-        q4_sql = '''
-        WITH express_analysis AS (
-            SELECT 
-                client_id,
-                client_name,
-                COUNT(CASE WHEN shipment_type = 'EXPRESS' THEN 1 END) as express_shipments,
-                SUM(CASE WHEN shipment_type = 'EXPRESS' THEN calculated_cost ELSE 0 END) as express_cost,
-                SUM(CASE WHEN shipment_type = 'EXPRESS' THEN calculated_cost * 0.1 ELSE 0 END) as ground_equivalent_cost,
-                SUM(calculated_cost) as total_cost
-            FROM invoice_facts
-            WHERE client_id IS NOT NULL
-            GROUP BY client_id, client_name
-            HAVING COUNT(CASE WHEN shipment_type = 'EXPRESS' THEN 1 END) > 0
+        scheduler.add_stage('setup_database', lambda r: self.setup_database(), checkpoint=False)
+        scheduler.add_stage('find_data_files', lambda r: self.find_data_files(), checkpoint=False)
+        scheduler.add_stage(
+            'process_clients',
+            lambda r: self.process_clients(r['find_data_files'].get('clients', [])),
+            depends_on=['setup_database', 'find_data_files'],
+            fingerprint=lambda r: self._ingestion_fingerprint(r['find_data_files'].get('clients', []))
+        )
+        process_invoices = self.stream_invoices if self.streaming else self.process_invoices
+        scheduler.add_stage(
+            'process_invoices',
+            lambda r: process_invoices(r['find_data_files'].get('invoices', [])),
+            depends_on=['setup_database', 'find_data_files'],
+            fingerprint=lambda r: self._ingestion_fingerprint(r['find_data_files'].get('invoices', [])),
+            # Downstream stages only need the row count, not the invoices themselves
+            checkpoint=lambda result: result if isinstance(result, dict) else {'rows': len(result)}
         )
-        SELECT 
-            client_id,
-            client_name,
-            express_shipments,
-            express_cost,
-            ground_equivalent_cost,
-            express_cost - ground_equivalent_cost as total_savings,
-            ((express_cost - ground_equivalent_cost) / total_cost * 100) as savings_percentage,
-            CASE 
-                WHEN ((express_cost - ground_equivalent_cost) / total_cost * 100) > 50 THEN 'YES'
-                ELSE 'NO'
-            END as over_50_percent_savings,
-            CASE 
-                WHEN (express_cost - ground_equivalent_cost) > 500000 THEN 'YES'
-                ELSE 'NO'
-            END as over_500k_savings
-        FROM express_analysis
-        ORDER BY total_savings DESC;
-        '''
-        q4_result = self.db_manager.execute_sql(q4_sql)
-        results['express_to_ground_analysis'] = q4_result.fetchall()
         
-        logger.info("All analysis queries completed")
-        return results
-
+        def build_facts(r: Dict[str, Any]) -> None:
+            if _row_count(r['process_clients']) or _row_count(r['process_invoices']):
+                self.resolve_client_names(r['process_clients'])
+                self.create_fact_table()
+                if self.staging:
+                    self.stage_facts()
+        
+        scheduler.add_stage('create_fact_table', build_facts,
+                            depends_on=['process_clients', 'process_invoices'],
+                            fingerprint=lambda r: [self._file_stats([self.fx_rates_file] if self.fx_rates_file else []),
+                                                   self._fact_inputs_fingerprint()])
+        scheduler.add_stage('store_data_quality', lambda r: self.store_data_quality(),
+                            depends_on=['process_clients', 'process_invoices'],
+                            fingerprint=lambda r: self.record_quality)
+        scheduler.add_stage('store_ingestion_sketch', lambda r: self.store_ingestion_sketch(),
+                            depends_on=['process_invoices'])
+        
+        for name in PIPELINE_QUERIES:
+            scheduler.add_stage(
+                f'query_{name}',
+                lambda r, name=name: self.run_analysis_query(name),
+                depends_on=['create_fact_table'],
+                checkpoint=False
+            )
+        
+        return scheduler
     
-    def run_full_pipeline(self) -> Dict[str, Any]:
-        """Run the complete data pipeline."""
-        logger.info("Starting full pipeline execution...")
+    def run_shard_worker(self, run_id: str, shard_count: int = None) -> List[int]:
+        """Load this worker's share of a sharded ingestion run, returning the shards it loaded.
         
+        Invoices are split into shards by a hash of invoice_id after first-seen-wins
+        deduplication across all files, so every shard agrees on which file supplies
+        an invoice and no two shards write the same invoice, whatever order they
+        are loaded in. Clients are split by a hash of client_id, so all records of a
+        client meet in one shard and keep the best-record merge. Every worker
+        therefore normalizes all input: once, or once per shard when streaming.
+        Facts are not built here, the coordinator builds them once every shard is done.
+        """
+        coordinator = ShardCoordinator(self.db_manager, run_id, shard_count)
+        shard_count = coordinator.shard_count
+        self.setup_database()
         try:
-            # 1. Setup database
-            self.setup_database()
+            coordinator.register()
+            files = self.find_data_files()
+            invoice_files = files.get('invoices', [])
+            clients = None
+            invoices = None
             
-            # 2. Find data files
-            data_files = self.find_data_files()
+            def load_shard(shard_id: int) -> Dict[str, int]:
+                nonlocal clients, invoices
+                if clients is None:
+                    client_files = files.get('clients', [])
+                    clients = self.client_processor.process_files(_file_patterns(client_files)) if client_files else pd.DataFrame()
+                
+                client_data = clients
+                if not client_data.empty:
+                    client_data = clients[key_shards(clients['client_id'], shard_count) == shard_id]
+                if not client_data.empty:
+                    self.store_clients(client_data)
+                
+                if self.streaming:
+                    invoice_rows = self.stream_invoices(invoice_files, shard=(shard_id, shard_count))['rows']
+                else:
+                    if invoices is None:
+                        invoices = self.invoice_processor.process_files(_file_patterns(invoice_files)) if invoice_files else pd.DataFrame()
+                    invoice_data = invoices
+                    if not invoice_data.empty:
+                        invoice_data = invoices[key_shards(invoices['invoice_id'], shard_count) == shard_id]
+                    if not invoice_data.empty:
+                        self.store_invoices(invoice_data)
+                        self.invoice_processor.update_sketch(invoice_data)
+                    invoice_rows = len(invoice_data)
+                self.store_data_quality()
+                self.store_ingestion_sketch(part=shard_id)
+                return {'files': len(invoice_files), 'client_rows': len(client_data),
+                        'invoice_rows': invoice_rows}
             
-            # 3. Process clients
-            client_data = self.process_clients(data_files.get('clients', []))
+            def profiled_load_shard(shard_id: int) -> Dict[str, int]:
+                with self._profiled(f"shard_{shard_id}"):
+                    return load_shard(shard_id)
             
-            # 4. Process invoices  
-            invoice_data = self.process_invoices(data_files.get('invoices', []))
-            
-            # 5. Create fact table
-            if not client_data.empty or not invoice_data.empty:
+            loaded = coordinator.run_worker(profiled_load_shard)
+            logger.info(f"Worker loaded {len(loaded)} of {shard_count} shards of run {run_id}")
+            return loaded
+        finally:
+            self.db_manager.metrics.log_summary()
+            if self.profiler:
+                self.profiler.log_summary()
+            self.db_manager.disconnect()
+    
+    def run_shard_coordinator(self, run_id: str, shard_count: int = None,
+                              poll_interval: float = None) -> Dict[str, Any]:
+        """Wait until every shard of a sharded ingestion run is done, then build facts and run the analysis queries."""
+        coordinator = ShardCoordinator(self.db_manager, run_id, shard_count)
+        self.setup_database()
+        try:
+            coordinator.register()
+            coordinator.wait_until_done(poll_interval)
+            with self._profiled('create_fact_table'):
+                self.resolve_client_names()
                 self.create_fact_table()
-            
-            # 6. Run analysis queries
-            analysis_results = self.run_analysis_queries()
+            with self._profiled('analysis_queries'):
+                return self.run_analysis_queries()
+        finally:
+            self.db_manager.metrics.log_summary()
+            if self.profiler:
+                self.profiler.log_summary()
+            self.db_manager.disconnect()
+    
+    def run_full_pipeline(self) -> Dict[str, Any]:
+        """Run the complete data pipeline."""
+        logger.info("Starting full pipeline execution...")
+        
+        scheduler = self.build_stage_graph()
+        try:
+            stage_results = scheduler.run()
             
             logger.info("Pipeline execution completed successfully!")
             
+            invoice_result = stage_results['process_invoices']
             return {
-                'client_count': len(client_data),
-                'invoice_count': len(invoice_data),
-                'analysis_results': analysis_results
+                'client_count': _row_count(stage_results['process_clients']),
+                'invoice_count': _row_count(invoice_result),
+                'invoice_load_stats': invoice_result if self.streaming else None,
+                'analysis_results': {
+                    name: stage_results[f'query_{name}'] for name in PIPELINE_QUERIES
+                },
+                'stage_summary': scheduler.stage_summary(),
+                'critical_path': scheduler.critical_path()
             }
             
         except Exception as e:
             logger.error(f"Pipeline failed: {e}")
             raise
         finally:
+            scheduler.log_summary()
+            # Metrics of a shared engine cover every pipeline on it; its owner logs them
+            if self.db_manager.owns_engine:
+                self.db_manager.metrics.log_summary()
+            if self.profiler:
+                self.profiler.log_summary()
             # Clean up database connection
             self.db_manager.disconnect()
 
-
 def main():
     """Main entry point for the pipeline."""
     import argparse
@@ -335,6 +952,56 @@ def main():
     parser = argparse.ArgumentParser(description='Reveel Data Pipeline')
     parser.add_argument('--data-dir', default='.', help='Directory containing data files')
     parser.add_argument('--log-level', default='INFO', help='Logging level')
+    parser.add_argument('--partitioned', action='store_true',
+                        help='Create invoices and invoice_facts range-partitioned by month')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and incrementally ingest new or changed files')
+    parser.add_argument('--poll-interval', type=float, default=None,
+                        help='Seconds between directory scans in --watch mode')
+    parser.add_argument('--status-file', default=None,
+                        help='JSON file updated with ingestion lag in --watch mode')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Overlap invoice normalization and database load in chunks')
+    parser.add_argument('--spill-dir', default=None,
+                        help='With --streaming, dedupe invoices out of core via spill files here')
+    parser.add_argument('--staging-dir', default=None,
+                        help='Directory for Parquet staging of normalized data')
+    parser.add_argument('--from-staging', action='store_true',
+                        help='Rehydrate normalized data from --staging-dir instead of raw files')
+    parser.add_argument('--set-rates', default=None,
+                        help='Rate change as TYPE=RATE[,TYPE=RATE...]; requires --effective-from')
+    parser.add_argument('--effective-from', default=None,
+                        help='YYYY-MM-DD date the --set-rates rates take effect')
+    parser.add_argument('--record-quality', action='store_true',
+                        help='Store per-file data quality summaries in the data_quality table')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip stages checkpointed by an earlier run whose inputs are unchanged')
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_CONFIG['dir'],
+                        help='Directory for per-stage checkpoints')
+    parser.add_argument('--shard-worker', action='store_true',
+                        help='Load unclaimed shards of the sharded run --run-id, without building facts')
+    parser.add_argument('--coordinate', action='store_true',
+                        help='Wait for all shards of --run-id, then build facts and run the queries')
+    parser.add_argument('--run-id', default=None,
+                        help='Identifier of the run for its stored ingestion sketch; '
+                             'shared by the workers and coordinator of a sharded run')
+    parser.add_argument('--shard-count', type=int, default=SHARD_CONFIG['shard_count'],
+                        help='Number of shards a sharded run is split into')
+    parser.add_argument('--profile', nargs='?', const='profiles', default=None, metavar='DIR',
+                        help='Profile each stage into .prof and .collapsed flamegraph files in DIR '
+                             '(default: profiles); stages then run one at a time')
+    parser.add_argument('--fx-rates', default=None,
+                        help='CSV of currency, rate_date, usd_rate for converting non-USD invoices')
+    parser.add_argument('--cents', action='store_true',
+                        help='Store amounts and costs as BIGINT integer cents instead of DECIMAL(10,2)')
+    parser.add_argument('--dataset', action='append', default=[], metavar='NAME=DIR',
+                        help='Dataset for a batch run into schema tenant_NAME; may be repeated')
+    parser.add_argument('--datasets', default=None, metavar='FILE',
+                        help='File of NAME=DIR batch datasets, one per line')
+    parser.add_argument('--batch-workers', type=int, default=None,
+                        help='Pipeline stages running at once across all datasets of a batch run')
+    parser.add_argument('--batch-datasets', type=int, default=None,
+                        help='Datasets of a batch run processed at once')
     
     args = parser.parse_args()
     
@@ -343,12 +1010,115 @@ def main():
     logger.add(lambda msg: print(msg, end=""), level=args.log_level)
     
     # Run pipeline
-    pipeline = RevealPipeline(data_dir=args.data_dir)
+    if args.from_staging and not args.staging_dir:
+        parser.error('--from-staging requires --staging-dir')
+    if args.spill_dir and not args.streaming:
+        parser.error('--spill-dir requires --streaming')
+    if args.set_rates and not args.effective_from:
+        parser.error('--set-rates requires --effective-from')
+    if args.shard_worker and args.coordinate:
+        parser.error('--shard-worker and --coordinate are separate processes')
+    if (args.shard_worker or args.coordinate) and not args.run_id:
+        parser.error('--shard-worker and --coordinate require --run-id')
+    if (args.shard_worker or args.coordinate) and (args.staging_dir or args.watch):
+        parser.error('sharded runs do not support --staging-dir or --watch')
+    if args.shard_count < 1:
+        parser.error('--shard-count must be at least 1')
+    
+    if args.dataset or args.datasets:
+        if args.watch or args.shard_worker or args.coordinate or args.set_rates:
+            parser.error('batch runs do not support --watch, sharding or --set-rates')
+        if args.staging_dir or args.profile:
+            parser.error('batch runs do not support --staging-dir or --profile')
+        from .batch import BatchRunner, parse_dataset, read_datasets_file
+        try:
+            datasets = [parse_dataset(spec) for spec in args.dataset]
+            if args.datasets:
+                datasets += read_datasets_file(args.datasets)
+            runner = BatchRunner(
+                datasets,
+                worker_budget=args.batch_workers,
+                max_datasets=args.batch_datasets,
+                checkpoint_dir=args.checkpoint_dir,
+                spill_dir=args.spill_dir,
+                partitioned=args.partitioned,
+                money_cents=args.cents,
+                streaming=args.streaming,
+                fx_rates_file=args.fx_rates,
+                record_quality=args.record_quality,
+                resume=args.resume,
+                run_id=args.run_id
+            )
+        except (OSError, ValueError) as e:
+            parser.error(f'invalid batch: {e}')
+        results = runner.run()
+        failed = [entry['dataset'] for entry in results if entry['status'] != 'DONE']
+        print(f"=== BATCH COMPLETE: {len(results) - len(failed)}/{len(results)} datasets loaded ===")
+        if failed:
+            print(f"Failed datasets: {', '.join(failed)}")
+            raise SystemExit(1)
+        return
+    
+    pipeline = RevealPipeline(
+        data_dir=args.data_dir,
+        staging_dir=args.staging_dir,
+        from_staging=args.from_staging,
+        partitioned=args.partitioned,
+        money_cents=args.cents,
+        streaming=args.streaming,
+        fx_rates_file=args.fx_rates,
+        spill_dir=args.spill_dir,
+        record_quality=args.record_quality,
+        checkpoint_dir=args.checkpoint_dir,
+        resume=args.resume,
+        run_id=args.run_id,
+        profile_dir=args.profile
+    )
+    
+    if args.set_rates:
+        try:
+            rates = _parse_rates(args.set_rates)
+            effective_from = date.fromisoformat(args.effective_from)
+        except ValueError as e:
+            parser.error(f'invalid rate change: {e}')
+        pipeline.setup_database()
+        try:
+            pipeline.apply_rate_change(rates, effective_from)
+        finally:
+            pipeline.db_manager.disconnect()
+        return
+    
+    if args.shard_worker:
+        loaded = pipeline.run_shard_worker(args.run_id, args.shard_count)
+        print(f"Loaded shards {loaded} of run {args.run_id}")
+        return
+    
+    if args.coordinate:
+        pipeline.run_shard_coordinator(args.run_id, args.shard_count)
+        print(f"=== SHARDED RUN {args.run_id} COMPLETE ===")
+        print("Analysis queries completed - check database for detailed results")
+        return
+    
+    if args.watch:
+        pipeline.setup_database()
+        watcher = IngestionWatcher(pipeline, poll_interval=args.poll_interval,
+                                   status_file=args.status_file)
+        try:
+            watcher.run_forever()
+        finally:
+            pipeline.db_manager.disconnect()
+        return
+    
     results = pipeline.run_full_pipeline()
     
     print("\\n=== PIPELINE RESULTS ===")
     print(f"Processed {results['client_count']} clients")
     print(f"Processed {results['invoice_count']} invoices")
+    if results['invoice_load_stats']:
+        stats = results['invoice_load_stats']
+        print(f"Invoice normalize/load overlap: {stats['overlap_efficiency']:.0%} "
+              f"({stats['chunks']} chunks, normalize {stats['normalize_seconds']:.2f}s, "
+              f"load {stats['load_seconds']:.2f}s, wall {stats['wall_seconds']:.2f}s)")
     print("\\nAnalysis queries completed - check database for detailed results")
 
 
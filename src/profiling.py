@@ -0,0 +1,130 @@
+"""
+Opt-in profiling of pipeline and report stages.
+Writes a cProfile stats file and collapsed-stack flamegraph input for each profiled stage.
+"""
+import os
+import re
+import sys
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, List
+from loguru import logger
+
+from .config import PROFILE_CONFIG
+
+
+def _frame_label(frame) -> str:
+    """Flamegraph label of a frame: module and qualified function name."""
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Samples Python stacks at a fixed interval into collapsed-stack counts.
+
+    Samples the profiled thread and any thread started while sampling, such as
+    the streaming normalizer or upsert loaders, each stack rooted at its thread
+    name. Threads that already existed, e.g. idle pool workers, are left out.
+    """
+
+    def __init__(self, thread_id: int, interval: float = None):
+        """Initialize sampler of thread_id and the threads it starts."""
+        self.thread_id = thread_id
+        self.interval = interval or PROFILE_CONFIG['sample_interval']
+        self.counts = Counter()
+        self.samples = 0
+        self._ignored = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        """Start sampling in a background thread."""
+        self._ignored = set(sys._current_frames()) - {self.thread_id}
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        """Record one stack per sampled thread every interval."""
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or thread_id in self._ignored:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path: str) -> None:
+        """Write counts in collapsed-stack format (flamegraph.pl, speedscope, inferno)."""
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class StageProfiler:
+    """Profiles named stages into <name>.prof (pstats) and <name>.collapsed files.
+
+    cProfile is deterministic but only sees the stage's own thread; the
+    collapsed stacks come from sampling, which also covers threads the stage
+    starts. Python allows one active cProfile at a time, so profiled stages
+    must not overlap.
+    """
+
+    def __init__(self, output_dir: str, sample_interval: float = None):
+        """Initialize profiler writing to output_dir."""
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.profiles: List[Dict[str, Any]] = []
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    @contextmanager
+    def profile(self, name: str):
+        """Profile the enclosed block as stage name."""
+        base = os.path.join(self.output_dir, re.sub(r'[^\w.-]+', '_', name))
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        sampler.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            sampler.stop()
+            profiler.dump_stats(f"{base}.prof")
+            sampler.write(f"{base}.collapsed")
+
+            stats = pstats.Stats(profiler)
+            hottest = max(stats.stats.items(), key=lambda item: item[1][2], default=None)
+            self.profiles.append({
+                'stage': name,
+                'profile': f"{base}.prof",
+                'collapsed': f"{base}.collapsed",
+                'samples': sampler.samples,
+                'total_seconds': stats.total_tt,
+                'hottest': pstats.func_std_string(hottest[0]) if hottest else None,
+                'hottest_seconds': hottest[1][2] if hottest else 0.0
+            })
+
+    def log_summary(self) -> None:
+        """Log where each profiled stage spent the most time."""
+        if not self.profiles:
+            return
+        logger.info(f"=== PROFILES ({self.output_dir}) ===")
+        for entry in self.profiles:
+            logger.info(f"{entry['stage']:<36} {entry['total_seconds']:>8.2f}s profiled, "
+                        f"{entry['samples']} samples; most self time in {entry['hottest']} "
+                        f"({entry['hottest_seconds']:.2f}s)")
@@ -0,0 +1,82 @@
+"""
+Data-quality accounting for normalization.
+Counts bad values per file, column and reason instead of logging each one.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import pandas as pd
+from loguru import logger
+
+from .config import QUALITY_CONFIG
+
+
+class DataQualityTracker:
+    """Accumulates normalization failures and reports them once per source file."""
+
+    def __init__(self, sample_size: int = None):
+        """Initialize tracker keeping up to sample_size offending values per column and reason."""
+        self.sample_size = QUALITY_CONFIG['sample_size'] if sample_size is None else sample_size
+        self.current_file: Optional[str] = None
+        # (column, reason) -> [failure count, sample values] for the current file
+        self.pending: Dict[Tuple[str, str], List[Any]] = {}
+        # Files finished, and their summary rows, not yet collected
+        self.files: List[str] = []
+        self.rows: List[Dict[str, Any]] = []
+
+    def start_file(self, path: str) -> None:
+        """Attribute subsequent failures to a source file."""
+        if self.current_file is not None:
+            self.finish_file()
+        self.current_file = path
+
+    def record(self, column: str, reason: str, values: pd.Series) -> None:
+        """Count the offending values of a column, sampling a few distinct ones."""
+        if values.empty:
+            return
+
+        entry = self.pending.setdefault((column, reason), [0, []])
+        entry[0] += len(values)
+        for value in values.drop_duplicates().head(self.sample_size).astype(str):
+            if len(entry[1]) >= self.sample_size:
+                break
+            if value not in entry[1]:
+                entry[1].append(value)
+
+    def finish_file(self) -> List[Dict[str, Any]]:
+        """Close the current file, log one summary for it and return its rows."""
+        if self.current_file is None and not self.pending:
+            return []
+
+        source_file = self.current_file or 'unknown'
+        rows = [
+            {
+                'source_file': source_file,
+                'column_name': column,
+                'reason': reason,
+                'failures': count,
+                'sample_values': ', '.join(samples)
+            }
+            for (column, reason), (count, samples) in sorted(self.pending.items())
+        ]
+
+        if rows:
+            details = '; '.join(
+                f"{row['column_name']} {row['reason']} x{row['failures']} (e.g. {row['sample_values']})"
+                for row in rows
+            )
+            logger.warning(f"Data quality issues in {source_file}: {details}")
+        else:
+            logger.info(f"No data quality issues in {source_file}")
+
+        self.files.append(source_file)
+        self.rows.extend(rows)
+        self.pending = {}
+        self.current_file = None
+        return rows
+
+    def collect(self) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Take the files finished since the last call and their summary rows."""
+        if self.current_file is not None:
+            self.finish_file()
+        files, rows = self.files, self.rows
+        self.files, self.rows = [], []
+        return files, rows
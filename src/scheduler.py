@@ -0,0 +1,270 @@
+"""
+Dependency-graph stage scheduler for the Reveel data pipeline.
+Runs independent stages concurrently and records per-stage status and timing.
+"""
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Any, List, Optional, Union
+from loguru import logger
+
+from .checkpoints import CheckpointStore
+
+
+class Stage:
+    """A named unit of pipeline work with upstream dependencies."""
+
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    SKIPPED = 'SKIPPED'
+    RESUMED = 'RESUMED'
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any]], Any],
+                 depends_on: List[str] = None,
+                 fingerprint: Callable[[Dict[str, Any]], Any] = None,
+                 checkpoint: Union[bool, Callable[[Any], Any]] = True):
+        """Initialize a stage; func receives the results of completed stages by name.
+
+        fingerprint describes the stage's own inputs (file stats, options) from the
+        results of its dependencies. checkpoint is False for stages that must always
+        run, or a function reducing the output to what is worth saving.
+        """
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on or [])
+        self.fingerprint = fingerprint
+        self.checkpoint = checkpoint
+        self.input_key = None
+        self.status = Stage.PENDING
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        """Wall-clock seconds the stage ran for."""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+class StageScheduler:
+    """Runs stages in dependency order, overlapping stages whose dependencies are met."""
+
+    def __init__(self, max_workers: int = 4, checkpoints: CheckpointStore = None,
+                 resume: bool = False, profiler=None,
+                 slots: threading.BoundedSemaphore = None):
+        """Initialize scheduler with a worker thread budget.
+
+        With checkpoints, every completed stage is checkpointed; with resume, stages
+        whose checkpoint matches their current input fingerprint are not rerun.
+        With a StageProfiler, each stage runs under it, one stage at a time.
+        slots is a semaphore shared with other schedulers, e.g. those of a batch
+        run, bounding how many stages run at once across all of them.
+        """
+        # Profilers cannot overlap, and serial stages keep their profiles separable
+        self.max_workers = 1 if profiler else max_workers
+        self.checkpoints = checkpoints
+        self.resume = resume
+        self.profiler = profiler
+        self.slots = slots
+        self.stages: Dict[str, Stage] = {}
+        self.results: Dict[str, Any] = {}
+        self.started_at = None
+
+    def add_stage(self, name: str, func: Callable[[Dict[str, Any]], Any],
+                  depends_on: List[str] = None,
+                  fingerprint: Callable[[Dict[str, Any]], Any] = None,
+                  checkpoint: Union[bool, Callable[[Any], Any]] = True) -> Stage:
+        """Register a stage."""
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage name: {name}")
+        stage = Stage(name, func, depends_on, fingerprint, checkpoint)
+        self.stages[name] = stage
+        return stage
+
+    def _validate(self) -> None:
+        """Reject unknown dependencies and cycles before running anything."""
+        for stage in self.stages.values():
+            missing = [dep for dep in stage.depends_on if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {missing}")
+
+        visited, in_progress = set(), set()
+
+        def visit(name: str) -> None:
+            if name in in_progress:
+                raise ValueError(f"Dependency cycle detected at stage {name}")
+            if name in visited:
+                return
+            in_progress.add(name)
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            in_progress.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def _ready_stages(self) -> List[Stage]:
+        """Pending stages whose dependencies have all completed."""
+        return [
+            stage for stage in self.stages.values()
+            if stage.status == Stage.PENDING
+            and all(self.stages[dep].status in (Stage.DONE, Stage.RESUMED) for dep in stage.depends_on)
+        ]
+
+    def _input_key(self, stage: Stage) -> str:
+        """Fingerprint a stage's inputs, chained through its dependencies' fingerprints.
+
+        A stage whose upstream inputs changed therefore never matches its old checkpoint.
+        """
+        digest = hashlib.sha256(stage.name.encode('utf-8'))
+        if stage.fingerprint:
+            digest.update(repr(stage.fingerprint(self.results)).encode('utf-8'))
+        for dep in sorted(stage.depends_on):
+            digest.update(self.stages[dep].input_key.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _resume_stage(self, stage: Stage) -> bool:
+        """Restore a stage's output from a matching checkpoint instead of running it."""
+        if not (self.resume and self.checkpoints and stage.checkpoint):
+            return False
+
+        found, output = self.checkpoints.load(stage.name, stage.input_key)
+        if not found:
+            return False
+
+        self.results[stage.name] = output
+        stage.status = Stage.RESUMED
+        stage.started_at = stage.finished_at = time.perf_counter()
+        logger.info(f"Stage {stage.name} resumed from checkpoint")
+        return True
+
+    def _skip_dependents(self, failed: str) -> None:
+        """Mark every pending stage downstream of a failed stage as skipped."""
+        for stage in self.stages.values():
+            if stage.status == Stage.PENDING and failed in stage.depends_on:
+                stage.status = Stage.SKIPPED
+                logger.warning(f"Stage {stage.name} skipped: upstream stage {failed} failed")
+                self._skip_dependents(stage.name)
+
+    def _run_stage(self, stage: Stage) -> Any:
+        """Execute a single stage, recording its timing."""
+        # Time spent waiting for a shared slot is not part of the stage's duration
+        if self.slots:
+            self.slots.acquire()
+        stage.started_at = time.perf_counter()
+        try:
+            if self.profiler:
+                with self.profiler.profile(stage.name):
+                    result = stage.func(self.results)
+            else:
+                result = stage.func(self.results)
+        finally:
+            stage.finished_at = time.perf_counter()
+            if self.slots:
+                self.slots.release()
+
+        if self.checkpoints and stage.checkpoint:
+            output = stage.checkpoint(result) if callable(stage.checkpoint) else result
+            self.checkpoints.save(stage.name, stage.input_key, output)
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        """Run all stages and return their results by name.
+
+        Raises the first stage error once in-flight stages have drained.
+        """
+        self._validate()
+        self.started_at = time.perf_counter()
+        first_error = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while True:
+                if first_error is None:
+                    # Resumed stages can unblock further stages immediately
+                    ready = self._ready_stages()
+                    while ready:
+                        for stage in ready:
+                            stage.input_key = self._input_key(stage)
+                            if self._resume_stage(stage):
+                                continue
+                            stage.status = Stage.RUNNING
+                            logger.info(f"Stage {stage.name} started")
+                            running[executor.submit(self._run_stage, stage)] = stage
+                        ready = self._ready_stages()
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        self.results[stage.name] = future.result()
+                        stage.status = Stage.DONE
+                        logger.info(f"Stage {stage.name} completed in {stage.duration:.2f}s")
+                    except Exception as e:
+                        stage.status = Stage.FAILED
+                        stage.error = e
+                        logger.error(f"Stage {stage.name} failed after {stage.duration:.2f}s: {e}")
+                        self._skip_dependents(stage.name)
+                        first_error = first_error or e
+
+        for stage in self.stages.values():
+            if stage.status == Stage.PENDING:
+                stage.status = Stage.SKIPPED
+
+        if first_error is not None:
+            raise first_error
+        return self.results
+
+    def critical_path(self) -> List[str]:
+        """Stages on the chain that determined the run's end time.
+
+        Walks back from the last stage to finish, following at each step the
+        dependency that finished latest.
+        """
+        finished = [s for s in self.stages.values() if s.finished_at is not None]
+        if not finished:
+            return []
+
+        path = []
+        stage: Optional[Stage] = max(finished, key=lambda s: s.finished_at)
+        while stage is not None:
+            path.append(stage.name)
+            deps = [self.stages[d] for d in stage.depends_on if self.stages[d].finished_at is not None]
+            stage = max(deps, key=lambda s: s.finished_at) if deps else None
+
+        return list(reversed(path))
+
+    def stage_summary(self) -> List[Dict[str, Any]]:
+        """Per-stage status and timing relative to the start of the run."""
+        summary = []
+        for stage in self.stages.values():
+            summary.append({
+                'stage': stage.name,
+                'status': stage.status,
+                'depends_on': stage.depends_on,
+                'start_offset': (stage.started_at - self.started_at) if stage.started_at else None,
+                'duration': stage.duration,
+                'error': str(stage.error) if stage.error else None
+            })
+        return summary
+
+    def log_summary(self) -> None:
+        """Log per-stage status and the critical path of the run."""
+        logger.info("=== STAGE SUMMARY ===")
+        for entry in self.stage_summary():
+            offset = f"+{entry['start_offset']:.2f}s" if entry['start_offset'] is not None else "-"
+            logger.info(f"{entry['stage']:<36} {entry['status']:<8} start {offset:>9}  "
+                        f"took {entry['duration']:.2f}s")
+
+        path = self.critical_path()
+        total = sum(self.stages[name].duration for name in path)
+        logger.info(f"Critical path ({total:.2f}s): {' -> '.join(path)}")
@@ -0,0 +1,153 @@
+"""
+Sharded ingestion for running the Reveel data pipeline on several workers.
+Splits the input into shards that workers claim with Postgres advisory locks, and tracks
+shard progress in ingest_shards so a coordinator knows when to build the facts.
+"""
+import os
+import time
+import socket
+from typing import Callable, Dict, List
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from loguru import logger
+
+from .config import SHARD_CONFIG
+
+
+def key_shards(keys: pd.Series, shard_count: int) -> np.ndarray:
+    """Shard of each key, by a hash that is stable across processes and hosts."""
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy() % shard_count
+
+
+class ShardCoordinator:
+    """Claims and tracks the shards of one sharded ingestion run.
+
+    Shard rows live in ingest_shards. A worker claims a shard with a session-level
+    advisory lock on (run, shard), held on a dedicated connection while it loads
+    the shard, so two workers never load the same shard. A worker that dies loses
+    its lock with its connection and the shard can be claimed by the next worker;
+    shards already DONE are never loaded again.
+    """
+
+    def __init__(self, db_manager, run_id: str, shard_count: int = None):
+        """Initialize coordination of run_id split into shard_count shards."""
+        self.db_manager = db_manager
+        self.run_id = run_id
+        self.shard_count = shard_count or SHARD_CONFIG['shard_count']
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    def register(self) -> None:
+        """Create the run's shard rows, unless another process already has."""
+        params = {'run_id': self.run_id, 'shard_count': self.shard_count}
+        existing = self.db_manager.execute_sql(
+            "SELECT DISTINCT shard_count FROM ingest_shards WHERE run_id = :run_id", params
+        ).scalars().all()
+        if existing and existing != [self.shard_count]:
+            raise ValueError(f"Run {self.run_id} was started with {existing[0]} shards, "
+                             f"not {self.shard_count}")
+
+        self.db_manager.execute_sql('''
+        INSERT INTO ingest_shards (run_id, shard_id, shard_count)
+        SELECT :run_id, shard_id, :shard_count
+        FROM generate_series(0, :shard_count - 1) AS shard_id
+        ON CONFLICT (run_id, shard_id) DO NOTHING
+        ''', params)
+
+    def run_worker(self, load_shard: Callable[[int], Dict[str, int]]) -> List[int]:
+        """Claim and load every shard that is neither done nor held by another worker.
+
+        load_shard loads one shard and returns its files, client_rows and
+        invoice_rows counts. A shard whose load raises is marked FAILED and the
+        error is re-raised; it is retried by the next worker to run. Returns the
+        shards this worker loaded.
+        """
+        loaded = []
+        for shard_id in range(self.shard_count):
+            params = {'run_id': self.run_id, 'shard_id': shard_id, 'worker': self.worker}
+            with self.db_manager.get_connection() as lock_conn:
+                locked = lock_conn.execute(text(
+                    "SELECT pg_try_advisory_lock(hashtext(:run_id), :shard_id)"
+                ), params).scalar()
+                lock_conn.commit()
+                if not locked:
+                    continue
+
+                try:
+                    status = lock_conn.execute(text(
+                        "SELECT status FROM ingest_shards WHERE run_id = :run_id AND shard_id = :shard_id"
+                    ), params).scalar()
+                    if status == 'DONE':
+                        lock_conn.commit()
+                        continue
+
+                    lock_conn.execute(text('''
+                    UPDATE ingest_shards
+                    SET status = 'RUNNING', worker = :worker, error = NULL,
+                        started_at = CURRENT_TIMESTAMP, finished_at = NULL
+                    WHERE run_id = :run_id AND shard_id = :shard_id
+                    '''), params)
+                    lock_conn.commit()
+                    logger.info(f"Claimed shard {shard_id + 1}/{self.shard_count} of run {self.run_id}")
+
+                    try:
+                        stats = load_shard(shard_id)
+                    except Exception as e:
+                        lock_conn.rollback()
+                        lock_conn.execute(text('''
+                        UPDATE ingest_shards
+                        SET status = 'FAILED', error = :error, finished_at = CURRENT_TIMESTAMP
+                        WHERE run_id = :run_id AND shard_id = :shard_id
+                        '''), {**params, 'error': str(e)})
+                        lock_conn.commit()
+                        logger.error(f"Shard {shard_id + 1}/{self.shard_count} of run {self.run_id} failed: {e}")
+                        raise
+
+                    lock_conn.execute(text('''
+                    UPDATE ingest_shards
+                    SET status = 'DONE', files = :files, client_rows = :client_rows,
+                        invoice_rows = :invoice_rows, finished_at = CURRENT_TIMESTAMP
+                    WHERE run_id = :run_id AND shard_id = :shard_id
+                    '''), {**params, **stats})
+                    lock_conn.commit()
+                    loaded.append(shard_id)
+                    logger.info(f"Loaded shard {shard_id + 1}/{self.shard_count} of run {self.run_id}: "
+                                f"{stats['files']} files, {stats['client_rows']} clients, "
+                                f"{stats['invoice_rows']} invoices")
+                finally:
+                    lock_conn.execute(text(
+                        "SELECT pg_advisory_unlock(hashtext(:run_id), :shard_id)"
+                    ), params)
+                    lock_conn.commit()
+
+        return loaded
+
+    def progress(self) -> Dict[str, int]:
+        """Number of the run's shards in each status."""
+        rows = self.db_manager.execute_sql(
+            "SELECT status, COUNT(*) FROM ingest_shards WHERE run_id = :run_id GROUP BY status",
+            {'run_id': self.run_id}, name='shard_progress'
+        ).fetchall()
+        return {status: count for status, count in rows}
+
+    def wait_until_done(self, poll_interval: float = None, timeout: float = None) -> None:
+        """Block until every shard of the run is DONE, raising TimeoutError after timeout seconds."""
+        poll_interval = poll_interval or SHARD_CONFIG['poll_interval']
+        timeout = SHARD_CONFIG['wait_timeout'] if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        last_progress = None
+        while True:
+            progress = self.progress()
+            if progress.get('DONE', 0) >= self.shard_count:
+                logger.info(f"All {self.shard_count} shards of run {self.run_id} are done")
+                return
+
+            if progress != last_progress:
+                summary = ', '.join(f"{count} {status}" for status, count in sorted(progress.items()))
+                logger.info(f"Waiting for shards of run {self.run_id}: {summary}")
+                last_progress = progress
+
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Shards of run {self.run_id} not done after {timeout:g}s: {progress}")
+            time.sleep(poll_interval)
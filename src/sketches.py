@@ -0,0 +1,335 @@
+"""
+Mergeable streaming sketches of ingested invoices.
+Approximate distinct counts, top clients and amount quantiles that are updated chunk by
+chunk during ingestion and can be merged across files, shards and runs.
+"""
+import base64
+from typing import Dict, Any, List, Tuple
+import numpy as np
+import pandas as pd
+
+from .config import RATE_SHEET, SKETCH_CONFIG
+
+
+def _stable_hashes(values: pd.Series) -> np.ndarray:
+    """64-bit hashes of values as strings, identical across processes and hosts."""
+    return pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy()
+
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Number of significant bits of each unsigned 64-bit integer."""
+    x = x.copy()
+    length = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= np.uint64(1 << shift)
+        length[big] += shift
+        x[big] >>= np.uint64(shift)
+    return length + (x > 0)
+
+
+class HyperLogLog:
+    """Distinct count estimate in 2^precision one-byte registers (~1.04/sqrt(2^precision) error)."""
+
+    def __init__(self, precision: int = None):
+        """Initialize an empty sketch."""
+        self.precision = precision or SKETCH_CONFIG['hll_precision']
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    def add(self, values: pd.Series) -> None:
+        """Add the non-null values of a column."""
+        values = values.dropna()
+        if values.empty:
+            return
+
+        hashes = _stable_hashes(values)
+        suffix_bits = 64 - self.precision
+        index = (hashes >> np.uint64(suffix_bits)).astype(np.intp)
+        suffix = hashes & np.uint64((1 << suffix_bits) - 1)
+        # Position of the leftmost 1-bit in the hash suffix
+        rank = (suffix_bits - _bit_length(suffix) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        """Fold in a sketch of the same precision."""
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        """Approximate number of distinct values added."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Small cardinalities: linear counting over empty registers is more accurate
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable form of the sketch."""
+        return {'precision': self.precision,
+                'registers': base64.b64encode(self.registers.tobytes()).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HyperLogLog':
+        """Rebuild a sketch from to_dict output."""
+        sketch = cls(data['precision'])
+        sketch.registers = np.frombuffer(base64.b64decode(data['registers']), dtype=np.uint8).copy()
+        return sketch
+
+
+class TopK:
+    """Weighted heavy hitters (Space-Saving) keeping at most capacity keys.
+
+    Counts never underestimate; each key's error is the most its count may be
+    overestimated by, from weight that belonged to keys evicted earlier.
+    """
+
+    def __init__(self, capacity: int = None):
+        """Initialize an empty summary."""
+        self.capacity = capacity or SKETCH_CONFIG['top_k']
+        self.counts: Dict[str, float] = {}
+        self.errors: Dict[str, float] = {}
+
+    def _floor(self) -> float:
+        """Most weight an untracked key may have had: the smallest count once full."""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0.0
+
+    def _combine(self, counts: Dict[str, float], errors: Dict[str, float], other_floor: float) -> None:
+        """Add another summary's counts, then keep the capacity heaviest keys."""
+        floor = self._floor()
+        combined = {}
+        for key in set(self.counts) | set(counts):
+            combined[key] = (self.counts.get(key, floor) + counts.get(key, other_floor),
+                             self.errors.get(key, floor) + errors.get(key, other_floor))
+        heaviest = sorted(combined.items(), key=lambda item: -item[1][0])[:self.capacity]
+        self.counts = {key: count for key, (count, _) in heaviest}
+        self.errors = {key: error for key, (_, error) in heaviest}
+
+    def add(self, keys: pd.Series, weights: pd.Series) -> None:
+        """Add weights per key; a chunk is pre-aggregated so its totals are exact."""
+        totals = weights.groupby(keys, sort=False).sum()
+        self._combine({str(key): float(total) for key, total in totals.items()}, {}, 0.0)
+
+    def merge(self, other: 'TopK') -> None:
+        """Fold in another summary."""
+        self._combine(other.counts, other.errors, other._floor())
+
+    def top(self, n: int) -> List[Tuple[str, float, float]]:
+        """The n heaviest keys as (key, estimated weight, max overestimate)."""
+        heaviest = sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+        return [(key, count, self.errors.get(key, 0.0)) for key, count in heaviest]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable form of the summary."""
+        return {'capacity': self.capacity, 'counts': self.counts, 'errors': self.errors}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TopK':
+        """Rebuild a summary from to_dict output."""
+        sketch = cls(data['capacity'])
+        sketch.counts = dict(data['counts'])
+        sketch.errors = dict(data['errors'])
+        return sketch
+
+
+class TDigest:
+    """Quantile sketch of weighted centroids, finer near the tails (merging t-digest, k1 scale)."""
+
+    def __init__(self, compression: float = None):
+        """Initialize an empty digest."""
+        self.compression = compression or SKETCH_CONFIG['tdigest_compression']
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _k(self, q: np.ndarray) -> np.ndarray:
+        """k1 scale function: centroid size limits are units of k."""
+        return self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1.0, 1.0))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        """Merge sorted centroids that lie within the same unit of the k1 scale function.
+
+        A merged centroid spans at most one unit, k(q_right) - k(q_left) <= 1, which
+        keeps tail centroids small; one that straddles a unit boundary stays on its own.
+        """
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        right = np.cumsum(weights) / weights.sum()
+        left = right - weights / weights.sum()
+        unit = np.floor(self._k(left))
+        # NaN never equals a neighbour, so straddling centroids start groups of their own
+        group = np.where(np.ceil(self._k(right)) - unit <= 1, unit, np.nan)
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def add(self, values: pd.Series) -> None:
+        """Add the non-null values of a column."""
+        values = values.dropna().to_numpy(dtype=float)
+        if not len(values):
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other: 'TDigest') -> None:
+        """Fold in another digest."""
+        if not len(other.means):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+
+    def quantile(self, q: float) -> float:
+        """Approximate value at quantile q (0-1), interpolated between centroids."""
+        if not len(self.means):
+            return float('nan')
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * total,
+                               np.r_[0.0, centers, total],
+                               np.r_[self.min, self.means, self.max]))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable form of the digest."""
+        return {'compression': self.compression, 'means': self.means.tolist(),
+                'weights': self.weights.tolist(),
+                'min': self.min if len(self.means) else None,
+                'max': self.max if len(self.means) else None}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TDigest':
+        """Rebuild a digest from to_dict output."""
+        sketch = cls(data['compression'])
+        sketch.means = np.asarray(data['means'], dtype=float)
+        sketch.weights = np.asarray(data['weights'], dtype=float)
+        if len(sketch.means):
+            sketch.min, sketch.max = data['min'], data['max']
+        return sketch
+
+
+class InvoiceSketch:
+    """Summary of ingested invoices: exact totals plus distinct, top-client and quantile sketches.
+
+    Costs use the configured RATE_SHEET rates on unconverted amounts, so they
+    approximate the fact build, which applies date-effective rates and FX.
+    Clients are keyed by client_id, or client_name for name-only invoices.
+    Totals add up every merged sketch, so merge sketches of disjoint data
+    (files, shards, incremental runs); distinct counts are exact to merge.
+    """
+
+    def __init__(self):
+        """Initialize an empty sketch."""
+        self.rows = 0
+        self.total_amount = 0.0
+        self.total_cost = 0.0
+        self.min_date = None
+        self.max_date = None
+        # shipment_type -> [count, amount, cost]
+        self.shipments: Dict[str, List[float]] = {}
+        self.invoices = HyperLogLog()
+        self.clients = HyperLogLog()
+        self.top_clients = TopK()
+        self.amounts = TDigest()
+
+    def update(self, df: pd.DataFrame) -> None:
+        """Add a chunk of normalized invoices."""
+        if df.empty:
+            return
+
+        amount = df['amount'].astype(float)
+        cost = amount * df['shipment_type'].map(RATE_SHEET)
+        client = df['client_id'].fillna(df['client_name'])
+
+        self.rows += len(df)
+        self.total_amount += float(amount.sum())
+        self.total_cost += float(cost.sum())
+        dates = df['invoice_date'].dropna()
+        if not dates.empty:
+            self.min_date = min(filter(None, [self.min_date, dates.min()]))
+            self.max_date = max(filter(None, [self.max_date, dates.max()]))
+
+        by_type = pd.DataFrame({'shipment_type': df['shipment_type'], 'amount': amount, 'cost': cost}) \
+            .groupby('shipment_type').agg(count=('amount', 'size'), amount=('amount', 'sum'), cost=('cost', 'sum'))
+        for shipment_type, row in by_type.iterrows():
+            totals = self.shipments.setdefault(shipment_type, [0, 0.0, 0.0])
+            totals[0] += int(row['count'])
+            totals[1] += float(row['amount'])
+            totals[2] += float(row['cost'])
+
+        self.invoices.add(df['invoice_id'])
+        self.clients.add(client)
+        self.top_clients.add(client[client.notna()], cost[client.notna()].fillna(0.0))
+        self.amounts.add(amount)
+
+    def merge(self, other: 'InvoiceSketch') -> None:
+        """Fold in another invoice sketch."""
+        self.rows += other.rows
+        self.total_amount += other.total_amount
+        self.total_cost += other.total_cost
+        self.min_date = min(filter(None, [self.min_date, other.min_date]), default=None)
+        self.max_date = max(filter(None, [self.max_date, other.max_date]), default=None)
+        for shipment_type, (count, amount, cost) in other.shipments.items():
+            totals = self.shipments.setdefault(shipment_type, [0, 0.0, 0.0])
+            totals[0] += count
+            totals[1] += amount
+            totals[2] += cost
+        self.invoices.merge(other.invoices)
+        self.clients.merge(other.clients)
+        self.top_clients.merge(other.top_clients)
+        self.amounts.merge(other.amounts)
+
+    def summary(self, top_n: int = 5) -> Dict[str, Any]:
+        """Approximate summary statistics, shipment breakdown and top clients by cost."""
+        return {
+            'rows': self.rows,
+            'approx_unique_invoices': self.invoices.estimate(),
+            'approx_unique_clients': self.clients.estimate(),
+            'total_amount': round(self.total_amount, 2),
+            'total_cost': round(self.total_cost, 2),
+            'average_cost': round(self.total_cost / self.rows, 2) if self.rows else 0.0,
+            'date_range': (self.min_date, self.max_date),
+            'amount_quantiles': {f"p{int(q * 100)}": round(self.amounts.quantile(q), 2)
+                                 for q in (0.5, 0.9, 0.99)},
+            'shipment_breakdown': sorted(
+                [(shipment_type, count, round(cost, 2))
+                 for shipment_type, (count, amount, cost) in self.shipments.items()],
+                key=lambda row: -row[2]
+            ),
+            'top_clients': [(client, round(cost, 2), round(error, 2))
+                            for client, cost, error in self.top_clients.top(top_n)]
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable form of the sketch, stored as JSON."""
+        return {
+            'rows': self.rows,
+            'total_amount': self.total_amount,
+            'total_cost': self.total_cost,
+            'min_date': self.min_date,
+            'max_date': self.max_date,
+            'shipments': self.shipments,
+            'invoices': self.invoices.to_dict(),
+            'clients': self.clients.to_dict(),
+            'top_clients': self.top_clients.to_dict(),
+            'amounts': self.amounts.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'InvoiceSketch':
+        """Rebuild a sketch from to_dict output."""
+        sketch = cls()
+        sketch.rows = data['rows']
+        sketch.total_amount = data['total_amount']
+        sketch.total_cost = data['total_cost']
+        sketch.min_date = data['min_date']
+        sketch.max_date = data['max_date']
+        sketch.shipments = {key: list(value) for key, value in data['shipments'].items()}
+        sketch.invoices = HyperLogLog.from_dict(data['invoices'])
+        sketch.clients = HyperLogLog.from_dict(data['clients'])
+        sketch.top_clients = TopK.from_dict(data['top_clients'])
+        sketch.amounts = TDigest.from_dict(data['amounts'])
+        return sketch
@@ -0,0 +1,162 @@
+"""
+Parquet staging layer for normalized client, invoice and fact data.
+Lets reruns and backfills rehydrate from columnar files instead of raw CSV/PDF inputs.
+"""
+import os
+import shutil
+from typing import List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from loguru import logger
+
+from .config import STAGING_CONFIG
+
+
+class ParquetStaging:
+    """Reads and writes normalized pipeline outputs as Parquet datasets."""
+
+    def __init__(self, staging_dir: str, config: dict = None):
+        """Initialize staging layer rooted at staging_dir."""
+        self.staging_dir = staging_dir
+        self.config = config or STAGING_CONFIG
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        """Get the path of a staged dataset."""
+        return os.path.join(self.staging_dir, name)
+
+    def _write_options(self):
+        """Parquet writer options with row-group statistics enabled."""
+        return ds.ParquetFileFormat().make_write_options(
+            compression=self.config['compression'],
+            write_statistics=True
+        )
+
+    def _write_partitioned(self, df: pd.DataFrame, name: str, date_column: str,
+                           part: int = None, key: str = 'invoice_id') -> None:
+        """Write a DataFrame as a Hive-partitioned dataset keyed by invoice month.
+
+        Only the months present in df are replaced, so a backfill of a few months
+        leaves the rest of the staged history untouched; rows of df's keys staged under
+        other months (e.g. before a date correction) are removed first. With part, df is
+        added alongside existing files instead, for datasets written chunk by chunk.
+        """
+        if df.empty:
+            logger.warning(f"Empty DataFrame provided for staged {name}")
+            return
+
+        months = pd.to_datetime(df[date_column], errors='coerce').dt.strftime('%Y-%m').fillna('unknown')
+        if part is None:
+            self._remove_keys(name, key, df[key], exclude_months=months.unique().tolist())
+        table = pa.Table.from_pandas(df.assign(invoice_month=months), preserve_index=False)
+
+        ds.write_dataset(
+            table,
+            self._path(name),
+            format='parquet',
+            partitioning=['invoice_month'],
+            partitioning_flavor='hive',
+            file_options=self._write_options(),
+            max_rows_per_group=self.config['row_group_size'],
+            basename_template=f'part-{part}-{{i}}.parquet' if part is not None else 'part-{i}.parquet',
+            existing_data_behavior='overwrite_or_ignore' if part is not None else 'delete_matching'
+        )
+        logger.info(f"Staged {len(df)} {name} rows across {months.nunique()} monthly partitions")
+
+    def _remove_keys(self, name: str, key: str, values: pd.Series,
+                     exclude_months: List[str]) -> None:
+        """Drop staged rows of the given keys from every month but exclude_months."""
+        path = self._path(name)
+        if not os.path.isdir(path):
+            return
+
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        keys = pa.array(values.dropna().unique()).cast(dataset.schema.field(key).type)
+        stale = dataset.to_table(
+            columns=['invoice_month'],
+            filter=~ds.field('invoice_month').isin(exclude_months) & ds.field(key).isin(keys)
+        )
+        for month in sorted(set(stale['invoice_month'].to_pylist())):
+            month_filter = ds.field('invoice_month') == month
+            kept = dataset.to_table(filter=month_filter & ~ds.field(key).isin(keys))
+            if kept.num_rows:
+                ds.write_dataset(
+                    kept,
+                    path,
+                    format='parquet',
+                    partitioning=['invoice_month'],
+                    partitioning_flavor='hive',
+                    file_options=self._write_options(),
+                    max_rows_per_group=self.config['row_group_size'],
+                    existing_data_behavior='delete_matching'
+                )
+            else:
+                shutil.rmtree(os.path.join(path, f'invoice_month={month}'))
+        if stale.num_rows:
+            logger.info(f"Removed {stale.num_rows} staged {name} rows re-dated into other months")
+
+    def _read_partitioned(self, name: str, months: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read a partitioned dataset, pruning to the given YYYY-MM months if provided."""
+        path = self._path(name)
+        if not os.path.exists(path):
+            logger.warning(f"No staged {name} found at {path}")
+            return pd.DataFrame()
+
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        month_filter = ds.field('invoice_month').isin(months) if months else None
+        table = dataset.to_table(filter=month_filter)
+
+        df = table.drop_columns(['invoice_month']).to_pandas()
+        logger.info(f"Loaded {len(df)} staged {name} rows from {path}")
+        return df
+
+    def clear(self, name: str) -> None:
+        """Remove a staged dataset entirely."""
+        path = self._path(name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+            logger.info(f"Cleared staged {name} at {path}")
+
+    def write_clients(self, df: pd.DataFrame) -> None:
+        """Stage normalized client records."""
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            self._path('clients.parquet'),
+            compression=self.config['compression'],
+            row_group_size=self.config['row_group_size'],
+            write_statistics=True
+        )
+        logger.info(f"Staged {len(df)} client rows")
+
+    def read_clients(self) -> pd.DataFrame:
+        """Load staged client records."""
+        path = self._path('clients.parquet')
+        if not os.path.exists(path):
+            logger.warning(f"No staged clients found at {path}")
+            return pd.DataFrame()
+
+        df = pq.read_table(path).to_pandas()
+        logger.info(f"Loaded {len(df)} staged client rows from {path}")
+        return df
+
+    def write_invoices(self, df: pd.DataFrame) -> None:
+        """Stage normalized invoice records partitioned by invoice month."""
+        self._write_partitioned(df, 'invoices', 'invoice_date')
+
+    def append_invoices(self, df: pd.DataFrame, part: int) -> None:
+        """Add a chunk of normalized invoices to the staged dataset."""
+        self._write_partitioned(df, 'invoices', 'invoice_date', part=part)
+
+    def read_invoices(self, months: Optional[List[str]] = None) -> pd.DataFrame:
+        """Load staged invoice records, optionally limited to YYYY-MM months."""
+        return self._read_partitioned('invoices', months)
+
+    def write_facts(self, df: pd.DataFrame) -> None:
+        """Stage the invoice fact set partitioned by invoice month."""
+        self._write_partitioned(df, 'invoice_facts', 'invoice_date')
+
+    def read_facts(self, months: Optional[List[str]] = None) -> pd.DataFrame:
+        """Load the staged fact set, optionally limited to YYYY-MM months."""
+        return self._read_partitioned('invoice_facts', months)
@@ -0,0 +1,187 @@
+"""
+Directory-watching incremental ingestion for the Reveel data pipeline.
+Polls the data directory and loads only newly arrived or changed files.
+"""
+import os
+import glob
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Tuple
+from loguru import logger
+
+from .config import DATA_PATTERNS, WATCH_CONFIG
+from .data_processing import find_input_files
+
+
+CLIENT_DATA_TYPES = ['clients', 'client_pdfs']
+INVOICE_DATA_TYPES = ['invoices', 'invoice_pdfs']
+
+
+class IngestionWatcher:
+    """Watches a pipeline's data directory and incrementally ingests new files."""
+
+    def __init__(self, pipeline, poll_interval: float = None, settle_seconds: float = None,
+                 status_file: str = None):
+        """Initialize watcher for a RevealPipeline whose database is already set up.
+
+        Files are only ingested once unchanged for settle_seconds, so half-written
+        drops are not picked up.
+        """
+        self.pipeline = pipeline
+        self.poll_interval = poll_interval or WATCH_CONFIG['poll_interval']
+        self.settle_seconds = WATCH_CONFIG['settle_seconds'] if settle_seconds is None else settle_seconds
+        self.status_file = status_file
+
+        # path -> (mtime_ns, size) of the version last ingested
+        self.fingerprints: Dict[str, Tuple[int, int]] = {}
+        self.facts_built = False
+        self.status: Dict[str, Any] = {
+            'files_tracked': 0,
+            'files_ingested': 0,
+            'last_poll': None,
+            'last_ingest': None,
+            'last_lag_seconds': None,
+            'max_lag_seconds': None
+        }
+
+    def _list_files(self, data_types: List[str]) -> List[str]:
+        """List data files of the given types in the data directory."""
+        files = []
+        for data_type in data_types:
+            files.extend(find_input_files(self.pipeline.data_dir, DATA_PATTERNS[data_type]))
+        return files
+
+    def scan(self) -> Dict[str, List[Tuple[str, os.stat_result]]]:
+        """Find settled files that are new or changed since they were last ingested."""
+        now = time.time()
+        changed = {'clients': [], 'invoices': []}
+
+        for kind, data_types in (('clients', CLIENT_DATA_TYPES), ('invoices', INVOICE_DATA_TYPES)):
+            for path in self._list_files(data_types):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if now - stat.st_mtime < self.settle_seconds:
+                    continue
+                if self.fingerprints.get(path) != (stat.st_mtime_ns, stat.st_size):
+                    changed[kind].append((path, stat))
+
+            # Ingest in arrival order so earlier files win duplicate invoices
+            changed[kind].sort(key=lambda item: item[1].st_mtime_ns)
+
+        return changed
+
+    def ingest_clients(self) -> int:
+        """Re-merge every client file, since records are backfilled across files."""
+        client_files = [glob.escape(path) for path in self._list_files(CLIENT_DATA_TYPES)]
+        client_data = self.pipeline.client_processor.process_files(client_files)
+        if not client_data.empty:
+            self.pipeline.db_manager.upsert_dataframe(client_data, 'clients', conflict_columns=['client_id'])
+        return len(client_data)
+
+    def invoice_owners(self, invoice_ids: List[str]) -> Dict[str, str]:
+        """Map the given invoice ids that are already loaded to the file that supplied them.
+        
+        Ownership is read from invoices.source_file, so it survives restarts and
+        goes away with the invoices; invoices loaded before source_file existed
+        have no owner yet and go to the next file that supplies them.
+        """
+        result = self.pipeline.db_manager.execute_sql(
+            "SELECT invoice_id, source_file FROM invoices "
+            "WHERE invoice_id = ANY(:invoice_ids) AND source_file IS NOT NULL",
+            {'invoice_ids': invoice_ids}, name='invoice_owners'
+        )
+        return dict(result.fetchall())
+
+    def ingest_invoice_file(self, path: str) -> List[str]:
+        """Load one invoice file and return the invoice ids it owns, skipping those of other files."""
+        invoice_data = self.pipeline.invoice_processor.process_files([glob.escape(path)])
+        if invoice_data.empty:
+            return []
+
+        source_file = os.path.abspath(path)
+        owners = self.invoice_owners(invoice_data['invoice_id'].dropna().tolist())
+        owned_elsewhere = invoice_data['invoice_id'].map(
+            lambda invoice_id: owners.get(invoice_id, source_file) != source_file
+        )
+        invoice_data = invoice_data[~owned_elsewhere]
+        if invoice_data.empty:
+            logger.info(f"All invoices in {path} were already loaded from earlier files")
+            return []
+
+        self.pipeline.store_invoices(invoice_data)
+        # Re-ingested invoices are already in the sketch, which can only add
+        self.pipeline.invoice_processor.update_sketch(invoice_data[~invoice_data['invoice_id'].isin(owners)])
+        return invoice_data['invoice_id'].dropna().tolist()
+
+    def poll_once(self) -> Dict[str, Any]:
+        """Run one scan/ingest cycle and return the updated status."""
+        changed = self.scan()
+        self.status['last_poll'] = datetime.now(timezone.utc).isoformat()
+
+        if changed['clients'] or changed['invoices']:
+            logger.info(f"Detected {len(changed['clients'])} new/changed client files and "
+                        f"{len(changed['invoices'])} new/changed invoice files")
+
+            if changed['clients']:
+                self.ingest_clients()
+                # Client names changed, so cached name resolutions are stale
+                self.pipeline.name_index = None
+
+            invoice_ids = []
+            for path, _ in changed['invoices']:
+                invoice_ids.extend(self.ingest_invoice_file(path))
+
+            self.pipeline.store_data_quality()
+            self.pipeline.store_ingestion_sketch()
+            self.pipeline.resolve_client_names()
+
+            # Client attributes feed every fact row, so client changes rebuild all facts
+            if not self.facts_built or changed['clients']:
+                self.pipeline.create_fact_table()
+                self.facts_built = True
+            else:
+                self.pipeline.refresh_facts_for_invoices(invoice_ids)
+
+            done = time.time()
+            lags = []
+            for path, stat in changed['clients'] + changed['invoices']:
+                self.fingerprints[path] = (stat.st_mtime_ns, stat.st_size)
+                lags.append(done - stat.st_mtime)
+
+            self.status['files_ingested'] += len(lags)
+            self.status['last_ingest'] = datetime.now(timezone.utc).isoformat()
+            self.status['last_lag_seconds'] = max(lags)
+            self.status['max_lag_seconds'] = max(self.status['max_lag_seconds'] or 0.0, max(lags))
+            logger.info(f"Ingested {len(lags)} files; ingestion lag {max(lags):.1f}s")
+
+        self.status['files_tracked'] = len(self.fingerprints)
+        self._write_status()
+        return self.status
+
+    def _write_status(self) -> None:
+        """Atomically publish the watcher status as JSON, if a status file is configured."""
+        if not self.status_file:
+            return
+        tmp_path = f"{self.status_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.status, f, indent=2)
+        os.replace(tmp_path, self.status_file)
+
+    def run_forever(self) -> None:
+        """Poll the data directory until interrupted."""
+        logger.info(f"Watching {self.pipeline.data_dir} every {self.poll_interval}s "
+                    f"(settle time {self.settle_seconds}s)")
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    # Keep the daemon alive; the files stay unfingerprinted and are retried
+                    logger.error(f"Ingestion cycle failed: {e}")
+                time.sleep(max(0.0, self.poll_interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            logger.info("Watcher stopped")
@@ -0,0 +1,60 @@
+"""
+Shared fixtures for the Reveel data pipeline tests.
+
+Database tests run against the database of the POSTGRES_* settings, each in
+schemas of its own that are dropped afterwards, and are skipped when that
+database cannot be reached.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.config import DB_CONFIG
+from src.database import DatabaseManager
+
+DATA_DIR = os.path.join(ROOT, 'data files')
+
+
+@pytest.fixture(scope='session')
+def db_engine():
+    """Engine of the test database, shared by every database test."""
+    from sqlalchemy import create_engine
+    
+    try:
+        engine = create_engine(DatabaseManager(DB_CONFIG).connection_string,
+                               connect_args={'connect_timeout': 5})
+        with engine.connect():
+            pass
+    except Exception as e:
+        pytest.skip(f"Test database {DB_CONFIG['host']}:{DB_CONFIG['port']} unavailable: {e}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def make_db(db_engine, tmp_path, monkeypatch):
+    """Factory of DatabaseManagers, each on a new schema unless one is given.
+    
+    Pipeline logs and checkpoints are written in the test's temporary directory.
+    """
+    from sqlalchemy import text
+    
+    monkeypatch.chdir(tmp_path)
+    schemas = []
+    
+    def make(schema: str = None, **options) -> DatabaseManager:
+        if schema is None:
+            schema = f"test_{uuid.uuid4().hex[:12]}"
+            schemas.append(schema)
+        options.setdefault('engine', db_engine)
+        return DatabaseManager(DB_CONFIG, schema=schema, **options)
+    
+    yield make
+    with db_engine.begin() as conn:
+        for schema in schemas:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
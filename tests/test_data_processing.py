@@ -0,0 +1,105 @@
+"""
+Input discovery and normalization.
+"""
+import glob
+import gzip
+import os
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from src.data_processing import InvoiceProcessor, _parse_amount, _parse_amounts_cents, find_input_files
+
+INVOICE_CSV = "invoice_id,client_id,invoice_date,amount,currency,shipment_type\nINV-{n},C10456,2025-05-22,10.00,USD,GROUND\n"
+
+
+def _write(path, n):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt') as f:
+        f.write(INVOICE_CSV.format(n=n))
+
+
+def test_find_input_files_orders_by_depth_then_path(tmp_path):
+    data_dir = str(tmp_path / 'drop [2024]')
+    for n, name in enumerate(['2024/06/invoices_b.csv', 'invoices_b.csv.gz', '2024/invoices_a.csv',
+                              'invoices_a.csv', '.hidden/invoices_c.csv']):
+        _write(os.path.join(data_dir, name), n)
+    
+    files = find_input_files(data_dir, 'invoices*.csv')
+    
+    assert [os.path.relpath(path, data_dir) for path in files] == [
+        'invoices_a.csv', 'invoices_b.csv.gz',
+        os.path.join('2024', 'invoices_a.csv'), os.path.join('2024', '06', 'invoices_b.csv')
+    ]
+    invoices = InvoiceProcessor().process_files([glob.escape(path) for path in files])
+    assert sorted(invoices['invoice_id']) == ['INV-0', 'INV-1', 'INV-2', 'INV-3']
+
+
+def test_sample_invoice_files_in_version_order():
+    files = find_input_files(DATA_DIR, 'invoices*.csv')
+    
+    assert [os.path.basename(path) for path in files] == [
+        'invoices_v1 (3).csv', 'invoices_v2 (2).csv', 'invoices_v3 (2).csv'
+    ]
+
+
+def _decimal_mode_cents(value):
+    """Cents a DECIMAL(10,2) column stores for _parse_amount's result; None if unparseable."""
+    amount = _parse_amount(value)
+    if pd.isna(amount):
+        return None
+    return int(Decimal(repr(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+
+
+@pytest.mark.parametrize('value', [
+    # Currency symbols and thousands separators
+    '$1,234.56', '1,234,567.89', 'USD 7', '€ 12.50', '1.234,56', '1.234.567,89',
+    # Negatives
+    '-12.34', '-$5.005', '$-5.005', '-0.005',
+    # Half-cent rounding
+    '12.345', '0.005', '-0.004', '2.675', '.5', '007.10',
+    # Empty, missing and unparseable
+    '', '   ', 'abc', 'N/A', '-', '1.2.3', '5-', None, float('nan'),
+    # Numbers rather than text
+    12.345, 7
+])
+def test_parse_amounts_cents_matches_decimal_mode(value):
+    cents = _parse_amounts_cents(pd.Series([value], dtype=object))[0]
+    
+    assert (None if pd.isna(cents) else int(cents)) == _decimal_mode_cents(value)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1234567890123456.78', 123_456_789_012_345_678),
+    ('-92233720368547757.99', -9_223_372_036_854_775_799),
+    # Beyond BIGINT cents
+    ('92233720368547758.00', None),
+    ('123456789012345678901', None)
+])
+def test_parse_amounts_cents_past_float_precision(value, expected):
+    cents = _parse_amounts_cents(pd.Series([value]))[0]
+    
+    assert (None if pd.isna(cents) else int(cents)) == expected
+    if expected is not None:
+        # The float parser only approximates amounts this large
+        assert _parse_amount(value) * 100 == pytest.approx(expected, rel=1e-15)
+
+
+def test_amounts_with_decimal_comma():
+    values = pd.Series(['1.234,56', '€ 1.234.567,8', '1,234'])
+    
+    assert list(_parse_amounts_cents(values)) == [123_456, 123_456_780, 123_400]
+    assert list(values.apply(_parse_amount)) == [1234.56, 1234567.8, 1234.0]
+
+
+def test_sample_cents_totals_match_decimal_mode():
+    files = [glob.escape(path) for path in find_input_files(DATA_DIR, 'invoices*.csv')]
+    
+    cents = InvoiceProcessor(money_cents=True).process_files(files)
+    decimal = InvoiceProcessor().process_files(files)
+    
+    assert len(cents) == len(decimal)
+    assert int(cents['amount'].sum()) == sum(_decimal_mode_cents(amount) for amount in decimal['amount'])
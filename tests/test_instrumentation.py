@@ -0,0 +1,61 @@
+"""
+Query metrics and the slow query log.
+"""
+import json
+
+import pytest
+
+from src.config import QUERY_METRICS_CONFIG
+from src.instrumentation import QueryMetrics
+
+
+@pytest.fixture
+def logged_db(make_db, tmp_path):
+    """A manager with its own engine whose every statement counts as slow and is explained."""
+    slow_log = tmp_path / 'slow_queries.log'
+    metrics = QueryMetrics({**QUERY_METRICS_CONFIG, 'slow_query_ms': 0, 'slow_query_log': str(slow_log),
+                            'explain_slow_queries': True})
+    db_manager = make_db(engine=None, metrics=metrics)
+    db_manager.create_tables()
+    yield db_manager, slow_log
+    db_manager.disconnect()
+
+
+def _entries(slow_log):
+    return [json.loads(line) for line in slow_log.read_text().splitlines()]
+
+
+def test_slow_prepared_read_is_explained(logged_db):
+    db_manager, slow_log = logged_db
+    db_manager.execute_read("SELECT COUNT(*) FROM invoices WHERE client_id = :client_id",
+                            {'client_id': 'C10456'}, name='client_invoices', prepared=True)
+    
+    executes = [entry for entry in _entries(slow_log) if entry['statement'].startswith('EXECUTE client_invoices_')]
+    assert len(executes) == 1
+    assert 'Execution Time' in executes[0]['plan']
+
+
+def test_explaining_data_modifying_query_does_not_repeat_it(logged_db):
+    db_manager, slow_log = logged_db
+    db_manager.execute_sql("CREATE TABLE rate_audit (note TEXT)")
+    db_manager.execute_sql('''
+    WITH added AS (
+        INSERT INTO rate_audit VALUES ('rates changed') RETURNING note
+    )
+    SELECT COUNT(*) FROM added
+    ''', name='audit_rates')
+    
+    assert db_manager.get_table_row_count('rate_audit') == 1
+    assert [entry['plan'] is not None for entry in _entries(slow_log) if entry['name'] == 'audit_rates'] == [True]
+
+
+def test_slow_queries_are_not_explained_by_default(make_db, tmp_path):
+    slow_log = tmp_path / 'slow_queries.log'
+    metrics = QueryMetrics({**QUERY_METRICS_CONFIG, 'slow_query_ms': 0, 'slow_query_log': str(slow_log)})
+    db_manager = make_db(engine=None, metrics=metrics)
+    try:
+        db_manager.execute_sql("SELECT 1", name='select_one')
+    finally:
+        db_manager.disconnect()
+    
+    assert [entry['plan'] for entry in _entries(slow_log) if entry['name'] == 'select_one'] == [None]
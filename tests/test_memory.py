@@ -0,0 +1,43 @@
+"""
+Memory footprint of invoice ingestion.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import DATA_DIR, ROOT
+from src.data_processing import find_input_files
+
+# Peak memory allowed per byte of invoice input, Python heap and Arrow memory pool
+# together (about 5.6 on the sample files: 2.4 traced and 3.2 in the pool)
+MAX_PEAK_PER_INPUT_BYTE = 8
+
+# Processes the sample invoices in a fresh interpreter, so the Arrow pool's high-water
+# mark is this run's alone; tracemalloc does not see Arrow allocations (pyarrow CSV
+# reads, pandas string columns), which are reported from the pool instead
+PROCESS_FILES_SCRIPT = '''
+import glob, json, sys, tracemalloc
+import pyarrow as pa
+from src.data_processing import InvoiceProcessor
+
+tracemalloc.start()
+invoices = InvoiceProcessor().process_files([glob.escape(path) for path in sys.argv[1:]])
+print(json.dumps({'rows': len(invoices), 'traced_peak': tracemalloc.get_traced_memory()[1],
+                  'arrow_peak': pa.default_memory_pool().max_memory()}))
+'''
+
+
+def test_process_files_peak_memory():
+    files = find_input_files(DATA_DIR, 'invoices*.csv')
+    input_bytes = sum(os.path.getsize(path) for path in files)
+
+    result = subprocess.run([sys.executable, '-c', PROCESS_FILES_SCRIPT] + files,
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    usage = json.loads(result.stdout.splitlines()[-1])
+
+    assert usage['rows'] > 0
+    peak = usage['traced_peak'] + usage['arrow_peak']
+    assert peak <= MAX_PEAK_PER_INPUT_BYTE * input_bytes, \
+        f"peak {peak:,} bytes ({usage['traced_peak']:,} traced, {usage['arrow_peak']:,} Arrow) " \
+        f"for {input_bytes:,} bytes of input"
@@ -0,0 +1,54 @@
+"""
+Query plan regression tests for the analysis queries.
+"""
+from sqlalchemy import create_engine
+
+from conftest import DATA_DIR
+from src.analysis import AnalysisEngine, _find_seq_scans
+from src.database import FACT_INDEXES
+from src.pipeline import RevealPipeline
+
+
+def test_find_seq_scans_covers_partitions():
+    plan = {'Node Type': 'Append', 'Plans': [
+        {'Node Type': 'Seq Scan', 'Relation Name': 'invoice_facts_p2024_01', 'Plan Rows': 10},
+        {'Node Type': 'Index Only Scan', 'Relation Name': 'invoice_facts_p2024_02', 'Plan Rows': 10},
+        {'Node Type': 'Seq Scan', 'Relation Name': 'clients', 'Plan Rows': 60}
+    ]}
+    
+    assert _find_seq_scans(plan, 'invoice_facts') == [{'relation': 'invoice_facts_p2024_01', 'rows': 10}]
+
+
+def test_analysis_queries_have_index_paths(db_engine, make_db):
+    """No analysis query plan seq-scans invoice_facts when sequential scans are disabled.
+    
+    The sample data is too small for the planner to prefer the fact indexes, so
+    sequential scans are made prohibitively expensive instead: a Seq Scan left
+    in a plan then means the query has no index path at all.
+    """
+    db_manager = make_db()
+    assert RevealPipeline(data_dir=DATA_DIR, db_manager=db_manager).run_full_pipeline()
+    
+    engine = create_engine(db_engine.url, connect_args={'options': '-c enable_seqscan=off'})
+    try:
+        analysis_engine = AnalysisEngine(make_db(schema=db_manager.schema, engine=engine))
+        assert analysis_engine.verify_query_plans(max_seq_scan_rows=0) == {}
+    finally:
+        engine.dispose()
+
+
+def test_create_tables_rebuilds_outdated_fact_indexes(make_db):
+    db_manager = make_db()
+    db_manager.create_tables()
+    db_manager.execute_sql('''
+    DROP INDEX idx_invoice_facts_shipment_cost;
+    CREATE INDEX idx_invoice_facts_shipment_cost ON invoice_facts(shipment_type) INCLUDE (calculated_cost);
+    ''')
+    
+    db_manager.create_tables()
+    
+    definition = db_manager.execute_sql(
+        "SELECT pg_get_indexdef(to_regclass('idx_invoice_facts_shipment_cost'))"
+    ).scalar()
+    assert definition.endswith('INCLUDE ({})'.format(FACT_INDEXES['idx_invoice_facts_shipment_cost'][1]))
+    assert db_manager._stale_fact_indexes() == []
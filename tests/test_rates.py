@@ -0,0 +1,47 @@
+"""
+Date-effective rates and the reports that depend on them.
+"""
+from datetime import date
+
+import pytest
+
+from conftest import DATA_DIR
+from src.analysis import AnalysisEngine
+from src.pipeline import RevealPipeline
+
+# GROUND equivalent of each client's EXPRESS facts with GROUND at $1 before 2025 and $3 since
+EXPECTED_GROUND_EQUIVALENT_SQL = '''
+SELECT client_id, SUM(invoice_amount * CASE WHEN invoice_date >= '2025-01-01' THEN 3 ELSE 1 END) / {unit}
+FROM invoice_facts
+WHERE shipment_type = 'EXPRESS' AND client_id IS NOT NULL
+GROUP BY client_id
+'''
+
+
+@pytest.mark.parametrize('money_cents', [False, True])
+def test_reclassification_follows_ground_rate_changes(make_db, money_cents):
+    pipeline = RevealPipeline(data_dir=DATA_DIR, db_manager=make_db(money_cents=money_cents),
+                              money_cents=money_cents)
+    assert pipeline.run_full_pipeline()
+    db_manager = pipeline.db_manager
+
+    # A GROUND change alone moves the EXPRESS:GROUND ratio away from 10:1
+    pipeline.apply_rate_change({'GROUND': 3.0}, date(2025, 1, 1))
+    expected = dict(db_manager.execute_sql(
+        EXPECTED_GROUND_EQUIVALENT_SQL.format(unit=100.0 if money_cents else 1.0)
+    ).fetchall())
+
+    result = AnalysisEngine(db_manager).get_express_reclassification_analysis()
+    assert len(result['data']) == min(len(expected), 10)
+    for row in result['data']:
+        assert float(row[4]) == pytest.approx(float(expected[row[0]]), abs=0.01)
+    query_4 = pipeline.run_analysis_query('express_to_ground_analysis')
+    assert {row[0]: float(row[4]) for row in query_4} == pytest.approx(
+        {client_id: float(cost) for client_id, cost in expected.items()}, abs=0.01)
+
+    # Facts built before the column existed get it backfilled from the rate sheet
+    db_manager.execute_sql('ALTER TABLE invoice_facts DROP COLUMN ground_equivalent_cost')
+    db_manager.create_tables()
+    result = AnalysisEngine(db_manager).get_express_reclassification_analysis()
+    for row in result['data']:
+        assert float(row[4]) == pytest.approx(float(expected[row[0]]), abs=0.01)
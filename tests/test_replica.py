@@ -0,0 +1,72 @@
+"""
+Read replica routing and fallback to the primary.
+
+Needs a primary and a streaming replica of it, given as SQLAlchemy URLs in
+TEST_PRIMARY_DSN and TEST_REPLICA_DSN; skipped otherwise.
+"""
+import os
+import socket
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+from src.config import DB_CONFIG, REPLICA_CONFIG
+from src.database import DatabaseManager
+
+PRIMARY_DSN = os.getenv('TEST_PRIMARY_DSN')
+REPLICA_DSN = os.getenv('TEST_REPLICA_DSN')
+
+pytestmark = pytest.mark.skipif(not (PRIMARY_DSN and REPLICA_DSN),
+                                reason='TEST_PRIMARY_DSN and TEST_REPLICA_DSN are not set')
+
+
+@pytest.fixture
+def connect():
+    """Factory of DatabaseManagers on the test primary with the given replica DSN."""
+    engine = create_engine(PRIMARY_DSN)
+    managers = []
+    
+    def make(replica_dsn: str) -> DatabaseManager:
+        db_manager = DatabaseManager({**DB_CONFIG, 'replica_dsn': replica_dsn}, engine=engine)
+        db_manager.connect()
+        managers.append(db_manager)
+        return db_manager
+    
+    yield make
+    for db_manager in managers:
+        db_manager.disconnect()
+    engine.dispose()
+
+
+def _served_by_replica(db_manager: DatabaseManager) -> bool:
+    return db_manager.execute_read("SELECT pg_is_in_recovery()").scalar()
+
+
+def test_reads_go_to_healthy_replica(connect):
+    assert _served_by_replica(connect(REPLICA_DSN))
+
+
+def test_lagging_replica_falls_back_to_primary(connect, monkeypatch):
+    # Even a caught-up replica (lag 0) is past a negative threshold
+    monkeypatch.setitem(REPLICA_CONFIG, 'max_lag_seconds', -1.0)
+    assert not _served_by_replica(connect(REPLICA_DSN))
+
+
+def test_unreachable_replica_falls_back_to_primary(connect):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        closed_port = sock.getsockname()[1]
+    unreachable = make_url(REPLICA_DSN).set(host='127.0.0.1', port=closed_port)
+    
+    db_manager = connect(unreachable.render_as_string(hide_password=False))
+    assert not _served_by_replica(db_manager)
+    assert not db_manager.replica_healthy
+
+
+def test_standalone_server_is_not_a_replica(connect, monkeypatch):
+    # The primary is not in recovery, like a stale standalone copy
+    assert not connect(PRIMARY_DSN)._replica_usable()
+    
+    monkeypatch.setitem(REPLICA_CONFIG, 'allow_standalone', True)
+    assert connect(PRIMARY_DSN)._replica_usable()
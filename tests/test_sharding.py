@@ -0,0 +1,45 @@
+"""
+Sharded ingestion: results must not depend on the order shards are loaded in.
+"""
+import pytest
+from sqlalchemy import text
+
+from conftest import DATA_DIR
+from src.pipeline import RevealPipeline
+
+INVOICE_COLUMNS = 'invoice_id, client_id, client_name, invoice_date, amount, currency, shipment_type, source_file'
+
+
+def _load(db_manager, run_id, streaming=False):
+    """Run one shard worker, as a fresh process would."""
+    pipeline = RevealPipeline(data_dir=DATA_DIR, db_manager=db_manager, run_id=run_id, streaming=streaming)
+    return pipeline.run_shard_worker(run_id, shard_count=2)
+
+
+def _invoices(db_manager):
+    return db_manager.execute_sql(f"SELECT {INVOICE_COLUMNS} FROM invoices ORDER BY invoice_id").fetchall()
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_shard_order_does_not_change_results(db_engine, make_db, streaming):
+    in_order = make_db()
+    assert _load(in_order, 'in-order', streaming) == [0, 1]
+    
+    # Another worker holds shard 0, so this one loads shard 1 first and shard 0 in a second run
+    reversed_order = make_db()
+    with db_engine.connect() as holder:
+        holder.execute(text("SELECT pg_advisory_lock(hashtext('reversed'), 0)"))
+        holder.commit()
+        assert _load(make_db(schema=reversed_order.schema), 'reversed', streaming) == [1]
+        holder.execute(text("SELECT pg_advisory_unlock(hashtext('reversed'), 0)"))
+        holder.commit()
+    assert _load(make_db(schema=reversed_order.schema), 'reversed', streaming) == [0]
+    
+    invoices = _invoices(in_order)
+    assert len(invoices) == 12_000
+    assert all(row.client_id is not None for row in invoices)
+    assert _invoices(reversed_order) == invoices
+    
+    for db_manager in (in_order, reversed_order):
+        sketch_rows = db_manager.execute_sql("SELECT SUM(row_count) FROM ingestion_sketches").scalar()
+        assert sketch_rows == len(invoices)
@@ -0,0 +1,127 @@
+"""
+Mergeable ingestion sketches.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.sketches import HyperLogLog, InvoiceSketch, TDigest, TopK
+
+
+def _ids(start, stop):
+    return pd.Series([f'INV-{n}' for n in range(start, stop)])
+
+
+@pytest.mark.parametrize('cardinality', [1, 10, 1_000, 20_000, 300_000])
+def test_hyperloglog_error_within_bounds(cardinality):
+    sketch = HyperLogLog()
+    for chunk in np.array_split(np.arange(cardinality), 4):
+        sketch.add(_ids(chunk[0], chunk[-1] + 1) if len(chunk) else pd.Series([], dtype=str))
+    # Repeated values do not count again
+    sketch.add(_ids(0, min(cardinality, 1_000)))
+
+    # Three standard errors of 1.04/sqrt(2^12)
+    assert sketch.estimate() == pytest.approx(cardinality, rel=0.05)
+
+
+def test_hyperloglog_merge_is_idempotent_and_matches_union():
+    first, second, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    first.add(_ids(0, 60_000))
+    second.add(_ids(40_000, 100_000))
+    union.add(_ids(0, 100_000))
+
+    merged = HyperLogLog.from_dict(first.to_dict())
+    merged.merge(second)
+    twice = HyperLogLog.from_dict(merged.to_dict())
+    twice.merge(second)
+    twice.merge(merged)
+
+    assert np.array_equal(merged.registers, union.registers)
+    assert np.array_equal(twice.registers, merged.registers)
+
+
+def _weighted_keys(seed, rows=20_000, keys=400):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'key': [f'C{n}' for n in rng.zipf(1.3, rows) % keys],
+                         'weight': rng.lognormal(3, 1, rows)})
+
+
+def _check_top_k(sketch, data):
+    totals = data.groupby('key')['weight'].sum()
+    for key, count, error in sketch.top(sketch.capacity):
+        assert count >= totals[key] - 1e-6
+        assert count - error <= totals[key] + 1e-6
+    # The heaviest keys outweigh whatever an untracked key may have had
+    heaviest = totals.sort_values(ascending=False).index[:5]
+    assert set(heaviest) <= {key for key, _, _ in sketch.top(sketch.capacity)}
+
+
+def test_top_k_bounds_hold_across_adds_and_merges():
+    data = _weighted_keys(0)
+    chunks = [data.iloc[rows] for rows in np.array_split(np.arange(len(data)), 12)]
+
+    single = TopK(30)
+    for chunk in chunks:
+        single.add(chunk['key'], chunk['weight'])
+    _check_top_k(single, data)
+
+    merged = TopK(30)
+    for shard in range(3):
+        part = TopK(30)
+        for chunk in chunks[shard::3]:
+            part.add(chunk['key'], chunk['weight'])
+        merged.merge(TopK.from_dict(json.loads(json.dumps(part.to_dict()))))
+    _check_top_k(merged, data)
+
+
+@pytest.mark.parametrize('chunks', [1, 40, 400])
+def test_tdigest_quantiles_within_tolerance(chunks):
+    values = np.random.default_rng(1).lognormal(8, 1, 200_000)
+
+    # Half of the chunks added to one digest, the rest merged in from digests of their own
+    digest = TDigest()
+    for n, chunk in enumerate(np.array_split(values, chunks)):
+        if n % 2:
+            part = TDigest()
+            part.add(pd.Series(chunk))
+            digest.merge(TDigest.from_dict(part.to_dict()))
+        else:
+            digest.add(pd.Series(chunk))
+
+    assert digest.quantile(0) == values.min()
+    assert digest.quantile(1) == values.max()
+    for q, tolerance in [(0.5, 0.01), (0.9, 0.01), (0.99, 0.03), (0.999, 0.05)]:
+        assert digest.quantile(q) == pytest.approx(np.quantile(values, q), rel=tolerance), q
+
+
+def test_tdigest_centroids_span_at_most_one_k_unit():
+    digest = TDigest(100)
+    for chunk in np.array_split(np.random.default_rng(2).lognormal(8, 1, 50_000), 25):
+        digest.add(pd.Series(chunk))
+
+    right = np.cumsum(digest.weights) / digest.weights.sum()
+    left = right - digest.weights / digest.weights.sum()
+    spans = digest._k(right) - digest._k(left)
+    assert np.all((spans <= 1 + 1e-9) | (digest.weights == 1))
+
+
+def test_invoice_sketch_round_trips_through_json():
+    invoices = pd.DataFrame({
+        'invoice_id': [f'INV-{n}' for n in range(500)],
+        'client_id': [f'C{n % 17}' if n % 5 else None for n in range(500)],
+        'client_name': [f'CLIENT {n % 23}' for n in range(500)],
+        'invoice_date': [f'2024-{n % 12 + 1:02d}-15' for n in range(500)],
+        'amount': [float(n % 97) * 10.25 for n in range(500)],
+        'shipment_type': [['GROUND', 'EXPRESS', '2DAY', 'FREIGHT'][n % 4] for n in range(500)]
+    })
+    sketch = InvoiceSketch()
+    sketch.update(invoices[:300])
+    sketch.update(invoices[300:])
+
+    restored = InvoiceSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+    assert restored.to_dict() == sketch.to_dict()
+    assert restored.summary() == sketch.summary()
+    assert restored.summary()['rows'] == 500
@@ -0,0 +1,36 @@
+"""
+Parquet staging of normalized data.
+"""
+import pandas as pd
+
+from src.staging import ParquetStaging
+
+
+def _invoices(*rows):
+    return pd.DataFrame(rows, columns=['invoice_id', 'client_id', 'invoice_date', 'invoice_amount'])
+
+
+def test_restaged_invoice_with_moved_date_is_read_once(tmp_path):
+    staging = ParquetStaging(str(tmp_path / 'staging'))
+    staging.write_invoices(_invoices(('INV-1', 'C1', '2024-01-15', 10.0),
+                                     ('INV-2', 'C1', '2024-01-20', 20.0),
+                                     ('INV-3', 'C2', '2024-02-03', 30.0)))
+
+    # A backfill of March only, carrying INV-1 with its corrected date
+    staging.write_invoices(_invoices(('INV-1', 'C1', '2024-03-15', 10.0),
+                                     ('INV-4', 'C2', '2024-03-18', 40.0)))
+
+    invoices = staging.read_invoices().sort_values('invoice_id')
+    assert invoices['invoice_id'].tolist() == ['INV-1', 'INV-2', 'INV-3', 'INV-4']
+    assert invoices.set_index('invoice_id').loc['INV-1', 'invoice_date'] == '2024-03-15'
+    assert staging.read_invoices(['2024-01'])['invoice_id'].tolist() == ['INV-2']
+
+
+def test_moving_a_month_s_only_invoice_removes_the_month(tmp_path):
+    staging = ParquetStaging(str(tmp_path / 'staging'))
+    staging.write_invoices(_invoices(('INV-1', 'C1', '2024-01-15', 10.0)))
+
+    staging.write_invoices(_invoices(('INV-1', 'C1', '2024-02-15', 10.0)))
+
+    assert staging.read_invoices()['invoice_id'].tolist() == ['INV-1']
+    assert not (tmp_path / 'staging' / 'invoices' / 'invoice_month=2024-01').exists()
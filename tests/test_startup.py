@@ -0,0 +1,34 @@
+"""
+Startup cost of the report CLI, which cron jobs and scripts run many times a day.
+"""
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Cumulative import time allowed for run_analysis (about 300 ms with SQLAlchemy core and loguru)
+IMPORT_BUDGET_MS = 750
+
+# Modules the report path must not load at import
+DEFERRED_MODULES = ['pandas', 'numpy', 'pyarrow', 'PyPDF2', 'sqlalchemy.orm', 'src.profiling']
+
+
+def test_report_cli_import_time():
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import sys, run_analysis; print("\\n".join(sys.modules))'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    
+    # -X importtime lines: "import time: self [us] | cumulative [us] | module"
+    cumulative_us = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and line.count('|') == 2:
+            _, cumulative, module = line.split('|')
+            if cumulative.strip().isdigit():
+                cumulative_us[module.strip()] = int(cumulative)
+    import_ms = cumulative_us['run_analysis'] / 1000
+    assert import_ms <= IMPORT_BUDGET_MS, f"run_analysis took {import_ms:.0f} ms to import"
+    
+    loaded = set(result.stdout.split())
+    assert not [module for module in DEFERRED_MODULES if module in loaded]
@@ -0,0 +1,53 @@
+"""
+Incremental watch-mode ingestion.
+"""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from conftest import DATA_DIR
+from src.analysis import AnalysisEngine
+from src.pipeline import RevealPipeline
+from src.watcher import IngestionWatcher
+
+
+@pytest.fixture
+def watcher(make_db, tmp_path):
+    """A watcher without settle time over a copy of the sample CSV files."""
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for name in sorted(os.listdir(DATA_DIR)):
+        if name.endswith('.csv'):
+            shutil.copy(os.path.join(DATA_DIR, name), data_dir)
+    
+    pipeline = RevealPipeline(data_dir=str(data_dir), db_manager=make_db())
+    pipeline.setup_database()
+    return IngestionWatcher(pipeline, settle_seconds=0)
+
+
+def test_sketch_matches_table_after_reingest(watcher):
+    data_dir = watcher.pipeline.data_dir
+    watcher.poll_once()
+    
+    # A new file repeats invoices of an earlier one next to new invoices, then that
+    # earlier file is rewritten and so re-ingested
+    first = os.path.join(data_dir, 'invoices_v1 (3).csv')
+    invoices = pd.read_csv(first, dtype=str, nrows=40)
+    invoices.loc[:19, 'invoice_id'] = [f'INV-NEW{i:04d}' for i in range(20)]
+    invoices.to_csv(os.path.join(data_dir, 'invoices_v4.csv'), index=False)
+    with open(first, 'rb') as f:
+        content = f.read()
+    with open(first, 'wb') as f:
+        f.write(content)
+    
+    status = watcher.poll_once()
+    assert status['files_ingested'] == 8
+    
+    db_manager = watcher.pipeline.db_manager
+    rows, total_amount = db_manager.execute_sql("SELECT COUNT(*), SUM(amount) FROM invoices").fetchone()
+    summary = AnalysisEngine(db_manager).get_sketch_summary([watcher.pipeline.run_id])
+    assert rows == 12_020
+    assert summary['rows'] == rows
+    assert summary['total_amount'] == pytest.approx(float(total_amount), abs=0.01)